@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+""" Microbenchmark: AggregateProcess output reduction, the original per-key summation loop versus the NumPy
+    reduction, for a fleet of controllers writing the same setpoints.
+
+    python -m GridPi.benchmarks.bench_aggregate [n_processes] [n_tags]
+"""
+
+import sys
+import timeit
+
+from GridPi.lib.process import process_core
+
+
+class BenchController(process_core.SingleProcess):
+    """ Writes n_tags setpoints, like one of many controllers acting on the same assets """
+
+    def __init__(self, n, n_tags):
+        super(BenchController, self).__init__()
+        self._name = 'bench controller {}'.format(n)
+        self._output.update({self.tag('ess', m, 'control', 'kw_setpoint'): float(n + m) for m in range(n_tags)})
+
+
+class LegacySummation(process_core.AggregateProcess):
+    """ do_work() of the original AggregateProcessSummation """
+
+    def do_work(self):
+        summation = dict()
+        for process in self._process_list:
+            for key, val in process._output.items():
+                try:
+                    summation[key] += val
+                except:
+                    summation[key] = val
+        self._output = summation
+
+
+def main(n_processes=50, n_tags=4, repeat=3, number=500):
+    processes = [BenchController(n, n_tags) for n in range(n_processes)]
+    legacy = LegacySummation(processes)
+    results = [('legacy summation', legacy)]
+    for mode in process_core.AggregateMode:
+        results.append((mode.value, process_core.AggregateProcess(processes, mode=mode)))
+
+    legacy.do_work()
+    expected = legacy.output
+    results[1][1].do_work()
+    assert results[1][1].output == expected, 'vectorized sum differs from the legacy summation'
+
+    print('processes: {}, tags: {}'.format(n_processes, n_tags))
+    base = None
+    for label, aggregate in results:
+        seconds = min(timeit.repeat(aggregate.do_work, repeat=repeat, number=number)) / number
+        base = base or seconds
+        print('{:<18} {:8.1f} us/cycle {:6.1f}x'.format(label + ':', seconds * 1e6, base / seconds))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+""" Microbenchmark: one dispatch state machine step, the original per cycle message construction with asset lookups
+    versus the preallocated, slot bound messages and the compiled transition table, with a growing number of assets
+    in the container. The legacy and preallocated machines act on one asset of each class_type only, the table
+    reads and writes every ESS and grid intertie, so its cost grows with the fleet size.
+
+    python -m GridPi.benchmarks.bench_dispatch [n_assets]
+"""
+
+import os
+import sys
+import timeit
+from configparser import ConfigParser
+
+from GridPi.lib.dispatch import dispatch_core, dispatch_statemachine
+from GridPi.lib.models import model_core
+
+
+class LegacyGridConnectedInput(object):
+    """ GridConnectedInput as it was, built every cycle """
+
+    def __init__(self, asset_container):
+        grid = asset_container.get_asset('grid')[0]
+        ess = asset_container.get_asset('ess')[0]
+
+        self.grid_enabled = grid.status['enabled']
+        self.ess_online = ess.status['online']
+
+
+class LegacyGridConnectedOutput(object):
+    """ GridConnectedOutput as it was, looking up its assets on write """
+
+    def __init__(self):
+        self.grid_run = False
+        self.ess_run = False
+        self.ess_state_cmd = 0
+        self.feeder_run = False
+
+    def write(self, asset_container):
+        grid = asset_container.get_asset('grid')[0]
+        grid.control['run'] = self.grid_run
+
+        ess = asset_container.get_asset('ess')[0]
+        ess.control['run'] = self.ess_run
+        ess.control['state_cmd'] = self.ess_state_cmd
+
+        feeder = asset_container.get_asset('feeder')[0]
+        feeder.control['run'] = self.feeder_run
+
+
+def legacy_run_all(asset_container):
+    """ DispatchStateMachine.run_all() as it was, steady in the grid connected state """
+    state = dispatch_core.grid_state
+    in_msg = LegacyGridConnectedInput(asset_container)
+    requested_state = state.request(in_msg)
+    state = state.transition(in_msg, requested_state)
+    out_msg = state.action(requested_state, LegacyGridConnectedOutput())
+    out_msg.write(asset_container)
+
+
+def build_container(n_assets):
+    asset_container = model_core.AssetContainer()
+    for n, asset_class in enumerate([model_core.GridIntertie, model_core.Feeder] +
+                                    [model_core.EnergyStorage] * max(1, n_assets - 2)):
+        asset = asset_class()
+        asset.config['name'] = 'asset_{}'.format(n)
+        asset_container.add_asset(asset)
+    asset_container.get_asset('grid')[0].status['enabled'] = True
+    asset_container.get_asset('ess')[0].status['online'] = True
+    return asset_container
+
+
+def main(n_assets=3, repeat=3, number=20000):
+    asset_container = build_container(n_assets)
+    state_machine = dispatch_core.DispatchStateMachine(dispatch_core.grid_state,
+                                                       {'grid': 'asset_0', 'feeder': 'asset_1', 'ess': 'asset_2'})
+    state_machine.run_all(asset_container)
+
+    parser = ConfigParser()
+    parser.read(os.path.join(os.path.dirname(__file__), '..', 'config', 'dispatch_cfg.ini'))
+    table = dispatch_statemachine.TableStateMachine.from_config(parser)
+    table.run_all(asset_container)
+
+    print('assets: {}'.format(len(asset_container.asset_list)))
+    base = None
+    for label, step in (('legacy', lambda: legacy_run_all(asset_container)),
+                        ('preallocated', lambda: state_machine.run_all(asset_container)),
+                        ('table', lambda: table.run_all(asset_container))):
+        seconds = min(timeit.repeat(step, repeat=repeat, number=number)) / number
+        base = base or seconds
+        print('{:<14} {:8.2f} us/cycle {:6.1f}x'.format(label + ':', seconds * 1e6, base / seconds))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+""" Microbenchmark: decoding one poll response of a device register map, the original per register decode picked by
+    comparing type strings (with the float word order reversed through a register list) versus the block compiled
+    once to a struct format.
+
+    python -m GridPi.benchmarks.bench_modbus_decode [n_registers]
+"""
+
+import struct
+import sys
+import timeit
+
+from GridPi.lib.comm import modbus
+
+TYPES = ('32bit_float', '16bit_int', '32bit_uint', '16bit_uint', '32bit_int')
+
+
+def legacy_decode(config, registers, values):
+    """ Comm.ModbusClient._update() as it was, on the already read registers (list of 16 bit ints by address) """
+    endian = config['endian']
+    for reg in config['registers']:
+        if reg['type'] == '32bit_float':
+            words = list(reversed(registers[reg['mod_add']:reg['mod_add'] + 2]))
+            values[reg['name']] = struct.unpack(endian + 'f', struct.pack(endian + 'HH', *words))[0] * reg['scale']
+        elif reg['type'] == '32bit_int':
+            words = registers[reg['mod_add']:reg['mod_add'] + 2]
+            values[reg['name']] = struct.unpack(endian + 'i', struct.pack(endian + 'HH', *words))[0] * reg['scale']
+        elif reg['type'] == '32bit_uint':
+            words = registers[reg['mod_add']:reg['mod_add'] + 2]
+            values[reg['name']] = struct.unpack(endian + 'I', struct.pack(endian + 'HH', *words))[0] * reg['scale']
+        elif reg['type'] == '16bit_int':
+            words = registers[reg['mod_add']:reg['mod_add'] + 1]
+            values[reg['name']] = struct.unpack(endian + 'h', struct.pack(endian + 'H', *words))[0] * reg['scale']
+        elif reg['type'] == '16bit_uint':
+            words = registers[reg['mod_add']:reg['mod_add'] + 1]
+            values[reg['name']] = struct.unpack(endian + 'H', struct.pack(endian + 'H', *words))[0] * reg['scale']
+
+
+def build_config(n_registers):
+    reg_list, address = list(), 0
+    for n in range(n_registers):
+        reg_type = TYPES[n % len(TYPES)]
+        reg_list.append({'name': 'reg_{}'.format(n), 'mod_add': address, 'type': reg_type, 'scale': 0.1})
+        address += modbus.REGISTER_TYPES[reg_type][1]
+    return {'ip_add': '127.0.0.1', 'endian': '>', 'registers': reg_list}, address
+
+
+def main(n_registers=40, repeat=3, number=5000):
+    config, count = build_config(n_registers)
+    registers = [(7 * n) & 0xFFFF for n in range(count)]
+    data = struct.pack('>{}H'.format(count), *registers)
+
+    device = modbus.ModbusDevice(config)
+    blocks = device.read_blocks
+    values = dict()
+
+    def compiled_decode():
+        for block in blocks:
+            block.decode(data[2 * block.address:2 * (block.address + block.count)], values)
+
+    print('registers: {}, blocks: {}'.format(n_registers, len(blocks)))
+    base = None
+    for label, decode in (('legacy', lambda: legacy_decode(config, registers, values)),
+                          ('compiled', compiled_decode)):
+        seconds = min(timeit.repeat(decode, repeat=repeat, number=number)) / number
+        base = base or seconds
+        print('{:<14} {:8.2f} us/poll {:6.1f}x'.format(label + ':', seconds * 1e6, base / seconds))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+""" Microbenchmark: one tick of n virtual ESS units, the per object device state machines versus one vectorized
+    PlantSimulator step.
+
+    python -m GridPi.benchmarks.bench_plant_simulator [n_devices]
+"""
+
+import logging
+import sys
+import timeit
+
+from GridPi.lib.models import virtual_system, VirtualEnergyStorage
+
+
+def main(n_devices=1000, repeat=3, number=20):
+    logging.disable(logging.CRITICAL)  # The device states log every tick
+
+    vs = virtual_system.Virtual_System(None, None)
+    devices = [VirtualEnergyStorage.VESDevice(virtual_system=vs) for n in range(n_devices)]
+    for device in devices:
+        device.record.update({'run_cmd': True, 'kw_setpoint': 10.0, 'state_cmd': 1})
+
+    simulator = vs.simulator
+    simulator.grid.add(close_breaker=True)
+    simulator.feeder.add(load_kw=5.0 * n_devices, close_breaker=True)
+    for n in range(n_devices):
+        simulator.ess.add(run_cmd=True, kw_setpoint=10.0, state_cmd=1)
+
+    def tick_devices():
+        for device in devices:
+            device.device_update()
+
+    print('devices: {}'.format(n_devices))
+    base = None
+    for label, tick in (('per device', tick_devices),
+                        ('vectorized', lambda: simulator.step(0.2))):
+        seconds = min(timeit.repeat(tick, repeat=repeat, number=number)) / number
+        base = base or seconds
+        print('{:<12} {:10.1f} us/tick {:8.1f}x'.format(label + ':', seconds * 1e6, base / seconds))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
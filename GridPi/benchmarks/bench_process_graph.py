@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+""" Benchmark: ProcessContainer.sort() on generated process graphs of increasing size, with the nested-loop edge
+    search it replaced as a reference on the smaller graphs.
+
+    python -m GridPi.benchmarks.bench_process_graph [max_processes]
+"""
+
+import random
+import sys
+import timeit
+
+from GridPi.lib.process import process_core, process_graph
+
+
+class BenchProcess(process_core.SingleProcess):
+    """ Reads the outputs of some earlier processes, writes one tag of its own """
+
+    def __init__(self, n, inputs):
+        super(BenchProcess, self).__init__()
+        self._name = 'bench process {}'.format(n)
+        self._input.update({self.tag('bench', m, 'status', 'out'): None for m in inputs})
+        self._output.update({self.tag('bench', n, 'status', 'out'): None})
+
+
+def build(n_processes, fan_in=3, seed=0):
+    """ Layered random graph: every process depends on up to fan_in earlier ones, and half of them on the previous
+        process, which gives dependency chains of about n_processes / 2.
+    """
+    rng = random.Random(seed)
+    processes = list()
+    for n in range(n_processes):
+        inputs = set(rng.sample(range(n), min(n, fan_in)))
+        if n and rng.random() < 0.5:
+            inputs.add(n - 1)
+        processes.append(BenchProcess(n, inputs))
+    rng.shuffle(processes)
+
+    container = process_core.ProcessContainer()
+    for process in processes:
+        container.add_process(process)
+    return container
+
+
+def legacy_edge_list(process_list):
+    """ Edge search of the original GraphDependencies: every sink input against every source output """
+    GD = process_graph.GraphDependencies()
+    GD.find_input_sinks(process_list)
+    GD.find_output_sources(process_list)
+    edges = []
+    for inpt, sink_process_list in GD.sink.items():
+        for output, source_process_list in GD.source.items():
+            if inpt == output:
+                for sink_process in sink_process_list:
+                    for source_process in source_process_list:
+                        edges.append([source_process, sink_process])
+    return edges
+
+
+def timed(func, repeat=3):
+    return min(timeit.repeat(func, repeat=repeat, number=1))
+
+
+def main(max_processes=10000):
+    sizes = [n for n in (100, 1000, 2000, 5000, 10000) if n < max_processes] + [max_processes]
+
+    print('{:>10} {:>10} {:>18}'.format('processes', 'sort [ms]', 'legacy edges [ms]'))
+    for n_processes in sizes:
+        container = build(n_processes)
+        legacy = timed(lambda: legacy_edge_list(container.process_list)) if n_processes <= 2000 else None
+        sort = timed(container.sort)
+        print('{:>10} {:>10.1f} {:>18}'.format(n_processes, sort * 1e3,
+                                              '-' if legacy is None else '{:.1f}'.format(legacy * 1e3)))
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
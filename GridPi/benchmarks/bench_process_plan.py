@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+""" Microbenchmark: per-cycle cost of ProcessContainer.run_all() with per-cycle tag resolution versus the compiled
+    tag-binding plan.
+
+    python -m GridPi.benchmarks.bench_process_plan [n_processes]
+"""
+
+import sys
+import timeit
+
+from GridPi.lib.models import model_core
+from GridPi.lib.process import process_core
+
+
+class BenchSocController(process_core.SingleProcess):
+    """ SOC controller bound to one ess asset by id """
+
+    def __init__(self, asset_id):
+        super(BenchSocController, self).__init__()
+        self._name = 'bench soc controller {}'.format(asset_id)
+        self.soc = self.tag('ess', asset_id, 'status', 'soc')
+        self.target_soc = self.tag('ess', asset_id, 'config', 'target_soc')
+        self.kw_setpoint = self.tag('ess', asset_id, 'control', 'kw_setpoint')
+
+        self._input.update({self.soc: None, self.target_soc: None})
+        self._output.update({self.kw_setpoint: None})
+
+    def do_work(self):
+        self._output[self.kw_setpoint] = 50 if self._input[self.soc] > self._input[self.target_soc] else -50
+
+
+def build(n_processes):
+    assets = model_core.AssetContainer()
+    for n in range(n_processes):
+        ess = model_core.EnergyStorage()
+        ess.config['name'] = 'ess_{}'.format(n)
+        assets.add_asset(ess)
+
+    container = process_core.ProcessContainer()
+    for n in range(n_processes):
+        container.add_process(BenchSocController(n))
+    container._ready = True  # Independent processes, any order is a valid topological order
+    return assets, container
+
+
+def run_legacy(assets, container):
+    for process in container.process_list:
+        process.run(assets.get_asset)
+
+
+def main(n_processes=500, repeat=3, number=100):
+    assets, container = build(n_processes)
+    container.compile(assets.get_asset)
+
+    legacy_number = max(number // 50, 1)  # Per-cycle resolution is O(processes * assets), keep the run short
+    legacy = min(timeit.repeat(lambda: run_legacy(assets, container), repeat=repeat,
+                               number=legacy_number)) / legacy_number
+    compiled = min(timeit.repeat(lambda: container.run_all(assets.get_asset), repeat=repeat, number=number)) / number
+
+    print('processes: {}'.format(n_processes))
+    print('per-cycle tag resolution: {:8.1f} us/cycle'.format(legacy * 1e6))
+    print('compiled tag plan:        {:8.1f} us/cycle'.format(compiled * 1e6))
+    print('speedup:                  {:8.1f}x'.format(legacy / compiled))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
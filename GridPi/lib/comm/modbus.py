@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+
+""" Asyncio Modbus TCP communications interface.
+
+    ModbusDevice is an asset comm_interface: update_status() awaits read(internal_status) and update_control()
+    awaits write(internal_control). The register map of the device is planned once into blocks: registers at adjacent
+    addresses (or within max_gap of each other) are read with a single read holding registers request. Each block is
+    compiled to one struct format, so a response decodes to scaled values with a single unpack, and writes encode the
+    same way. A device with dozens of registers is polled in a few round trips.
+
+    interface_config:
+        ip_add:     server address
+        port:       server port, default 502
+        unit:       unit id, default 1
+        endian:     byte order of a register, '>' (default) or '<'
+        timeout:    seconds to wait for a response, default 1.0
+        pooled:     share the connections to ip_add:port with the other pooled devices, default False
+        pool_size:  connections of the shared pool, default 2
+        max_gap:    unused registers a block may span to join two reads, default 0
+        poll_classes:   dict(poll class: period in seconds), e.g. {'breaker': 0.1, 'temperature': 10.0}
+        poll_period:    period of the registers without a poll class, default 0 (every read)
+        registers:  list of dict(name, mod_add, type, scale=1.0, access='r', word_swap, poll, deadband=0.0)
+                    type is 16bit_int, 16bit_uint, 32bit_int, 32bit_uint or 32bit_float. access 'rw' registers are
+                    written by write(). word_swap puts the low word first, the default for 32bit_float as read by the
+                    original Comm.ModbusClient. poll names the poll class of the register. A value is reported when
+                    it moves by more than deadband from the last reported value.
+
+    read() polls only the poll classes that are due, blocks are planned within a class, and returns the values that
+    changed. Assets publish those into their status, an unchanged plant costs no status writes.
+"""
+
+import asyncio
+import logging
+import struct
+import time
+from operator import mul
+
+import numpy as np
+
+from GridPi.lib.comm.polling import PollGroup, PollScheduler
+
+READ_HOLDING_REGISTERS = 0x03
+WRITE_MULTIPLE_REGISTERS = 0x10
+MAX_READ_COUNT = 125  # Registers per read request allowed by the protocol
+MAX_WRITE_COUNT = 123
+DEFAULT_POLL_CLASS = 'default'
+
+MBAP = struct.Struct('>HHHB')  # transaction id, protocol id, length, unit id
+
+# type: (struct format without byte order, registers)
+REGISTER_TYPES = {'16bit_int': ('h', 1),
+                  '16bit_uint': ('H', 1),
+                  '32bit_int': ('i', 2),
+                  '32bit_uint': ('I', 2),
+                  '32bit_float': ('f', 2)}
+
+_WORD_SWAP_DEFAULT = {'32bit_float': True}
+
+
+class ModbusError(Exception):
+    """ Modbus exception response or malformed frame """
+
+    def __init__(self, message, function=None, code=None):
+        super(ModbusError, self).__init__(message)
+        self.function = function
+        self.code = code
+
+
+TRANSPORT_ERRORS = (OSError, EOFError, asyncio.TimeoutError, asyncio.IncompleteReadError)  # The connection is lost
+COMM_ERRORS = TRANSPORT_ERRORS + (ModbusError,)  # A failed request
+
+
+class Register(object):
+    """ One value of the register map """
+
+    def __init__(self, name, mod_add, type, scale=1.0, access='r', word_swap=None, endian='>',
+                 poll=None, deadband=0.0):
+        if type not in REGISTER_TYPES:
+            raise ValueError('MODBUS: register {}: unsupported type {!r}'.format(name, type))
+        self.fmt, self.count = REGISTER_TYPES[type]
+        self.name = name
+        self.address = int(mod_add)
+        self.type = type
+        self.scale = float(scale)
+        self.access = access
+        self.word_swap = _WORD_SWAP_DEFAULT.get(type, False) if word_swap is None else word_swap
+        self.endian = endian
+        self.poll = DEFAULT_POLL_CLASS if poll is None else poll
+        self.deadband = float(deadband)
+
+    @property
+    def integer(self):
+        return self.fmt in 'hHiI'
+
+
+class Block(object):
+    """ Registers read or written with one request, compiled once into a struct format for the whole block.
+
+        A response decodes to scaled values with one unpack: unused registers are pad bytes of the format, and the
+        words of word swapped registers are put back in order by a precomputed byte permutation. Encoding is the
+        reverse, one pack of the whole block.
+
+    :param registers: registers sorted by address, none overlapping
+    """
+
+    def __init__(self, registers):
+        self.address = registers[0].address
+        self.count = registers[-1].address + registers[-1].count - self.address
+        self.names = tuple(register.name for register in registers)
+        self.scales = tuple(register.scale for register in registers)
+        self.integer = tuple(register.integer for register in registers)
+
+        fmt, order, cursor = [registers[0].endian], np.arange(2 * self.count), self.address
+        for register in registers:
+            if register.address > cursor:
+                fmt.append('{}x'.format(2 * (register.address - cursor)))
+            fmt.append(register.fmt)
+            if register.word_swap and register.count == 2:
+                offset = 2 * (register.address - self.address)
+                order[offset:offset + 4] = order[offset:offset + 4][[2, 3, 0, 1]]
+            cursor = register.address + register.count
+        self.codec = struct.Struct(''.join(fmt))
+        self._order = order if (order != np.arange(2 * self.count)).any() else None
+
+    def decode(self, data, values):
+        """ Decode a response into values, one unpack and one scaling pass for the block """
+        if self._order is not None:
+            data = np.frombuffer(data, dtype=np.uint8)[self._order].tobytes()
+        values.update(zip(self.names, map(mul, self.codec.unpack(data), self.scales)))
+
+    def encode(self, values):
+        """ :return: bytes of the block, from values by register name """
+        raw = self.codec.pack(*[round(values[name] / scale) if integer else values[name] / scale
+                                for name, scale, integer in zip(self.names, self.scales, self.integer)])
+        if self._order is not None:
+            raw = np.frombuffer(raw, dtype=np.uint8)[self._order].tobytes()  # Swapping words is its own inverse
+        return raw
+
+
+def plan_blocks(registers, max_gap=0, max_count=MAX_READ_COUNT):
+    """ Merge registers into the fewest blocks.
+
+    :param registers: list of Register
+    :param max_gap: largest number of unused registers a block may span
+    :param max_count: largest block size in registers
+    :return: list of Block, in address order
+    """
+    blocks, current, end = list(), list(), None
+    for register in sorted(registers, key=lambda register: register.address):
+        register_end = register.address + register.count
+        if current and (register.address - end > max_gap or register_end - current[0].address > max_count):
+            blocks.append(Block(current))
+            current = list()
+        if current and register.address < end:
+            raise ValueError('MODBUS: register {} overlaps the register before it'.format(register.name))
+        current.append(register)
+        end = register_end if len(current) == 1 else max(end, register_end)
+    if current:
+        blocks.append(Block(current))
+    return blocks
+
+
+class ModbusClient(object):
+    """ Request PDUs of the supported functions, over the transport of a subclass """
+
+    async def request(self, pdu):
+        """ Send one request PDU and return the response PDU """
+        assert 0, "request not implemented"
+
+    async def read_holding_registers(self, address, count):
+        """ :return: bytes, 2 per register """
+        pdu = await self.request(struct.pack('>BHH', READ_HOLDING_REGISTERS, address, count))
+        if len(pdu) < 2 or pdu[1] != 2 * count or len(pdu) != 2 + 2 * count:
+            raise ModbusError('MODBUS CLIENT: malformed read response', READ_HOLDING_REGISTERS)
+        return pdu[2:]
+
+    async def write_registers(self, address, data):
+        """ :param data: bytes, 2 per register """
+        count = len(data) // 2
+        await self.request(struct.pack('>BHHB', WRITE_MULTIPLE_REGISTERS, address, count, len(data)) + data)
+
+
+def check_response(pdu):
+    """ :raise ModbusError: pdu is an exception response """
+    if not pdu:
+        raise ModbusError('MODBUS CLIENT: empty response')
+    if pdu[0] & 0x80:
+        raise ModbusError('MODBUS CLIENT: exception code {}'.format(pdu[1] if len(pdu) > 1 else None),
+                          pdu[0] & 0x7F, pdu[1] if len(pdu) > 1 else None)
+    return pdu
+
+
+class ModbusTcpClient(ModbusClient):
+    """ Minimal asyncio Modbus TCP client, one request in flight at a time.
+
+    :param host: server address
+    :param port: server port
+    :param unit: unit id
+    :param timeout: seconds to wait for connection and responses
+    """
+
+    def __init__(self, host, port=502, unit=1, timeout=1.0):
+        self.host = host
+        self.port = int(port)
+        self.unit = int(unit)
+        self.timeout = timeout
+
+        self._reader = None
+        self._writer = None
+        self._transaction = 0
+        self._lock = asyncio.Lock()
+        self.requests = 0
+
+    @property
+    def connected(self):
+        return self._writer is not None
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port),
+                                                            self.timeout)
+        logging.debug('MODBUS CLIENT: connected to %s:%d', self.host, self.port)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def request(self, pdu):
+        """ Send one request PDU and return the response PDU. The connection is closed on transport errors, an
+            exception response is a valid reply and leaves it open.
+        """
+        async with self._lock:
+            if not self.connected:
+                await self.connect()
+            try:
+                response = await asyncio.wait_for(self._exchange(pdu), self.timeout)
+            except TRANSPORT_ERRORS:
+                self.close()
+                raise
+        return check_response(response)
+
+    async def _exchange(self, pdu):
+        self._transaction = (self._transaction + 1) & 0xFFFF
+        self._writer.write(MBAP.pack(self._transaction, 0, len(pdu) + 1, self.unit) + pdu)
+        await self._writer.drain()
+        self.requests += 1
+
+        transaction, protocol, length, unit = MBAP.unpack(await self._reader.readexactly(MBAP.size))
+        response = await self._reader.readexactly(length - 1)
+        if transaction != self._transaction:
+            self.close()  # Out of step with the server, the responses that follow cannot be matched either
+            raise ModbusError('MODBUS CLIENT: transaction id mismatch')
+        return response
+
+
+class ModbusDevice(object):
+    """ Asset communications interface for a Modbus TCP device.
+
+    :param interface_config: see the module documentation
+    :param client: optional ModbusClient, by default one is created from interface_config
+    """
+
+    def __init__(self, interface_config, client=None):
+        endian = interface_config.get('endian', '>')
+        self.registers = [Register(endian=endian, **reg) for reg in interface_config['registers']]
+        self.client = client or _client(interface_config)
+
+        poll_classes = dict(interface_config.get('poll_classes', {}))
+        poll_classes.setdefault(DEFAULT_POLL_CLASS, interface_config.get('poll_period', 0.0))
+        by_class = dict()
+        for register in self.registers:
+            if register.poll not in poll_classes:
+                raise ValueError('MODBUS: register {}: unknown poll class {!r}'.format(register.name, register.poll))
+            by_class.setdefault(register.poll, list()).append(register)
+
+        max_gap = int(interface_config.get('max_gap', 0))
+        self.scheduler = PollScheduler([PollGroup(name, poll_classes[name], plan_blocks(registers, max_gap))
+                                        for name, registers in by_class.items()])
+        self.read_blocks = [block for group in self.scheduler.groups for block in group.blocks]
+        self._deadbands = {register.name: register.deadband for register in self.registers}
+        self._writable = {register.name: register for register in self.registers if 'w' in register.access}
+        self._write_plans = dict()  # Names of the registers written: blocks
+        self.values = {register.name: None for register in self.registers}  # Last reported value table
+
+    async def read(self, internal_status, now=None):
+        """ Poll the poll classes that are due and report by exception: only values that changed by more than
+            their deadband since they were last reported are copied into internal_status.
+
+            Poll classes succeed or fail as a whole. The values of a class are reported as soon as it is read, a class
+            that fails stays due and is read on the next poll, the other due classes are still read and reported.
+
+        :param internal_status: dict(name: value) of the asset
+        :param now: monotonic time of the poll, defaults to now
+        :return: dict(name: value) of every changed register
+        :raise: the error of the first class that failed, once every due class was polled
+        """
+        now = time.monotonic() if now is None else now
+        changed, error = dict(), None
+        for group in self.scheduler.due(now):
+            polled = dict()
+            try:
+                for block in group.blocks:
+                    block.decode(await self.client.read_holding_registers(block.address, block.count), polled)
+            except COMM_ERRORS as group_error:
+                logging.warning('MODBUS: poll class %s failed: %r', group.name, group_error)
+                if error is None:
+                    error = group_error
+                continue
+
+            for name, value in polled.items():
+                last = self.values[name]
+                if last is None or abs(value - last) > self._deadbands[name]:
+                    changed[name] = self.values[name] = value
+                    if name in internal_status:
+                        internal_status[name] = value
+            self.scheduler.done(group, now)  # Only once its values are applied
+
+        if error is not None:
+            raise error
+        return changed
+
+    async def write(self, internal_control):
+        """ Write the writable registers named in internal_control, adjacent registers in one request """
+        names = tuple(key for key, val in internal_control.items() if key in self._writable and val is not None)
+        blocks = self._write_plans.get(names)
+        if blocks is None:  # First write of this set of registers
+            blocks = self._write_plans[names] = plan_blocks([self._writable[name] for name in names],
+                                                            max_count=MAX_WRITE_COUNT)
+        for block in blocks:
+            await self.client.write_registers(block.address, block.encode(internal_control))
+
+
+def _client(interface_config):
+    """ Own connection per device, or a unit of the shared pool of the endpoint when interface_config['pooled'] """
+    host, port = interface_config['ip_add'], interface_config.get('port', 502)
+    unit, timeout = interface_config.get('unit', 1), interface_config.get('timeout', 1.0)
+    if interface_config.get('pooled', False):
+        from GridPi.lib.comm.pool import get_pool  # The pool builds on this module
+        return get_pool(host, port, size=interface_config.get('pool_size', 2), timeout=timeout).client(unit)
+    return ModbusTcpClient(host, port=port, unit=unit, timeout=timeout)
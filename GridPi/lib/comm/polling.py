@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+""" Poll classes for report-by-exception device polling.
+
+    The registers of a device are split into poll classes, each with its own period: breaker status every 100 ms,
+    temperatures and ratings every 10 s. PollScheduler hands out the groups that are due, fastest class first, so a
+    read only touches the registers whose period has elapsed. A group is rescheduled one period after its previous
+    due time, or one period after now when it has fallen behind, so a late read does not trigger a burst of catch-up
+    reads. Groups due within slack seconds count as due, a class polled at the control cycle rate is not skipped
+    because of cycle jitter.
+"""
+
+
+class PollGroup(object):
+    """ Registers of one poll class
+
+    :param name: poll class name
+    :param period: seconds between reads, 0 reads on every poll
+    :param blocks: request blocks of the registers in the class
+    """
+
+    def __init__(self, name, period, blocks):
+        self.name = name
+        self.period = float(period)
+        self.blocks = blocks
+        self.next_due = float('-inf')  # Due on the first poll
+        self.reads = 0
+
+
+class PollScheduler(object):
+    """ Due time bookkeeping of the poll groups of a device
+
+    :param groups: list of PollGroup
+    :param slack: seconds early a group may be read
+    """
+
+    def __init__(self, groups, slack=0.01):
+        self.slack = slack
+        self._groups = sorted(groups, key=lambda group: group.period)  # Fastest class has the highest priority
+
+    @property
+    def groups(self):
+        return self._groups
+
+    @property
+    def next_due(self):
+        """ Earliest due time of any group """
+        return min(group.next_due for group in self._groups) if self._groups else float('inf')
+
+    def due(self, now):
+        """ :return: list of the groups due at now, highest priority first """
+        return [group for group in self._groups if group.next_due - self.slack <= now]
+
+    def done(self, group, now):
+        """ group was read at now, schedule its next read """
+        group.reads += 1
+        group.next_due += group.period
+        if group.next_due <= now:
+            group.next_due = now + group.period
+
+    def reset(self):
+        """ Make every group due, e.g. after a reconnect """
+        for group in self._groups:
+            group.next_due = float('-inf')
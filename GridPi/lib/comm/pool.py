@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+
+""" Shared Modbus TCP connections to a gateway.
+
+    Devices behind one Modbus TCP gateway differ only by unit id. Instead of a connection per device, every device of
+    an endpoint (host, port) submits its requests to the ConnectionPool of the endpoint, which pipelines them over a
+    few sockets: each connection keeps up to max_pipeline requests in flight and matches the responses by transaction
+    id. Adding a device adds a queue, not a socket or a task.
+
+    Scheduling is round robin over the unit ids with queued requests, one request per unit per turn, so a device
+    polling many blocks cannot starve the others. A connection that drops fails its in-flight requests and reconnects,
+    waiting backoff seconds after each failed attempt, doubled up to max_backoff. A request that times out frees its
+    slot without dropping the connection, a late response is discarded; one unresponsive unit behind the gateway does
+    not disturb the others.
+
+    Pools belong to the event loop they are first used from.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+from GridPi.lib.comm.modbus import MBAP, ModbusClient, ModbusError, check_response
+
+_pools = dict()  # (host, port): ConnectionPool
+
+
+def get_pool(host, port=502, **kwargs):
+    """ Shared pool of an endpoint, created with kwargs on first use """
+    key = (host, int(port))
+    if key not in _pools or _pools[key].closed:
+        _pools[key] = ConnectionPool(host, port, **kwargs)
+    return _pools[key]
+
+
+def close_pools():
+    for pool in _pools.values():
+        pool.close()
+    _pools.clear()
+
+
+class LatencyStats(object):
+    """ Request counters and response times of one unit, in seconds. errors counts the failed requests that were not
+        timeouts, exceptions those of them the device answered with a Modbus exception response. Only successful
+        requests count toward the response times.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.exceptions = 0
+        self.timeouts = 0
+        self.last = None
+        self.min = None
+        self.max = None
+        self._total = 0.0
+        self._wait = 0.0
+
+    @property
+    def mean(self):
+        """ Mean time from send to response """
+        completed = self.requests - self.errors - self.timeouts
+        return self._total / completed if completed else None
+
+    @property
+    def mean_wait(self):
+        """ Mean time queued before the request was sent """
+        return self._wait / self.requests if self.requests else None
+
+    def record(self, latency, wait):
+        self.requests += 1
+        self.last = latency
+        self.min = latency if self.min is None else min(self.min, latency)
+        self.max = latency if self.max is None else max(self.max, latency)
+        self._total += latency
+        self._wait += wait
+
+    def record_error(self, timeout=False, exception=False):
+        self.requests += 1
+        if timeout:
+            self.timeouts += 1
+        else:
+            self.errors += 1
+            self.exceptions += int(exception)
+
+    def as_dict(self):
+        return {'requests': self.requests,
+                'errors': self.errors,
+                'exceptions': self.exceptions,
+                'timeouts': self.timeouts,
+                'last': self.last,
+                'min': self.min,
+                'max': self.max,
+                'mean': self.mean,
+                'mean_wait': self.mean_wait}
+
+
+class _Request(object):
+    __slots__ = ('unit', 'pdu', 'future', 'connection', 'transaction', 'queued', 'sent')
+
+    def __init__(self, unit, pdu, future):
+        self.unit = unit
+        self.pdu = pdu
+        self.future = future
+        self.connection = None
+        self.transaction = None
+        self.queued = time.monotonic()
+        self.sent = None
+
+
+class _Connection(object):
+    """ One socket of a pool, with its requests in flight """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.pending = dict()  # transaction id: _Request
+        self.connects = 0
+        self._writer = None
+        self._transaction = 0
+        self._task = None
+        self._delay = pool.backoff
+
+    @property
+    def connected(self):
+        return self._writer is not None
+
+    @property
+    def ready(self):
+        return self._writer is not None and len(self.pending) < self.pool.max_pipeline
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        self._close(ConnectionError('MODBUS POOL: pool closed'))
+
+    def send(self, request):
+        self._transaction = (self._transaction + 1) & 0xFFFF
+        while self._transaction in self.pending:
+            self._transaction = (self._transaction + 1) & 0xFFFF
+        request.connection, request.transaction, request.sent = self, self._transaction, time.monotonic()
+        self.pending[self._transaction] = request
+        self._writer.write(MBAP.pack(self._transaction, 0, len(request.pdu) + 1, request.unit) + request.pdu)
+
+    def forget(self, request):
+        """ Free the slot of a request that timed out, its response is discarded if it still arrives """
+        if self.pending.get(request.transaction) is request:
+            del self.pending[request.transaction]
+
+    async def _run(self):
+        pool = self.pool
+        while not pool.closed:
+            try:
+                reader, self._writer = await asyncio.wait_for(asyncio.open_connection(pool.host, pool.port),
+                                                              pool.timeout)
+            except (OSError, asyncio.TimeoutError) as error:
+                logging.warning('MODBUS POOL: %s:%d connect failed, retry in %.2f s: %s',
+                                pool.host, pool.port, self._delay, error)
+                await asyncio.sleep(self._delay)
+                self._delay = min(2 * self._delay, pool.max_backoff)
+                continue
+
+            self.connects += 1
+            self._delay = pool.backoff
+            logging.debug('MODBUS POOL: connected to %s:%d', pool.host, pool.port)
+            pool.dispatch()
+            try:
+                while True:
+                    transaction, protocol, length, unit = MBAP.unpack(await reader.readexactly(MBAP.size))
+                    pdu = await reader.readexactly(length - 1)
+                    request = self.pending.pop(transaction, None)
+                    if request is None:
+                        logging.debug('MODBUS POOL: discarded response to transaction %d', transaction)
+                    elif not request.future.done():
+                        request.future.set_result(pdu)
+                    pool.dispatch()
+            except (OSError, EOFError, asyncio.IncompleteReadError) as error:
+                logging.warning('MODBUS POOL: %s:%d connection lost: %s', pool.host, pool.port, error)
+                self._close(ConnectionError('MODBUS POOL: connection lost'))
+
+    def _close(self, error):
+        if self._writer is not None:
+            self._writer.close()
+        self._writer = None
+        pending, self.pending = self.pending, dict()
+        for request in pending.values():
+            if not request.future.done():
+                request.future.set_exception(error)
+
+
+class ConnectionPool(object):
+    """ Pipelined connections to one Modbus TCP endpoint, shared by the units behind it.
+
+    :param host: gateway address
+    :param port: gateway port
+    :param size: number of connections
+    :param max_pipeline: requests in flight per connection
+    :param timeout: seconds to wait for connection and responses
+    :param backoff: first reconnect delay in seconds
+    :param max_backoff: largest reconnect delay in seconds
+    """
+
+    def __init__(self, host, port=502, size=2, max_pipeline=4, timeout=1.0, backoff=0.1, max_backoff=5.0):
+        self.host = host
+        self.port = int(port)
+        self.max_pipeline = int(max_pipeline)
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.closed = False
+
+        self.stats = dict()  # unit: LatencyStats
+        self._queues = dict()  # unit: deque of _Request
+        self._ready = deque()  # Units with queued requests, in turn order
+        self._connections = [_Connection(self) for _ in range(int(size))]
+
+    @property
+    def connections(self):
+        return self._connections
+
+    def client(self, unit):
+        """ :return: ModbusClient of one unit behind the endpoint """
+        return PooledClient(self, unit)
+
+    async def submit(self, unit, pdu):
+        """ Queue a request PDU for a unit and return the response PDU """
+        if self.closed:
+            raise ConnectionError('MODBUS POOL: pool closed')
+        request = _Request(unit, pdu, asyncio.get_running_loop().create_future())
+        queue = self._queues.setdefault(unit, deque())
+        if not queue:
+            self._ready.append(unit)
+        queue.append(request)
+        stats = self.stats.setdefault(unit, LatencyStats())
+
+        for connection in self._connections:
+            connection.start()
+        self.dispatch()
+        try:
+            response = await asyncio.wait_for(request.future, self.timeout)
+        except asyncio.TimeoutError:
+            stats.record_error(timeout=True)
+            if request.connection is not None:
+                request.connection.forget(request)  # Still queued requests are skipped by _next()
+            raise
+        except (OSError, EOFError):
+            stats.record_error()
+            raise
+        try:
+            check_response(response)
+        except ModbusError:
+            stats.record_error(exception=True)
+            raise
+        stats.record(time.monotonic() - request.sent, request.sent - request.queued)
+        return response
+
+    def dispatch(self):
+        """ Send queued requests on every connection with a free slot """
+        for connection in self._connections:
+            while connection.ready:
+                request = self._next()
+                if request is None:
+                    return
+                connection.send(request)
+
+    def close(self):
+        self.closed = True
+        for connection in self._connections:
+            connection.stop()
+        for queue in self._queues.values():
+            for request in queue:
+                if not request.future.done():
+                    request.future.set_exception(ConnectionError('MODBUS POOL: pool closed'))
+        self._queues.clear()
+        self._ready.clear()
+
+    def _next(self):
+        """ Next live request, round robin over the units """
+        while self._ready:
+            unit = self._ready.popleft()
+            queue = self._queues[unit]
+            request = queue.popleft()
+            if queue:
+                self._ready.append(unit)
+            if not request.future.done():
+                return request
+        return None
+
+
+class PooledClient(ModbusClient):
+    """ Client of one unit id, sending through a ConnectionPool
+
+    :param pool: ConnectionPool of the endpoint
+    :param unit: unit id
+    """
+
+    def __init__(self, pool, unit):
+        self.pool = pool
+        self.unit = int(unit)
+
+    @property
+    def connected(self):
+        return any(connection.connected for connection in self.pool.connections)
+
+    @property
+    def stats(self):
+        return self.pool.stats.setdefault(self.unit, LatencyStats())
+
+    async def request(self, pdu):
+        return await self.pool.submit(self.unit, pdu)
+
+    def close(self):
+        pass  # The connections belong to the pool
@@ -8,7 +8,7 @@ class State(object):
     def transition(self, s_input, requested_state):
         assert 0, "transition not implemented"
 
-    def action(self, requested_state):
+    def action(self, requested_state, out):
         assert 0, "action not implemented"
 
 
@@ -20,33 +20,132 @@ class StateMachine(object):
         #self.current_state.action(sm_input)
 
     # Template method:
-    def run(self, sm_input):
+    def run(self, sm_input, sm_output=None):
         self.requested_state = self.current_state.request(sm_input)
         self.current_state = self.current_state.transition(sm_input, self.requested_state)
-        return self.current_state.action(self.requested_state)
+        if sm_output is None:
+            sm_output = self.current_state.output_msg()
+        return self.current_state.action(self.requested_state, sm_output)
 
 
 class StateMachineMessage(object):
-    def __init__(self):
-        pass
+    """ Fixed set of message fields, each bound to one asset parameter.
+
+        fields lists (attribute, role, category, param), the role being the class_type of the asset the field acts
+        on. bind() resolves every field through asset_names, role: asset name, to the tag store slot of that named
+        asset once, read() and write() then copy the fields without any asset or parameter lookup. Messages are
+        allocated once per state machine and reused every cycle. read() and write() may be given a store with the
+        same slot layout as the assets' store, e.g. the working store of the control cycle.
+    """
+    __slots__ = ('_bindings',)
+    fields = ()
+
+    def __init__(self, asset_container=None, asset_names=None):
+        for attribute, role, category, param in self.fields:
+            setattr(self, attribute, None)
+        self._bindings = ()
+        if asset_container is not None:
+            self.bind(asset_container, asset_names)
+
+    def bind(self, asset_container, asset_names=None):
+        """ Resolve every field to the named asset of its role
+
+        :param asset_container: AssetContainer holding the assets
+        :param asset_names: dict of role: asset name, None resolves each role to the only asset of its class_type
+        """
+        if asset_names is None:
+            asset_names = default_asset_names(asset_container, {field[1] for field in self.fields})
+        bindings = list()
+        for attribute, role, category, param in self.fields:
+            if role not in asset_names or asset_names[role] not in asset_container:
+                raise KeyError('DISPATCH: no asset named {!r} for role {!r}'.format(asset_names.get(role), role))
+            view = getattr(asset_container.get_asset_by_name(asset_names[role]), category)
+            bindings.append((attribute, view.store, view.slot(param)))
+        self._bindings = tuple(bindings)
+
+    def read(self, store=None):
+        for attribute, bound_store, slot in self._bindings:
+            setattr(self, attribute, (bound_store if store is None else store).get(slot))
+        return self
+
+    def write(self, store=None):
+        for attribute, bound_store, slot in self._bindings:
+            (bound_store if store is None else store).set(slot, getattr(self, attribute))
+
+
+def default_asset_names(asset_container, roles):
+    """ :return: dict of role: name of the only asset of that class_type, the roles of a fleet must be named """
+    asset_names = dict()
+    for role in sorted(roles):
+        try:
+            assets = asset_container.get_asset(role)
+        except KeyError:
+            raise KeyError('DISPATCH: no {} asset'.format(role))
+        if len(assets) != 1 or assets[0].config['name'] is None:
+            raise ValueError('DISPATCH: {} {} assets, name the one dispatch acts on in asset_names'.format(
+                len(assets), role))
+        asset_names[role] = assets[0].config['name']
+    return asset_names
 
 
 """ SUBCLASSES: """
 class DispatchStateMachine(StateMachine):
-    def __init__(self, initial_state):
+    """ Dispatch state machine of the built in states
+
+    :param initial_state: State to start in
+    :param asset_names: dict of role (grid, ess, feeder): name of the asset the states act on, None requires a
+                        single asset of each role's class_type
+    """
+
+    def __init__(self, initial_state, asset_names=None):
         super(DispatchStateMachine, self).__init__(initial_state)
+        self.asset_names = asset_names
+        self._asset_container = None
+        self._asset_count = 0
+        self._inputs = dict()  # state: bound input message
+        self._outputs = dict()  # state: bound output message
 
-    def run_all(self, asset_container):
+    def bind(self, asset_container, states=None):
+        """ Allocate and bind the input and output message of every state, once.
+
+        :param asset_container: AssetContainer the messages read from and write to
+        :param states: states to prepare, defaults to every dispatch state
+        """
+        states = states if states is not None else (blackout_state, grid_state, ess_state)
+        asset_names = self.asset_names
+        if asset_names is None:
+            asset_names = default_asset_names(asset_container, {field[1] for state in states
+                                                                for msg in (state.input_msg, state.output_msg)
+                                                                for field in msg.fields})
+        self._inputs = {state: state.input_msg(asset_container, asset_names) for state in states}
+        self._outputs = {state: state.output_msg(asset_container, asset_names) for state in states}
+        self._asset_container = asset_container
+        self._asset_count = len(asset_container.asset_list)
+
+    def ensure_bound(self, asset_container):
+        """ Bind on the first run, or when the assets changed """
+        if asset_container is not self._asset_container or len(asset_container.asset_list) != self._asset_count:
+            self.bind(asset_container)
+
+    def run_all(self, asset_container, store=None):
         """ Run state_request, state_transition, and state_action
+
+        :param asset_container: AssetContainer of the system
+        :param store: optional store with the same slot layout as the assets' store to read and write instead, e.g.
+                      CycleBuffer.working
         """
-        """ INSTANTIATE INPUT MSG """
-        in_msg = self.current_state.input_msg(asset_container)
+        self.ensure_bound(asset_container)
+
+        """ READ INPUT MSG """
+        in_msg = self._inputs[self.current_state].read(store)
 
         """ RUN STATE """
-        out_msg = self.run(in_msg)
+        self.requested_state = self.current_state.request(in_msg)
+        self.current_state = self.current_state.transition(in_msg, self.requested_state)
+        out_msg = self.current_state.action(self.requested_state, self._outputs[self.current_state])
 
         """ WRITE OUTPUT MSG TO ASSETS"""
-        out_msg.write(asset_container)
+        out_msg.write(store)
 
 
 class Blackout(State):
@@ -81,9 +180,7 @@ class Blackout(State):
         """ No change in state """
         return blackout_state
 
-    def action(self, requested_state):
-
-        out = BlackoutOutput()
+    def action(self, requested_state, out):
 
         out.feeder_run = True
         out.grid_run = False
@@ -93,33 +190,16 @@ class Blackout(State):
 
 
 class BlackoutInput(StateMachineMessage):
-    def __init__(self, asset_container):
-        super(BlackoutInput, self).__init__()
-
-        grid = asset_container.get_asset('grid')[0]
-        ess = asset_container.get_asset('ess')[0]
-
-        self.grid_enabled = grid.status['enabled']
-        self.ess_enabled = ess.status['enabled']
+    fields = (('grid_enabled', 'grid', 'status', 'enabled'),
+              ('ess_enabled', 'ess', 'status', 'enabled'))
+    __slots__ = tuple(field[0] for field in fields)
 
 
 class BlackoutOutput(StateMachineMessage):
-    def __init__(self):
-        super(BlackoutOutput, self).__init__()
-
-        self.grid_run = False
-        self.ess_run = False
-        self.feeder_run = False
-
-    def write(self, asset_container):
-        grid = asset_container.get_asset('grid')[0]
-        grid.control['run'] = self.grid_run
-
-        ess = asset_container.get_asset('ess')[0]
-        ess.control['run'] = self.ess_run
-
-        feeder = asset_container.get_asset('feeder')[0]
-        feeder.control['run'] = self.feeder_run
+    fields = (('grid_run', 'grid', 'control', 'run'),
+              ('ess_run', 'ess', 'control', 'run'),
+              ('feeder_run', 'feeder', 'control', 'run'))
+    __slots__ = tuple(field[0] for field in fields)
 
 
 class GridConnected(State):
@@ -153,9 +233,7 @@ class GridConnected(State):
         """ No change in state """
         return grid_state
 
-    def action(self, requested_state):
-
-        out = GridConnectedOutput()
+    def action(self, requested_state, out):
 
         out.ess_state_cmd = 1  # (0 = State.STANDBY, 1 = State.PQ, 2 = State.VF)
         out.feeder_run = True
@@ -167,35 +245,17 @@ class GridConnected(State):
 
 
 class GridConnectedInput(StateMachineMessage):
-    def __init__(self, asset_container):
-        super(GridConnectedInput, self).__init__()
-
-        grid = asset_container.get_asset('grid')[0]
-        ess = asset_container.get_asset('ess')[0]
-
-        self.grid_enabled = grid.status['enabled']
-        self.ess_online = ess.status['online']
-        #self.ess_enabled = ess.status['enabled']
+    fields = (('grid_enabled', 'grid', 'status', 'enabled'),
+              ('ess_online', 'ess', 'status', 'online'))
+    __slots__ = tuple(field[0] for field in fields)
 
 
 class GridConnectedOutput(StateMachineMessage):
-    def __init__(self):
-        super(GridConnectedOutput, self).__init__()
-        self.grid_run = False
-        self.ess_run = False
-        self.ess_state_cmd = 0
-        self.feeder_run = False
-
-    def write(self, asset_container):
-        grid = asset_container.get_asset('grid')[0]
-        grid.control['run'] = self.grid_run
-
-        ess = asset_container.get_asset('ess')[0]
-        ess.control['run'] = self.ess_run
-        ess.control['state_cmd'] = self.ess_state_cmd
-
-        feeder = asset_container.get_asset('feeder')[0]
-        feeder.control['run'] = self.feeder_run
+    fields = (('grid_run', 'grid', 'control', 'run'),
+              ('ess_run', 'ess', 'control', 'run'),
+              ('ess_state_cmd', 'ess', 'control', 'state_cmd'),
+              ('feeder_run', 'feeder', 'control', 'run'))
+    __slots__ = tuple(field[0] for field in fields)
 
 
 class ESSGridForming(State):
@@ -228,9 +288,7 @@ class ESSGridForming(State):
         """ No change in state """
         return ess_state
 
-    def action(self, requested_state):
-
-        out = ESSOutput()
+    def action(self, requested_state, out):
 
         out.feeder_run = True
         out.ess_state_cmd = 2 # State.VF
@@ -241,38 +299,20 @@ class ESSGridForming(State):
 
 
 class ESSInput(StateMachineMessage):
-    def __init__(self, asset_container):
-        super(ESSInput, self).__init__()
-
-        grid = asset_container.get_asset('grid')[0]
-        ess = asset_container.get_asset('ess')[0]
-
-        self.grid_breaker_closed = grid.status['online']
-        self.grid_enabled = grid.status['enabled']
-
-        self.ess_online = ess.status['online']
-        self.ess_alarm = ess.status['alarm']
-        self.ess_enabled = ess.status['enabled']
+    fields = (('grid_breaker_closed', 'grid', 'status', 'online'),
+              ('grid_enabled', 'grid', 'status', 'enabled'),
+              ('ess_online', 'ess', 'status', 'online'),
+              ('ess_alarm', 'ess', 'status', 'alarm'),
+              ('ess_enabled', 'ess', 'status', 'enabled'))
+    __slots__ = tuple(field[0] for field in fields)
 
 
 class ESSOutput(StateMachineMessage):
-    def __init__(self):
-        super(ESSOutput, self).__init__()
-        self.grid_run = False
-        self.ess_run = False
-        self.ess_state_cmd = 0
-        self.feeder_run = False
-
-    def write(self, asset_container):
-        grid = asset_container.get_asset('grid')[0]
-        grid.control['run'] = self.grid_run
-
-        ess = asset_container.get_asset('ess')[0]
-        ess.control['run'] = self.ess_run
-        ess.control['state_cmd'] = self.ess_state_cmd
-
-        feeder = asset_container.get_asset('feeder')[0]
-        feeder.control['run'] = self.feeder_run
+    fields = (('grid_run', 'grid', 'control', 'run'),
+              ('ess_run', 'ess', 'control', 'run'),
+              ('ess_state_cmd', 'ess', 'control', 'state_cmd'),
+              ('feeder_run', 'feeder', 'control', 'run'))
+    __slots__ = tuple(field[0] for field in fields)
 
 
 blackout_state = Blackout()
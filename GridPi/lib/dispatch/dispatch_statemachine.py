@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+
+""" Table driven dispatch state machine.
+
+    The states, their outputs and their transitions are declared in a config file instead of State classes:
+
+        [DISPATCH]
+        initial_state: blackout
+
+        [signal:grid_enabled]
+        target: grid            # asset name, class_type or group
+        category: status
+        param: enabled
+        reduce: any             # any or all of the target assets
+
+        [state:blackout]
+        name: Blackout State
+        transitions: grid_connected if grid_enabled
+                     ess_grid_forming if ess_enabled and not grid_enabled
+        outputs: feeder.run = true
+                 grid.run = false
+        permit: not grid_enabled    # optional, the state is entered only while this guard holds
+
+    Signals reduce a boolean parameter over every asset of their target, so one signal covers a site with many ESS
+    or grid interties. Output targets are resolved the same way and are written to every matching asset. Guards are
+    'always' or terms joined by 'and', each term a signal optionally preceded by 'not'. The first transition whose
+    guard holds is the requested state, a state without a matching transition requests itself. As with the request and
+    transition steps of the built in states, a request is not always granted: the machine moves to the requested state
+    only while its permit guard holds, else it stays and requested_state keeps the pending request.
+
+    Compiling evaluates every guard of every state for every combination of signal values up front, into a table
+    of the requested state indexed by (state, signal bits), and of every state's permit by (state, signal bits). A
+    cycle is then one gather of the signal parameters, two table lookups and one scatter of the outputs of the
+    current state, whatever the number of states and transitions.
+"""
+
+import logging
+
+import numpy as np
+
+from GridPi.lib.models.tag_store import KIND_BOOL, KIND_FLOAT, KIND_INT
+
+MAX_SIGNALS = 16  # The transition table has 2 ** signals columns per state
+
+
+class Signal(object):
+    """ Boolean parameter reduced over the assets of a target """
+
+    def __init__(self, name, target, category, param, reduce='any'):
+        if reduce not in ('any', 'all'):
+            raise ValueError('DISPATCH TABLE: signal {}: reduce must be any or all, got {!r}'.format(name, reduce))
+        self.name = name
+        self.target = target
+        self.category = category
+        self.param = param
+        self.reduce = reduce
+
+
+class TableState(object):
+    """ Compiled dispatch state
+
+    :param name: display name
+    :param key: name of the state in the table
+    :param outputs: list of (target, category, param, value)
+    :param transitions: list of (target state key, guard), guard is a list of (signal name, required value)
+    :param permit: guard that must hold to enter the state, None always permits
+    """
+
+    def __init__(self, key, name, outputs, transitions, permit=None):
+        self.key = key
+        self.name = name
+        self.outputs = outputs
+        self.transitions = transitions
+        self.permit = permit if permit is not None else []
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.key)
+
+
+class TableStateMachine(object):
+    """ Dispatch state machine compiled from a transition table, drop in replacement for DispatchStateMachine.
+
+    :param signals: list of Signal
+    :param states: list of TableState
+    :param initial_state: key of the initial state
+    """
+
+    def __init__(self, signals, states, initial_state):
+        if len(signals) > MAX_SIGNALS:
+            raise ValueError('DISPATCH TABLE: at most {} signals are supported, got {}'.format(MAX_SIGNALS,
+                                                                                            len(signals)))
+        self._signals = list(signals)
+        self._states = list(states)
+        self._index = {state.key: n for n, state in enumerate(self._states)}
+        if initial_state not in self._index:
+            raise ValueError('DISPATCH TABLE: unknown initial state {!r}'.format(initial_state))
+
+        self._table, self._permit = self._compile()
+        self._current = self._index[initial_state]
+        self.current_state = self._states[self._current]
+        self.requested_state = self.current_state
+
+        self._asset_container = None
+        self._asset_count = 0
+        self._store = None
+        self._slots = None  # Signal parameter slots, grouped by signal
+        self._starts = None  # Start of each non-empty signal group in self._slots
+        self._uniform = False  # Every signal has assets and all use the same reduction
+        self._reduce = None
+        self._present = None  # Signals with at least one asset
+        self._is_all = np.array([signal.reduce == 'all' for signal in self._signals], dtype=bool)
+        self._weights = 1 << np.arange(len(self._signals), dtype=np.int64)
+        self._writes = list()  # Per state: (slots, values, kinds)
+
+    @property
+    def states(self):
+        return self._states
+
+    @property
+    def table(self):
+        """ Requested state index by [state index, signal bits] """
+        return self._table
+
+    @property
+    def permit(self):
+        """ True by [state index, signal bits] when the state may be entered """
+        return self._permit
+
+    @classmethod
+    def from_config(cls, config):
+        """ Build the state machine from a ConfigParser, see the module documentation for the format """
+        signals = list()
+        states = list()
+        for section in config.sections():
+            kind, _, key = section.partition(':')
+            cfg = config[section]
+            if kind == 'signal':
+                signals.append(Signal(key, cfg['target'], cfg.get('category', 'status'), cfg['param'],
+                                      cfg.get('reduce', 'any')))
+            elif kind == 'state':
+                states.append(TableState(key, cfg.get('name', key),
+                                         [_parse_output(line) for line in _lines(cfg.get('outputs', ''))],
+                                         [_parse_transition(line) for line in _lines(cfg.get('transitions', ''))],
+                                         _parse_guard(cfg.get('permit', 'always'), section)))
+        return cls(signals, states, config['DISPATCH']['initial_state'])
+
+    def bind(self, asset_container):
+        """ Resolve the signal and output targets to tag store slots, once """
+        self._store = asset_container.tag_store
+
+        slots, counts = list(), list()
+        for signal in self._signals:
+            signal_slots = [self._slot(asset, signal.category, signal.param)
+                            for asset in _resolve(asset_container, signal.target)]
+            slots.extend(signal_slots)
+            counts.append(len(signal_slots))
+        counts = np.array(counts, dtype=np.intp)
+        self._slots = np.array(slots, dtype=np.intp)
+        self._present = counts > 0
+        self._starts = (np.cumsum(counts) - counts)[self._present]
+        self._uniform = bool(self._present.all() and len(set(self._is_all)) == 1)
+        self._reduce = np.logical_and if self._is_all.all() else np.logical_or
+
+        self._writes = list()
+        for state in self._states:
+            slots, values, kinds = list(), list(), list()
+            for target, category, param, value in state.outputs:
+                for asset in _resolve(asset_container, target):
+                    slots.append(self._slot(asset, category, param))
+                    values.append(float(value))
+                    kinds.append(KIND_BOOL if isinstance(value, bool) else
+                                 KIND_INT if isinstance(value, int) else KIND_FLOAT)
+            self._writes.append((np.array(slots, dtype=np.intp), np.array(values, dtype=np.float64),
+                                 np.array(kinds, dtype=np.int8)))
+
+        self._asset_container = asset_container
+        self._asset_count = len(asset_container.asset_list)
+
+    def signal_bits(self, store=None):
+        """ :return: int, bit n set when signal n holds """
+        store = self._store if store is None else store
+        truth = np.abs(store.values[self._slots]) > 0  # Parameters holding None read as NaN, they count as False
+        if self._uniform:  # Every signal has assets and the same reduction, the common case
+            return int(self._reduce.reduceat(truth, self._starts).dot(self._weights))
+        held = ~self._present & self._is_all  # all() of no assets holds, any() does not
+        if len(self._starts):
+            held[self._present] = np.where(self._is_all[self._present],
+                                           np.logical_and.reduceat(truth, self._starts),
+                                           np.logical_or.reduceat(truth, self._starts))
+        return int(held.dot(self._weights))
+
+    def ensure_bound(self, asset_container):
+        """ Bind on the first run, or when the assets changed """
+        if asset_container is not self._asset_container or len(asset_container.asset_list) != self._asset_count:
+            self.bind(asset_container)
+
+    def run_all(self, asset_container, store=None):
+        """ Read the signals, request a state, transition to it if permitted and write the outputs of the current state
+
+        :param asset_container: AssetContainer of the system
+        :param store: optional store with the same slot layout as the assets' store, e.g. CycleBuffer.working
+        """
+        self.ensure_bound(asset_container)
+
+        bits = self.signal_bits(store)
+        requested = int(self._table[self._current, bits])
+        self.requested_state = self._states[requested]
+        if self._permit[requested, bits]:
+            self._current = requested
+        self.current_state = self._states[self._current]
+
+        slots, values, kinds = self._writes[self._current]
+        (self._store if store is None else store).put(slots, values, kinds)
+
+    def _compile(self):
+        bit = {signal.name: n for n, signal in enumerate(self._signals)}
+        codes = np.arange(1 << len(self._signals), dtype=np.int64)
+        table = np.empty((len(self._states), len(codes)), dtype=np.intp)
+        permit = np.empty((len(self._states), len(codes)), dtype=bool)
+
+        def holds(state, guard):
+            result = np.ones(len(codes), dtype=bool)
+            for signal, required in guard:
+                if signal not in bit:
+                    raise ValueError('DISPATCH TABLE: state {}: unknown signal {!r}'.format(state.key, signal))
+                result &= ((codes >> bit[signal]) & 1).astype(bool) == required
+            return result
+
+        for n, state in enumerate(self._states):
+            table[n] = n
+            for target, guard in reversed(state.transitions):  # Earlier transitions take precedence
+                if target not in self._index:
+                    raise ValueError('DISPATCH TABLE: state {}: unknown target state {!r}'.format(state.key, target))
+                table[n][holds(state, guard)] = self._index[target]
+            permit[n] = holds(state, state.permit)
+        logging.debug('DISPATCH TABLE: compiled %d states, %d signals', len(self._states), len(self._signals))
+        return table, permit
+
+    @staticmethod
+    def _slot(asset, category, param):
+        view = getattr(asset, category)
+        if param not in view:
+            view[param] = None  # Allocate the parameter, it is written by the state machine
+        return view.slot(param)
+
+
+def _resolve(asset_container, target):
+    """ Assets matching target: an asset name, then a class_type, then a group """
+    if target in asset_container:
+        return [asset_container.get_asset_by_name(target)]
+    try:
+        return asset_container.get_asset(target)
+    except KeyError:
+        return asset_container.get_group(target)
+
+
+def _lines(text):
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def _parse_value(text):
+    text = text.strip()
+    if text.lower() in ('true', 'false'):
+        return text.lower() == 'true'
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def _parse_output(line):
+    """ 'target.param = value' or 'target.category.param = value', the default category is control """
+    lhs, _, value = line.partition('=')
+    parts = lhs.strip().split('.')
+    if len(parts) == 2:
+        parts.insert(1, 'control')
+    if len(parts) != 3 or not value.strip():
+        raise ValueError('DISPATCH TABLE: invalid output {!r}'.format(line))
+    return parts[0], parts[1], parts[2], _parse_value(value)
+
+
+def _parse_transition(line):
+    """ 'state if [not] signal and [not] signal ...' or 'state if always' """
+    target, _, condition = line.partition(' if ')
+    if not condition.strip():
+        raise ValueError('DISPATCH TABLE: invalid transition {!r}'.format(line))
+    return target.strip(), _parse_guard(condition, line)
+
+
+def _parse_guard(condition, context):
+    """ '[not] signal and [not] signal ...' or 'always', to a list of (signal name, required value) """
+    guard = list()
+    if condition.strip() != 'always':
+        for term in condition.split(' and '):
+            words = term.split()
+            if len(words) == 2 and words[0] == 'not':
+                guard.append((words[1], False))
+            elif len(words) == 1:
+                guard.append((words[0], True))
+            else:
+                raise ValueError('DISPATCH TABLE: invalid guard term {!r} in {!r}'.format(term, context))
+    return guard
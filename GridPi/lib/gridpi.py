@@ -1,30 +1,37 @@
 #!/usr/bin/env python3
 
 import asyncio
+import logging
 import os
 from configparser import ConfigParser
 from datetime import datetime
 from collections import namedtuple
 
-from GridPi.lib import gridpi_core
+from GridPi.lib import gridpi_core, scheduler
+from GridPi.lib.dispatch import dispatch_statemachine
 from GridPi.lib.models import model_core, virtual_system
-from GridPi.lib.persistence import persistence_core
+from GridPi.lib.persistence import history, persistence_core, writer
 from GridPi.lib.process import process_core
 
 
-async def update_assets_loop(system, poll_rate):
+async def update_assets_loop(system, cycle_scheduler, asset_timeout, history_store, persistence_writer):
 
     while True:
         #try:
-            # Collect updateStatus() method references for each asset and package as coroutine task.
+            await cycle_scheduler.wait()  # Release the cycle at its absolute deadline
+
+            # Read every asset, stragglers are marked stale and the cycle continues with their last good values.
             #print('[{time}] reading assets'.format(time=datetime.now().time()))
-            await asyncio.gather(*[asset.update_status() for asset in system.asset_container.asset_list])
+            await system.asset_container.update_status(timeout=asset_timeout)
+
+            # Freeze this cycle's input frame, processes read and write a working copy of it
+            system.begin_cycle()
 
             # Run calculate status processes
             #print('[{time}] run process'.format(time=datetime.now().time()))
             system.run_processes()
 
-            # Run the state macine
+            # Run the state macine, against the same working copy: it sees this cycle's process outputs
             #print('[{time}] run state machine'.format(time=datetime.now().time()))
             system.run_state_machine()
             print('[{time}] Current state: ({state}); Requesting: ({req_state})'.\
@@ -32,10 +39,21 @@ async def update_assets_loop(system, poll_rate):
                          state=system.state_machine.current_state.name,
                          req_state=system.state_machine.requested_state.name))
 
-            # Collect updateWrite() method references for each asset and package as coroutine task.
+            # Commit process outputs to the assets and publish the frame for persistence and the HMI
+            frame = system.commit_cycle()
+            history_store.append(frame)  # Row copy only, chunks are sealed by the persistence writer
+            persistence_writer.submit(frame)  # Never blocks, the writer thread does the database I/O
+
+            # Write every asset, a write that overruns is left to finish in the background.
             #print('[{time}] writing assets'.format(time=datetime.now().time()))
-            await asyncio.gather(*[asset.update_control() for asset in system.asset_container.asset_list])
-            await asyncio.sleep(poll_rate)
+            await system.asset_container.update_control(timeout=asset_timeout)
+
+            cycle_scheduler.complete()  # Record cycle timing and schedule the next deadline
+            if cycle_scheduler.stats.overrun_last:
+                logging.warning('Cycle overrun: %.3f s (overruns: %d, skipped: %d)',
+                                cycle_scheduler.stats.overrun_last,
+                                cycle_scheduler.stats.overruns,
+                                cycle_scheduler.stats.skipped)
 
         #except Exception as e:
             #print(e, "*** Unrecoverable error, shutting down... ***")
@@ -46,46 +64,31 @@ async def update_assets_loop(system, poll_rate):
             #break
 
 
-async def update_persistent_storage(system, database, poll_rate):
-
-    status_payload = dict()
-    status_pkg = dict()
-    ctrl_payload = dict()
-    pkg = namedtuple('pkg', 'asset, param_loc, param')
-
+def setup_persistent_storage(system, database):
+    """ Register every asset and its parameters in the database. Runs once, before the persistence writer starts.
+    """
     for asset in system.asset_container.asset_list:
         database.add_asset(asset.config['class_type'])
         database.add_asset_params(asset.config['class_type'], 0, list(asset.status.keys()))
         database.add_asset_params(asset.config['class_type'], 0, list(asset.control.keys()))
         database.add_asset_params(asset.config['class_type'], 1, list(asset.remote_control.keys()))
 
-        """payload: dict(AssetName: dict{param_name_1: value_1, ..., param_name_n, value_n}} """
-        status_payload.update({asset.config['class_type']: dict()})
-        status_payload[asset.config['class_type']].update(asset.status.items())
-        status_payload[asset.config['class_type']].update(asset.control.items())
+    database.load_param_ids()  # Resolve parameter ids once, write_param() only sends changed values
 
-        ctrl_payload.update({asset.config['class_type']: dict()})
-        ctrl_payload[asset.config['class_type']].update(asset.remote_control.items())
 
+async def update_persistent_storage(system, persistence_writer, poll_rate):
+    """ Apply remote control values read from the database by the persistence writer thread. All database I/O runs on
+        the writer thread, this task never blocks the event loop.
+    """
     while True:
         try:
-            #print('[{time}] connecting to database'.format(time=datetime.now().time()))
-
-            """ Write database with Asset status information """
-            for asset in system.asset_container.asset_list:
-                status_payload[asset.config['class_type']].update(asset.status.items())
-                status_payload[asset.config['class_type']].update(asset.control.items())
-                database.write_param(payload=status_payload)
+            payload = persistence_writer.take_remote_control()
+            if payload is not None:
+                for asset, params in payload.items():
+                    local_asset = system.asset_container.get_asset(asset)[0]
+                    for param, val in params.items():
+                        local_asset.remote_control[param] = val
 
-            """ Read Asset control information from database """
-
-            payload = database.read_param(payload=ctrl_payload)
-            for asset, params in payload.items():
-                local_asset = system.asset_container.get_asset(asset)[0]
-                for param, val in params.items():
-                    local_asset.remote_control[param] = val
-
-            #print('[{time}] disconnecting from database'.format(time=datetime.now().time()))
             await asyncio.sleep(poll_rate)
         except Exception as e:
             print('GP Database Loop Error: {error}'.format(error=e))
@@ -108,11 +111,29 @@ def main(*args, **kwargs):
         tagbus object.
     """
     gp = gridpi_core.System()  # Create System container object
+    bootstrap_parser = kwargs['bootstrap']
+    parser = ConfigParser()
+
+    # dispatch, optional. Name of the asset the built in dispatch states act on for each role, and the state machine
+    state_machine = 'states'
+    if bootstrap_parser.has_section('DISPATCH'):
+        dispatch_cfg = bootstrap_parser['DISPATCH']
+        gp.state_machine.asset_names = {role: dispatch_cfg[role] for role in ('grid', 'ess', 'feeder')
+                                        if role in dispatch_cfg}
+        state_machine = dispatch_cfg.get('state_machine', state_machine)
+    if state_machine not in ('states', 'table'):
+        raise ValueError('DISPATCH: state_machine must be states or table, got {!r}'.format(state_machine))
+
+    # read dispatch config.ini, opt in. Replaces the built in dispatch states with a transition table
+    if state_machine == 'table':
+        dispatch_cfg_path = bootstrap_parser['BOOTSTRAP']['dispatch_cfg_local_path']
+        parser.read(dispatch_cfg_path)
+        gp.state_machine = dispatch_statemachine.TableStateMachine.from_config(parser)
+        parser.clear()
+
     vs = virtual_system.Virtual_System(gp.state_machine, gp.asset_container)  # virtual system for testing
 
     # read asset config.ini
-    bootstrap_parser = kwargs['bootstrap']
-    parser = ConfigParser()
     parser.read(bootstrap_parser['BOOTSTRAP']['asset_cfg_local_path'])
     asset_factory = model_core.AssetFactory()  # Create Asset Factory object
     for cfg in parser.sections():
@@ -127,6 +148,14 @@ def main(*args, **kwargs):
         gp.add_process(process_factory.factory(parser[cfg]))
     del process_factory
 
+    # read process execution config, optional section of bootstrap.ini
+    process_cfg = bootstrap_parser['PROCESS'] if bootstrap_parser.has_section('PROCESS') else {}
+    max_workers = process_cfg.get('max_workers')
+    gp.process_container.configure_execution(process_cfg.get('execution', 'serial'),
+                                             max_workers=int(max_workers) if max_workers else None)
+    gp.process_container.configure_change_tracking(process_cfg.get('change_tracking', 'false').lower() == 'true',
+                                                   refresh_interval=int(process_cfg.get('refresh_interval', 0)))
+
     # read persistent storage config.ini
     parser.clear()
     parser.read(bootstrap_parser['BOOTSTRAP']['persistence_cfg_local_path'])
@@ -134,14 +163,39 @@ def main(*args, **kwargs):
     for cfg in parser.sections():
         db = persistence_factory.factory(parser[cfg])
     del persistence_factory
+
+    # read cycle scheduler config, optional section of bootstrap.ini
+    scheduler_cfg = bootstrap_parser['SCHEDULER'] if bootstrap_parser.has_section('SCHEDULER') else {}
+    cycle_scheduler = scheduler.CycleScheduler(period=float(scheduler_cfg.get('period', .1)),
+                                               policy=scheduler_cfg.get('skip_policy', 'drop'))
+    asset_timeout = float(scheduler_cfg.get('asset_timeout', .4 * cycle_scheduler.nominal_period))
+    gp.asset_container.default_timeout = asset_timeout
+
+    # read parameter history config, optional section of bootstrap.ini
+    history_cfg = bootstrap_parser['HISTORY'] if bootstrap_parser.has_section('HISTORY') else {}
+    history_store = history.HistoryStore(gp.asset_container.tag_store,
+                                         chunk_size=int(history_cfg.get('chunk_size', 600)),
+                                         retention=float(history_cfg.get('retention', 600.0)),
+                                         max_bytes=int(history_cfg.get('max_bytes', 32 * 2 ** 20)),
+                                         sink=db if hasattr(db, 'write_history') else None)
+
+    # read persistence writer config, optional section of bootstrap.ini
+    writer_cfg = bootstrap_parser['WRITER'] if bootstrap_parser.has_section('WRITER') else {}
+    setup_persistent_storage(gp, db)
+    persistence_writer = writer.PersistenceWriter(db, gp.asset_container.asset_list, history_store,
+                                                  max_queue=int(writer_cfg.get('max_queue', 4)),
+                                                  coalesce=writer_cfg.get('coalesce', 'true').lower() == 'true',
+                                                  drop_policy=writer_cfg.get('drop_policy', 'drop_oldest'),
+                                                  read_interval=float(writer_cfg.get('read_interval', .2)))
+    persistence_writer.start()
     del bootstrap_parser
     del parser
 
     gp.process_container.sort()  # Sort the process tags by dependency
 
     loop = asyncio.get_event_loop()  # Get event loop
-    loop.create_task(update_assets_loop(gp, poll_rate=.1))
-    loop.create_task(update_persistent_storage(gp, db, .2))
+    loop.create_task(update_assets_loop(gp, cycle_scheduler, asset_timeout, history_store, persistence_writer))
+    loop.create_task(update_persistent_storage(gp, persistence_writer, .2))
     loop.create_task(update_virtual_system(vs))
 
     try:
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-from GridPi.lib.models import model_core
+from GridPi.lib.models import model_core, tag_store
 from GridPi.lib.process import process_core
 from GridPi.lib.dispatch import dispatch_core
 
@@ -15,6 +15,7 @@ class System(object):
         self._asset_container = model_core.AssetContainer()
         self._process_container = process_core.ProcessContainer()
         self._state_machine = dispatch_core.DispatchStateMachine(dispatch_core.blackout_state)
+        self._cycle_buffer = tag_store.CycleBuffer(self._asset_container.tag_store)
 
     @property
     def asset_container(self):
@@ -28,14 +29,48 @@ class System(object):
     def state_machine(self):
         return self._state_machine
 
+    @state_machine.setter
+    def state_machine(self, state_machine):
+        self._state_machine = state_machine
+
+    @property
+    def cycle_buffer(self):
+        return self._cycle_buffer
+
+    @property
+    def committed_frame(self):
+        """ Last committed cycle frame, safe to read from any task or thread without copying """
+        return self._cycle_buffer.committed
+
     def add_asset(self, new_asset):
         self._asset_container.add_asset(new_asset)
+        self._process_container.rebind_assets(self._asset_container.get_asset)  # Fleet tags follow the asset list
 
     def add_process(self, new_process):
+        new_process.bind_assets(self._asset_container.get_asset)  # Fleet processes declare a tag per asset
         self._process_container.add_process(new_process)
 
+    def begin_cycle(self):
+        """ Freeze asset state into the cycle input frame, processes run against a working copy of it """
+        return self._cycle_buffer.begin()
+
+    def commit_cycle(self):
+        """ Commit the cycle outputs to the assets and publish the committed frame """
+        return self._cycle_buffer.commit()
+
     def run_processes(self):
-        self._process_container.run_all(self._asset_container.get_asset)  # 1. passing the get_assets() method only
+        # Outside of begin_cycle()/commit_cycle() the processes run directly against the live asset parameters
+        store = self._cycle_buffer.working if self._cycle_buffer.active else None
+        self._process_container.run_all(self._asset_container.get_asset, store)  # 1. passing get_assets() only
 
     def run_state_machine(self):
-        self._state_machine.run_all(self._asset_container)  # 2. passing the entire asset_container class
+        """ Inside begin_cycle()/commit_cycle() dispatch runs against the same working store as the processes, after
+            them: it reads this cycle's process outputs, and where both write a parameter the dispatch output is the
+            one committed.
+        """
+        if not self._cycle_buffer.active:
+            self._state_machine.run_all(self._asset_container)  # 2. passing the entire asset_container class
+            return
+        self._state_machine.ensure_bound(self._asset_container)
+        self._cycle_buffer.extend()  # Parameters allocated by the bind are new in the live store
+        self._state_machine.run_all(self._asset_container, self._cycle_buffer.working)
@@ -22,9 +22,11 @@ class VirtualEnergyStorage(EnergyStorage):
             'state_cmd': EnergyStorage.State.STANDBY
         })
 
-        self.comm_interface = VESDevice(**kwargs)  # Configure the communications interface (virtual component)
         self.read_config(config_dict)  # Write parameters in this model that match keys in the dictionary
 
+        # Configure the communications interface, a device of the vectorized virtual plant
+        self.comm_interface = kwargs['virtual_system'].add_device('ess', kw_rated=self._config['cap_kw_pos_rated'])
+
         logging.debug('ASSET INTERFACE: %s constructed', self._config['name'])
 
     def __del__(self):
@@ -66,65 +68,64 @@ class VESDevice(model_statemachine.StateMachine):
     def __init__(self, **kwargs):
 
         # Keep the persistent information about the device here.
-        self.kw = 0
-        self.soc = 0.5
-        self.kwh_capacity_rated = 30.0
-        self.online = False
-        self.run_cmd = False
-        self.initialized = False
-        self.kw_setpoint = 0
-        self.looptime = time.time()
-        self.state_cmd = EnergyStorage.State.STANDBY
-
-        self.virtual_system = kwargs['virtual_system']
+        self.record = VESRecord(looptime=time.time(), virtual_system=kwargs['virtual_system'])
 
         model_statemachine.StateMachine.__init__(self, state_initialize,  # Initialize State Machine
-                                                 Input(self.__dict__))
+                                                 self.record)
 
     async def read(self, internal_status):
-        """ Read state_machine_output class dict keys into internal_status
+        """ Read state record fields into internal_status
         """
 
         self.device_update()
         await asyncio.sleep(random.random())  # FUZZING
-        self.looptime = time.time()
+        self.record.looptime = time.time()
 
-        for key in internal_status.keys():
-            internal_status[key] = self.__dict__[key]
+        self.record.copy_to(internal_status)
 
     async def write(self, internal_control):
-        """ Write internal_ctrl values to state_machine_input class dict keys
+        """ Write internal_ctrl values to state record fields
         """
-        for key, val in internal_control.items():
-            self.__dict__[key] = val
+        self.record.update(internal_control)
 
         logging.debug('VirtualEnergyStorage.StateMachine.state input: %s', internal_control)
         self.device_update()
         await asyncio.sleep(random.random())  # FUZZING
-        self.looptime = time.time()
+        self.record.looptime = time.time()
 
     def device_update(self):
-        """ Run state machine, this would ideally go into a parallel loop.
+        """ Run state machine, this would ideally go into a parallel loop. States update the record in place.
         """
-        sm_output = self.run(Input(self.__dict__))
+        self.run(self.record)
+
 
-        for key, val in sm_output.__dict__.items():
-            setattr(self, key, val)
+class VESRecord(model_statemachine.StateRecord):
+    """ State of a virtual energy storage device
+    """
+    defaults = (('kw', 0.0),
+                ('soc', 0.5),
+                ('kwh_capacity_rated', 30.0),
+                ('online', False),
+                ('run_cmd', False),
+                ('initialized', False),
+                ('kw_setpoint', 0.0),
+                ('looptime', 0.0),
+                ('state_cmd', EnergyStorage.State.STANDBY),
+                ('virtual_system', None))
+    __slots__ = tuple(field for field, value in defaults)
 
 
 class Initialize(model_statemachine.State):
     """ Startup state for the VES
     """
 
-    def run(self, sm_input):
+    def run(self, record):
         logging.debug('VirtualEnergyStorage.StateMachine.State: Initialize')
-        sm_output = Output(dict())
+        record.initialized = True
+        return record
 
-        setattr(sm_output, 'initialized', True)
-        return sm_output
-
-    def next(self, sm_input):
-        if getattr(sm_input, 'initialized') == True:
+    def next(self, record):
+        if record.initialized:
             return state_offline
         return state_initialize
 
@@ -133,26 +134,19 @@ class Offline(model_statemachine.State):
     """ Offline state for the VES
     """
 
-    def run(self, sm_input):
+    def run(self, record):
         logging.debug('VirtualEnergyStorage.StateMachine.State: Offline')
-        sm_output = Output(dict())  # create output msg object
 
         """ Calculate Online Status: """
-        setattr(sm_output, 'online', False)
-
-        """ Calculate SOC """
-        soc = getattr(sm_input, 'soc')
-        setattr(sm_output, 'soc', soc)
-
-        """ Calculate kW output """
-        setattr(sm_output, 'kw', 0.0)
+        record.online = False
 
-        logging.debug('VirtualEnergyStorage.StateMachine.State output: %s', sm_output.__dict__)
-        return sm_output
+        """ Calculate kW output, SOC is held """
+        record.kw = 0.0
+        return record
 
-    def next(self, sm_input):
-        if getattr(sm_input, 'run_cmd') == True:
-            if getattr(sm_input, 'state_cmd') == EnergyStorage.State.VF.value:
+    def next(self, record):
+        if record.run_cmd:
+            if record.state_cmd == EnergyStorage.State.VF.value:
                 return state_onlineVF
             else:
                 return state_onlinePQ
@@ -163,36 +157,23 @@ class OnlinePQ(model_statemachine.State):
     """ Online state for the VES
     """
 
-    def run(self, sm_input):
+    def run(self, record):
         logging.debug('VirtualEnergyStorage.StateMachine.State: Online - P/Q')
-        sm_output = Output(dict())  # create output msg object
 
         """ Calculate Online Status: """
-        setattr(sm_output, 'online', True)
+        record.online = True
 
         """ Calculate SOC """
-        soc = getattr(sm_input, 'soc')
-        kwh_rated = getattr(sm_input, 'kwh_capacity_rated')
-        kw = getattr(sm_input, 'kw')
-        looptime_hr = (time.time() - getattr(sm_input, 'looptime')) / 3600.0
-
-        soc = (soc * kwh_rated - kw * looptime_hr) / kwh_rated
-        setattr(sm_output, 'soc', soc)
+        record.soc = integrate_soc(record)
 
         """ Calculate kW output """
-        kw_setpoint = getattr(sm_input, 'kw_setpoint')
-        setattr(sm_output, 'kw', kw_setpoint)
-
-        """ Voltage / Frequency"""
-        setattr(sm_output, 'volt')
+        record.kw = record.kw_setpoint
+        return record
 
-        logging.debug('VirtualEnergyStorage.StateMachine.State output: %s', sm_output.__dict__)
-        return sm_output
-
-    def next(self, sm_input):
-        if getattr(sm_input, 'run_cmd') == False:
+    def next(self, record):
+        if not record.run_cmd:
             return state_offline
-        if getattr(sm_input, 'state_cmd') == EnergyStorage.State.VF.value:
+        if record.state_cmd == EnergyStorage.State.VF.value:
             return state_onlineVF
         return state_onlinePQ
 
@@ -201,52 +182,31 @@ class OnlineVF(model_statemachine.State):
     """ Online state for the VES
     """
 
-    def run(self, sm_input):
+    def run(self, record):
         logging.debug('VirtualEnergyStorage.StateMachine.State: Online - V/F')
-        sm_output = Output(dict())  # create output msg object
 
         """ Calculate Online Status: """
-        setattr(sm_output, 'online', True)
+        record.online = True
 
         """ Calculate SOC """
-        soc = getattr(sm_input, 'soc')
-        kwh_rated = getattr(sm_input, 'kwh_capacity_rated')
-        kw = getattr(sm_input, 'kw')
-        looptime_hr = (time.time() - getattr(sm_input, 'looptime')) / 3600.0
-
-        soc = (soc * kwh_rated - kw * looptime_hr) / kwh_rated
-        setattr(sm_output, 'soc', soc)
+        record.soc = integrate_soc(record)
 
         """ Calculate kW output """
-        # pull value calculated in virtual system
-        kw = getattr(sm_input, 'virtual_system').ess_kw
-        setattr(sm_output, 'kw', kw) # pull value calculated in virtual system
-
-        logging.debug('VirtualEnergyStorage.StateMachine.State output: %s', sm_output.__dict__)
-        return sm_output
+        record.kw = record.virtual_system.ess_kw  # pull value calculated in virtual system
+        return record
 
-    def next(self, sm_input):
-        if getattr(sm_input, 'run_cmd') == False:
+    def next(self, record):
+        if not record.run_cmd:
             return state_offline
-        elif getattr(sm_input, 'state_cmd') == EnergyStorage.State.PQ.value:
+        elif record.state_cmd == EnergyStorage.State.PQ.value:
             return state_onlinePQ
         return state_onlineVF
 
 
-class Input(object):
-    """ Input messaging object for the Virtual Energy persistence State Machine
-    """
-
-    def __init__(self, sm_input):
-        self.__dict__.update(sm_input)
-
-
-class Output(object):
-    """ Output messaging object for the Virtual Energy persistence State Machine
-    """
-
-    def __init__(self, outpt):
-        self.__dict__.update(outpt)
+def integrate_soc(record):
+    """ SOC after discharging at record.kw since record.looptime """
+    looptime_hr = (time.time() - record.looptime) / 3600.0
+    return (record.soc * record.kwh_capacity_rated - record.kw * looptime_hr) / record.kwh_capacity_rated
 
 
 # Static variable initialization:
@@ -23,9 +23,15 @@ class VirtualFeeder(Feeder):
             'open_breaker': False
         })
 
-        self.comm_interface = VFDevice(**kwargs)  # Configure the communications interface (virtual component)
+        self._config.update({
+            'load_kw': 10.0  # Simulated load behind the feeder breaker
+        })
+
         self.read_config(config_dict)  # Write parameters in this model that match keys in the dictionary
 
+        # Configure the communications interface, a device of the vectorized virtual plant
+        self.comm_interface = kwargs['virtual_system'].add_device('feeder', load_kw=self._config['load_kw'])
+
         logging.debug('ASSET INTERFACE: %s constructed', self._config['name'])
 
     def __del__(self):
@@ -63,68 +69,67 @@ class VFDevice(model_statemachine.StateMachine):
     def __init__(self, **kwargs):
 
         # Keep the persistent information about the device here.
-        self.kw = 0.0
-        self.breaker_open = True
-        self.breaker_trip = False
-        self.close_breaker = False
-        self.open_breaker = False
-
-        self.initialized = False
-        self.looptime = time.time()
-
-        self.virtual_system = kwargs['virtual_system']
+        self.record = VFRecord(looptime=time.time(), virtual_system=kwargs['virtual_system'])
 
         model_statemachine.StateMachine.__init__(self, state_initialize,  # Initialize State Machine
-                                           Input(self.__dict__))
+                                                 self.record)
 
     async def read(self, internal_status):
-        """ Read state_machine_output class dict keys into internal_status
+        """ Read state record fields into internal_status
         """
         self.deviceUpdate()
         await asyncio.sleep(random.random())  # FUZZING
-        self.looptime = time.time()
+        self.record.looptime = time.time()
 
-        for key in internal_status.keys():
-            internal_status[key] = self.__dict__[key]
+        self.record.copy_to(internal_status)
 
     async def write(self, internal_control):
-        """ Write internal_ctrl values to state_machine_input class dict keys
+        """ Write internal_ctrl values to state record fields
         """
-        for key, val in internal_control.items():
-            self.__dict__[key] = val
+        self.record.update(internal_control)
 
         logging.debug('VirtualFeeder.StateMachine.state input: %s', internal_control)
         self.deviceUpdate()
         await asyncio.sleep(random.random())  # FUZZING
-        self.looptime = time.time()
+        self.record.looptime = time.time()
 
     def deviceUpdate(self):
-        """ Run state machine, this would ideally go into a parallel loop.
+        """ Run state machine, this would ideally go into a parallel loop. States update the record in place.
 
         """
-        sm_output = self.run(Input(self.__dict__))
+        self.run(self.record)
+
+
+class VFRecord(model_statemachine.StateRecord):
+    """ State of a virtual breaker
+    """
+    defaults = (('kw', 0.0),
+                ('breaker_open', True),
+                ('breaker_trip', False),
+                ('close_breaker', False),
+                ('open_breaker', False),
+                ('initialized', False),
+                ('looptime', 0.0),
+                ('virtual_system', None))
+    __slots__ = tuple(field for field, value in defaults)
 
-        for key, val in sm_output.__dict__.items():
-            setattr(self, key, val)
 
 class Initialize(model_statemachine.State):
-    """ Startup state for the VES
+    """ Startup state for the breaker
     """
-    def run(self, sm_input):
+    def run(self, record):
         logging.debug('VirtualFeeder.StateMachine.State: Initialize')
-        sm_output = Output(dict())
 
         """ Set Initialization Boolean """
-        setattr(sm_output, 'initialized', True)
+        record.initialized = True
+        return record
 
-        return sm_output
+    def next(self, record):
 
-    def next(self, sm_input):
-
-        if getattr(sm_input, 'initialized'):
-            if getattr(sm_input, 'breaker_trip'):
+        if record.initialized:
+            if record.breaker_trip:
                 return state_tripped
-            if not getattr(sm_input, 'breaker_open'):
+            if not record.breaker_open:
                 return state_closed
             else:
                 return state_open
@@ -132,91 +137,69 @@ class Initialize(model_statemachine.State):
 
 
 class BreakerTripped(model_statemachine.State):
-    """ Startup state for the VES
+    """ Tripped state for the breaker
     """
-    def run(self, sm_input):
+    def run(self, record):
         logging.debug('VirtualFeeder.StateMachine.State: Tripped')
-        sm_output = Output(dict())
 
         """ Breaker Trip Booleans """
-        setattr(sm_output, 'breaker_open', True)
+        record.breaker_open = True
 
         """ Breaker kW Export """
-        setattr(sm_output, 'kw', 0.0)
-
-        logging.debug('VirtualFeeder.StateMachine.State output: %s', sm_output.__dict__)
-        return sm_output
+        record.kw = 0.0
+        return record
 
-    def next(self, sm_input):
-        if getattr(sm_input, 'open_breaker'):
+    def next(self, record):
+        if record.open_breaker:
             return state_open
         return state_tripped
 
 
 class BreakerOpen(model_statemachine.State):
-    """ Offline state for the VES
+    """ Open state for the breaker
     """
-    def run(self, sm_input):
+    def run(self, record):
         logging.debug('VirtualFeeder.StateMachine.State: BreakerOpen')
-        sm_output = Output(dict())  # create output msg object
 
         """ Breaker Trip Booleans """
-        setattr(sm_output, 'breaker_trip', False)
-        setattr(sm_output, 'breaker_open', True)
+        record.breaker_trip = False
+        record.breaker_open = True
 
         """ Breaker kW Export """
-        setattr(sm_output, 'kw', 0.0)
+        record.kw = 0.0
+        return record
 
-        logging.debug('VirtualFeeder.StateMachine.State output: %s', sm_output.__dict__)
-        return sm_output
-
-    def next(self, sm_input):
-        if getattr(sm_input, 'breaker_trip'):
+    def next(self, record):
+        if record.breaker_trip:
             return state_tripped
-        if getattr(sm_input, 'close_breaker'): #and not getattr(sm_input, 'open_breaker'):
+        if record.close_breaker:  # and not record.open_breaker
             return state_closed
         return state_open
 
 
 class BreakerClosed(model_statemachine.State):
-    """ Online state for the VES
+    """ Closed state for the breaker
     """
-    def run(self, sm_input):
+    def run(self, record):
         logging.debug('VirtualFeeder.StateMachine.State: BreakerClosed')
-        sm_output = Output(dict())  # create output msg object
 
         """ Breaker Trip Booleans """
-        setattr(sm_output, 'breaker_open', False)
+        record.breaker_open = False
 
         """ Breaker kW Export """
-        kw = getattr(sm_input, 'virtual_system').feeder_kw
-        setattr(sm_output, 'kw', kw)  # pull value calculated in virtual system
-
-        logging.debug('VirtualFeeder.StateMachine.State output: %s', sm_output.__dict__)
-        return sm_output
+        record.kw = record.virtual_system.feeder_kw  # pull value calculated in virtual system
+        return record
 
-    def next(self, sm_input):
-        if getattr(sm_input, 'breaker_trip'):
+    def next(self, record):
+        if record.breaker_trip:
             return state_tripped
-        if not getattr(sm_input, 'close_breaker') and getattr(sm_input, 'open_breaker'):
+        if not record.close_breaker and record.open_breaker:
             return state_open
         return state_closed
 
 
-class Input(object):
-    """ Input messaging object for the Virtual Energy persistence State Machine
-    """
-    def __init__(self, sm_input):
-        self.__dict__.update(sm_input)
-
-class Output(object):
-    """ Output messaging object for the Virtual Energy persistence State Machine
-    """
-    def __init__(self, outpt):
-        self.__dict__.update(outpt)
-
 # Static variable initialization:
 state_initialize = Initialize()
 state_open = BreakerOpen()
 state_closed = BreakerClosed()
-state_tripped = BreakerTripped()
\ No newline at end of file
+state_tripped = BreakerTripped()
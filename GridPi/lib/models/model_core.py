@@ -1,7 +1,14 @@
 #!/usr/bin/env python3
+import asyncio
+import inspect
 import logging
+import time
 from enum import Enum
 
+from GridPi.lib.models import tag_store
+
+DEFAULT_ASSET_TIMEOUT = 0.04  # [s], 0.4 of the default 0.1 s cycle, used when neither the asset nor the caller sets one
+
 
 def isfloat(x):
     try:
@@ -44,30 +51,192 @@ class AssetFactory(object):
 
 
 class AssetContainer(object):
+    """ Registry of the assets of a system.
+
+        Assets are indexed when they are added, so every lookup is a dictionary or list access:
+            by name:        get_asset_by_name('inverter'), names must be unique
+            by class_type:  get_asset('ess'), list in the order the assets were added
+            by id:          get_asset_by_id(n), n is the registration order, see asset_id()
+            by group:       get_group('north_array'), from the comma separated 'groups' config parameter
+            by site:        get_site('plant_1'), from the 'site' config parameter
+            by parent:      get_children('feeder'), from the 'parent' config parameter (name of the parent asset)
+
+        The class_type, group, site and children views are kept up to date as assets are added, callers must not
+        modify the returned lists.
+    """
+
     def __init__(self):
 
         self._asset_list = list()
-        #self._asset_dict = {}
-        self._asset_roster = {}
+        self._asset_dict = dict()  # name: asset
+        self._asset_ids = dict()  # asset: id
+        self._asset_roster = {}  # class_type: [asset, ...]
+        self._groups = dict()  # group: [asset, ...]
+        self._sites = dict()  # site: [asset, ...]
+        self._children = dict()  # parent name: [asset, ...]
+        self._tag_store = tag_store.TagStore()
+
+        self.default_timeout = DEFAULT_ASSET_TIMEOUT  # Timeout of assets without comm_timeout, when none is passed
+        self._pending_status = {}  # Outstanding update_status() tasks that overran their timeout, keyed by asset
+        self._pending_control = {}  # Outstanding update_control() tasks that overran their timeout, keyed by asset
 
     @property
     def asset_list(self):
         return self._asset_list
 
+    @property
+    def tag_store(self):
+        return self._tag_store
+
+    @property
+    def stale_assets(self):
+        return [asset for asset in self._asset_list if asset.stale]
+
+    @property
+    def groups(self):
+        return self._groups.keys()
+
+    @property
+    def sites(self):
+        return self._sites.keys()
+
+    def __len__(self):
+        return len(self._asset_list)
+
+    def __contains__(self, name):
+        return name in self._asset_dict
+
     def add_asset(self, asset_obj):
+        name = asset_obj.config['name']
+        if name is not None and name in self._asset_dict:
+            raise ValueError('ASSET CONTAINER: duplicate asset name {!r}'.format(name))
 
-        # List of assets
+        # List of assets, the position is the asset id
+        self._asset_ids[asset_obj] = len(self._asset_list)
         self._asset_list.append(asset_obj)
+        if name is not None:
+            self._asset_dict[name] = asset_obj
+
+        # Asset parameters are stored in the central tag store from now on
+        asset_obj.attach(self._tag_store)
 
         # Dictionary of asset lists, grouped by asset type.
-        try:
-            self._asset_roster[asset_obj.config['class_type']].append(asset_obj)
-        except (TypeError, KeyError):
-            self._asset_roster.update({asset_obj.config['class_type']: [asset_obj]})
+        self._asset_roster.setdefault(asset_obj.config['class_type'], list()).append(asset_obj)
+
+        for group in asset_obj.groups:
+            self._groups.setdefault(group, list()).append(asset_obj)
+        if asset_obj.config['site'] is not None:
+            self._sites.setdefault(asset_obj.config['site'], list()).append(asset_obj)
+        if asset_obj.config['parent'] is not None:
+            self._children.setdefault(asset_obj.config['parent'], list()).append(asset_obj)
 
     def get_asset(self, class_type):
         return self._asset_roster[class_type]
 
+    def get_asset_by_name(self, name):
+        return self._asset_dict[name]
+
+    def get_asset_by_id(self, asset_id):
+        return self._asset_list[asset_id]
+
+    def asset_id(self, asset_obj):
+        return self._asset_ids[asset_obj]
+
+    def get_group(self, group):
+        """ :return: list of assets in group, empty if there are none """
+        return self._groups.get(group, [])
+
+    def get_site(self, site):
+        """ :return: list of every asset of site, at any level of the hierarchy """
+        return self._sites.get(site, [])
+
+    def get_children(self, name):
+        """ :return: list of assets whose parent is the asset called name """
+        return self._children.get(name, [])
+
+    def get_parent(self, asset_obj):
+        """ :return: parent asset, or None for an asset directly under its site """
+        parent = asset_obj.config['parent']
+        return self._asset_dict.get(parent) if parent is not None else None
+
+    def hierarchy(self):
+        """ Site, parent and asset tree of the registry.
+
+        :return: dict(site: dict(top level asset name: [child asset, ...]))
+        """
+        tree = dict()
+        for asset in self._asset_list:
+            if asset.config['parent'] is None:
+                tree.setdefault(asset.config['site'], dict())[asset.config['name']] = self.get_children(
+                    asset.config['name'])
+        return tree
+
+    async def update_status(self, timeout=None):
+        """ Run update_status() on every asset concurrently, waiting at most the asset's comm timeout for each one.
+            Assets that do not answer in time keep their last good values and are marked stale. Their read is left
+            running in the background, and no new read is started for that asset until it has finished.
+
+        :param timeout: default timeout in seconds, used for assets that do not configure 'comm_timeout'. None uses
+                        self.default_timeout
+        :return: list of assets that did not complete the read this cycle
+        """
+        completed, failed = await self._update_all('update_status', self._pending_status, timeout)
+
+        now = time.monotonic()
+        for asset in completed:
+            asset.mark_fresh(now)
+        for asset in failed:
+            asset.mark_stale(now)
+        return failed
+
+    async def update_control(self, timeout=None):
+        """ Run update_control() on every asset concurrently, waiting at most the asset's comm timeout for each one.
+            A write that overruns is left running, the next write for that asset is started once it has finished.
+
+        :param timeout: default timeout in seconds, used for assets that do not configure 'comm_timeout'. None uses
+                        self.default_timeout
+        :return: list of assets that did not complete the write this cycle
+        """
+        _, failed = await self._update_all('update_control', self._pending_control, timeout)
+        return failed
+
+    async def _update_all(self, method_name, pending, timeout):
+        tasks = dict()
+        for asset in self._asset_list:
+            task = pending.pop(asset, None)
+            if task is None:
+                result = getattr(asset, method_name)()
+                if not inspect.isawaitable(result):
+                    continue  # Synchronous archetype, already complete
+                task = asyncio.ensure_future(result)
+            tasks[asset] = task
+
+        timeout = timeout or self.default_timeout  # Never None, an unbounded wait would block the cycle on a straggler
+        await asyncio.gather(*[self._wait_task(task, asset.comm_timeout or timeout) for asset, task in tasks.items()])
+
+        completed, failed = list(), list()
+        for asset, task in tasks.items():
+            if not task.done():
+                logging.warning('ASSET CONTAINER: %s %s() timed out, using last good values',
+                                asset.config['name'], method_name)
+                pending[asset] = task
+                failed.append(asset)
+            elif task.cancelled() or task.exception():
+                logging.warning('ASSET CONTAINER: %s %s() failed: %s', asset.config['name'], method_name,
+                                'cancelled' if task.cancelled() else task.exception())
+                failed.append(asset)
+            else:
+                completed.append(asset)
+        return completed, failed
+
+    @staticmethod
+    async def _wait_task(task, timeout):
+        """ Wait for task without cancelling it on timeout """
+        try:
+            await asyncio.wait_for(asyncio.shield(task), timeout)
+        except Exception:
+            pass  # Timeouts and task errors are inspected by the caller
+
 
 class Asset(object):
     """Basic asset in power system.
@@ -75,17 +244,26 @@ class Asset(object):
     """
 
     def __init__(self):
-        # Asset Configuration:
-        self._config = dict()
-        self._status = dict()
-        self._control = dict()
-        self._remote_control = dict()
+        # Asset parameters are views into a tag store. Each asset starts with a private store and is moved into the
+        # central store of the AssetContainer it is added to, see attach().
+        store = tag_store.TagStore(capacity=32)
+        self._config = tag_store.TagView(store, self, 'config')
+        self._status = tag_store.TagView(store, self, 'status')
+        self._control = tag_store.TagView(store, self, 'control')
+        self._remote_control = tag_store.TagView(store, self, 'remote_control')
 
         self._comm_interface = None  # Communications Interface Object
 
+        self._last_update = None  # Monotonic time of the last successful status read
+        self._stale_since = None  # Monotonic time of the first missed status read, None while fresh
+
         self._config.update({
             'name': None,
             'class_name': None,
+            'comm_timeout': 0.0,  # Status/control timeout [s], 0.0 uses the system default
+            'site': None,  # Site the asset belongs to
+            'parent': None,  # Name of the asset one level up in the site hierarchy, e.g. a feeder
+            'groups': None,  # Comma separated group names
             #  'freq_rated': None,
             #  'volt_rated': None,
             #  'cap_kva_rated': 0.0,
@@ -107,7 +285,8 @@ class Asset(object):
             'alarm': False,
             #  'warning': False,
             #  'caution': False,
-            'online': False
+            'online': False,
+            'stale': False,
             # ' on_system': False
         })
 
@@ -133,6 +312,51 @@ class Asset(object):
     def remote_control(self):
         return self._remote_control
 
+    @property
+    def tag_store(self):
+        return self._status.store
+
+    def attach(self, store):
+        """ Move every parameter of this asset into store """
+        for view in (self._config, self._status, self._control, self._remote_control):
+            view.rebind(store)
+
+    @property
+    def groups(self):
+        """ :return: list of the group names the asset belongs to """
+        groups = self._config['groups']
+        if not groups:
+            return []
+        return [group.strip() for group in str(groups).split(',') if group.strip()]
+
+    @property
+    def comm_timeout(self):
+        return self._config['comm_timeout']
+
+    @property
+    def stale(self):
+        return self._stale_since is not None
+
+    @property
+    def last_update(self):
+        return self._last_update
+
+    def stale_time(self, now=None):
+        """ Time in seconds since the asset missed its first status read, 0.0 while fresh """
+        if self._stale_since is None:
+            return 0.0
+        return (now if now is not None else time.monotonic()) - self._stale_since
+
+    def mark_fresh(self, now):
+        self._last_update = now
+        self._stale_since = None
+        self._status['stale'] = False
+
+    def mark_stale(self, now):
+        if self._stale_since is None:
+            self._stale_since = now
+        self._status['stale'] = True
+
     def read_config(self, config_dict):
         for key, val in config_dict.items():
             if key in self._config.keys():  # ConfigParser stores all data as string. Attempt to convert to float or int.
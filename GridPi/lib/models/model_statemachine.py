@@ -13,4 +13,29 @@ class StateMachine:
     # Template method:
     def run(self, sm_input):
         self.currentState = self.currentState.next(sm_input)
-        return self.currentState.run(sm_input)
\ No newline at end of file
+        return self.currentState.run(sm_input)
+
+class StateRecord(object):
+    """ Fixed layout state of a virtual device. States read and update the record in place, so a tick allocates
+        nothing. Subclasses list their fields with default values in `defaults` and declare the same names in
+        __slots__.
+    """
+    __slots__ = ()
+    defaults = ()  # ((field, default value), ...)
+
+    def __init__(self, **kwargs):
+        for field, value in self.defaults:
+            setattr(self, field, kwargs.get(field, value))
+
+    def copy_to(self, target):
+        """ Copy the fields named by the keys of target into target """
+        for key in target:
+            target[key] = getattr(self, key)
+
+    def update(self, source):
+        """ Set fields from the items of source """
+        for key, val in source.items():
+            setattr(self, key, val)
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field, value in self.defaults}
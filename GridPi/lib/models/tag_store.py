@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+
+""" Array backed tag store for asset parameters.
+
+    Every (asset, category, param) is given a fixed slot in a set of typed NumPy arrays. Asset.config, .status,
+    .control and .remote_control are TagView objects: dictionary-like views that read and write their slots in the
+    store. Numeric and boolean values live in one float64 array, anything else (names, enums, None) in an object array.
+    A per-slot kind code restores the Python type on read, so views behave exactly like the dictionaries they replace.
+
+    Because all values sit in a handful of arrays, a snapshot of the whole plant is a single array copy.
+
+    CycleBuffer double-buffers the store for the control cycle: processes and then dispatch run against a private
+    working copy seeded from an immutable input Frame, and the slots they changed are committed back to the live store
+    in one step. Readers take the last committed Frame, which is never modified after it is published.
+"""
+
+import time
+from collections.abc import MutableMapping
+
+import numpy as np
+
+KIND_FLOAT = 0
+KIND_INT = 1
+KIND_BOOL = 2
+KIND_OBJECT = 3
+
+_KIND_OF_TYPE = {float: KIND_FLOAT,
+                 int: KIND_INT,
+                 bool: KIND_BOOL,
+                 np.float64: KIND_FLOAT,
+                 np.float32: KIND_FLOAT,
+                 np.int64: KIND_INT,
+                 np.int32: KIND_INT,
+                 np.bool_: KIND_BOOL}
+
+
+class TagStore(object):
+    """ Central storage for asset parameters.
+
+    :param capacity: initial number of slots, the store grows by doubling
+    """
+
+    def __init__(self, capacity=64):
+        self._size = 0
+        self._values = np.zeros(capacity, dtype=np.float64)
+        self._kinds = np.full(capacity, KIND_OBJECT, dtype=np.int8)
+        self._objects = np.full(capacity, None, dtype=object)
+        self._labels = list()  # (asset, category, param) for each slot
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def values(self):
+        """ Numeric value of every allocated slot, NaN where the slot holds an object """
+        return self._values[:self._size]
+
+    @property
+    def kinds(self):
+        return self._kinds[:self._size]
+
+    @property
+    def objects(self):
+        return self._objects[:self._size]
+
+    def label(self, slot):
+        """ (asset name, category, param) of a slot """
+        asset, category, param = self._labels[slot]
+        return asset.config['name'], category, param
+
+    def labels(self):
+        return [self.label(slot) for slot in range(self._size)]
+
+    def allocate(self, asset, category, param, value=None):
+        """ Reserve a new slot and initialize it with value.
+
+        :return: slot index
+        """
+        if self._size == len(self._values):
+            self._grow()
+
+        slot = self._size
+        self._size += 1
+        self._labels.append((asset, category, param))
+        self.set(slot, value)
+        return slot
+
+    def get(self, slot):
+        kind = self._kinds.item(slot)
+        if kind == KIND_FLOAT:
+            return self._values.item(slot)
+        if kind == KIND_BOOL:
+            return self._values.item(slot) != 0.0
+        if kind == KIND_INT:
+            return int(self._values.item(slot))
+        return self._objects[slot]
+
+    def set(self, slot, value):
+        kind = _KIND_OF_TYPE.get(type(value), KIND_OBJECT)
+        self._kinds[slot] = kind
+        if kind == KIND_OBJECT:
+            self._values[slot] = np.nan
+            self._objects[slot] = value
+        else:
+            self._values[slot] = value
+
+    def put(self, slots, values, kinds=KIND_FLOAT):
+        """ Set many slots to numeric values at once
+
+        :param slots: array of slot indices
+        :param values: array of the same length
+        :param kinds: kind code of the values, or array of kind codes, one per slot
+        """
+        self._values[slots] = values
+        self._kinds[slots] = kinds
+        self._objects[slots] = None
+
+    def snapshot(self):
+        """ Copy of the numeric values, kind codes and objects of every allocated slot """
+        return self.values.copy(), self.kinds.copy(), self.objects.copy()
+
+    def mirror(self, other):
+        """ Overwrite this store with the contents of other (store or frame), reusing the existing arrays when they
+            are large enough. Slot labels are not copied, a mirror shares the slot layout of its source.
+        """
+        size = len(other)
+        while len(self._values) < size:
+            self._grow()
+        np.copyto(self._values[:size], other.values)
+        np.copyto(self._kinds[:size], other.kinds)
+        np.copyto(self._objects[:size], other.objects)
+        self._size = size
+
+    def extend(self, other):
+        """ Copy the slots other (a store with the same slot layout) allocated beyond the size of this store """
+        start, size = self._size, len(other)
+        while len(self._values) < size:
+            self._grow()
+        self._values[start:size] = other.values[start:size]
+        self._kinds[start:size] = other.kinds[start:size]
+        self._objects[start:size] = other.objects[start:size]
+        self._size = max(start, size)
+
+    def assign(self, slots, other):
+        """ Copy the given slots from other, a store or frame with the same slot layout """
+        self._values[slots] = other.values[slots]
+        self._kinds[slots] = other.kinds[slots]
+        self._objects[slots] = other.objects[slots]
+
+    def _grow(self):
+        capacity = 2 * len(self._values)
+        self._values = np.concatenate((self._values, np.zeros(capacity - len(self._values), dtype=np.float64)))
+        self._kinds = np.concatenate((self._kinds, np.full(capacity - len(self._kinds), KIND_OBJECT, dtype=np.int8)))
+        self._objects = np.concatenate((self._objects, np.full(capacity - len(self._objects), None, dtype=object)))
+
+
+class Frame(object):
+    """ Immutable snapshot of a TagStore. The arrays are read-only, a frame can be shared without copying or locking.
+
+    :param store: TagStore (or mirror) to copy
+    :param cycle: control cycle number the frame belongs to
+    """
+
+    def __init__(self, store, cycle=0):
+        self._values, self._kinds, self._objects = store.snapshot()
+        for array in (self._values, self._kinds, self._objects):
+            array.setflags(write=False)
+
+        self._cycle = cycle
+        self._timestamp = time.time()
+
+    def __len__(self):
+        return len(self._values)
+
+    @property
+    def values(self):
+        return self._values
+
+    @property
+    def kinds(self):
+        return self._kinds
+
+    @property
+    def objects(self):
+        return self._objects
+
+    @property
+    def cycle(self):
+        return self._cycle
+
+    @property
+    def timestamp(self):
+        return self._timestamp
+
+    def get(self, slot):
+        kind = self._kinds.item(slot)
+        if kind == KIND_FLOAT:
+            return self._values.item(slot)
+        if kind == KIND_BOOL:
+            return self._values.item(slot) != 0.0
+        if kind == KIND_INT:
+            return int(self._values.item(slot))
+        return self._objects[slot]
+
+    def read(self, view):
+        """ Values of every parameter of a TagView, as they were when the frame was taken
+
+        :return: dict(param_name: value)
+        """
+        size = len(self._values)
+        return {param: self.get(slot) for param, slot in view.slots.items() if slot < size}
+
+
+class CycleBuffer(object):
+    """ Double buffer for one control cycle over a live TagStore.
+
+        begin(): freeze the live store into the input frame, and seed the working store from it.
+        ...      processes, then dispatch, read and write the working store only.
+        commit(): copy the slots that changed in the working store back to the live store, then publish the live
+                  store as the committed frame.
+
+    :param store: live TagStore shared by the assets
+    """
+
+    def __init__(self, store):
+        self._store = store
+        self._working = TagStore(capacity=max(len(store), 64))
+        self._input = None
+        self._committed = None
+        self._cycle = 0
+
+    @property
+    def working(self):
+        """ Store the processes run against, same slot layout as the live store """
+        return self._working
+
+    @property
+    def input(self):
+        """ Immutable input frame of the current cycle """
+        return self._input
+
+    @property
+    def committed(self):
+        """ Last committed frame, None before the first commit """
+        return self._committed
+
+    @property
+    def cycle(self):
+        return self._cycle
+
+    @property
+    def active(self):
+        """ True between begin() and commit() """
+        return self._input is not None
+
+    def begin(self):
+        self._cycle += 1
+        self._input = Frame(self._store, self._cycle)
+        self._working.mirror(self._input)
+        return self._input
+
+    def extend(self):
+        """ Bring slots allocated in the live store since begin() into the working store, e.g. by a late bind """
+        if len(self._store) > len(self._working):
+            self._working.extend(self._store)
+
+    def commit(self):
+        if self._input is None:
+            raise RuntimeError('CycleBuffer: commit() called before begin()')
+
+        inpt, work = self._input, self._working
+        size = len(inpt)
+        kinds = work.kinds[:size]
+        changed = kinds != inpt.kinds
+        changed |= (kinds != KIND_OBJECT) & (work.values[:size] != inpt.values)
+        changed |= (kinds == KIND_OBJECT) & (work.objects[:size] != inpt.objects)
+        self._store.assign(np.flatnonzero(changed), work)
+        if len(work) > size:
+            self._store.assign(np.arange(size, len(work)), work)  # Slots allocated during the cycle
+
+        self._committed = Frame(self._store, self._cycle)  # Reference swap, readers see the old or the new frame
+        self._input = None
+        return self._committed
+
+
+class TagView(MutableMapping):
+    """ Dictionary interface to the parameters of one asset category in a TagStore.
+
+    :param store: TagStore holding the values
+    :param asset: asset that owns the parameters, used to label the slots
+    :param category: 'config', 'status', 'control' or 'remote_control'
+    """
+
+    def __init__(self, store, asset, category):
+        self._store = store
+        self._asset = asset
+        self._category = category
+        self._slots = dict()  # param name: slot index in self._store
+
+    @property
+    def store(self):
+        return self._store
+
+    @property
+    def category(self):
+        return self._category
+
+    @property
+    def slots(self):
+        return self._slots
+
+    def slot(self, param):
+        return self._slots[param]
+
+    def rebind(self, store):
+        """ Move every parameter of this view into a new store, allocating fresh slots """
+        if store is self._store:
+            return
+        old_store = self._store
+        self._slots = {param: store.allocate(self._asset, self._category, param, old_store.get(slot))
+                       for param, slot in self._slots.items()}
+        self._store = store
+
+    def __getitem__(self, param):
+        return self._store.get(self._slots[param])
+
+    def __setitem__(self, param, value):
+        slot = self._slots.get(param)
+        if slot is None:
+            self._slots[param] = self._store.allocate(self._asset, self._category, param, value)
+        else:
+            self._store.set(slot, value)
+
+    def __delitem__(self, param):
+        del self._slots[param]  # The slot is abandoned, slots are never reused
+
+    def __contains__(self, param):
+        return param in self._slots
+
+    def __iter__(self):
+        return iter(self._slots)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, dict(self.items()))
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+""" Vectorized virtual plant.
+
+    Every virtual device of a type is one row in the arrays of a Fleet. PlantSimulator.step() advances the whole plant
+    in one call: ESS state and SOC, breaker state, and the power balance between the feeders (load), the ESS units and
+    the grid interties. The virtual asset models (VirtualEnergyStorage, VirtualGridIntertie, VirtualFeeder) talk to
+    their row through a FleetDevice, which has the read()/write() interface of a communications interface. Sites with
+    thousands of devices can be simulated for controller load testing.
+
+    Power balance, per step:
+        feeders:    a closed feeder on an energized bus draws its load_kw
+        ESS (P/Q):  an online unit outputs its kw_setpoint
+        grid:       closed interties import the net load (load - P/Q output), shared evenly
+        ESS (V/F):  with no closed intertie, online grid forming units supply the net load, shared by kw rating
+        the bus is energized when an intertie is closed or a grid forming unit is online
+"""
+
+import logging
+import time
+
+import numpy as np
+
+from GridPi.lib.models.model_core import EnergyStorage
+
+ESS_VF = EnergyStorage.State.VF.value
+
+
+class Fleet(object):
+    """ Array storage for the devices of one type, one row per device.
+
+    :param capacity: initial number of rows, the arrays grow by doubling
+    """
+    fields = ()  # ((name, dtype, default), ...)
+
+    def __init__(self, capacity=16):
+        self._size = 0
+        self._arrays = {name: np.full(capacity, default, dtype=dtype) for name, dtype, default in self.fields}
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, name):
+        """ :return: array of field name, one element per device. A view, updates in place are kept. """
+        return self._arrays[name][:self._size]
+
+    def add(self, **values):
+        """ Add a device with default values, overridden by values
+
+        :return: row of the device
+        """
+        if self._size == len(next(iter(self._arrays.values()))):
+            self._grow()
+        row = self._size
+        self._size += 1
+        for name, dtype, default in self.fields:
+            self._arrays[name][row] = values.get(name, default)
+        return row
+
+    def get(self, name, row):
+        return self._arrays[name][row].item()
+
+    def set(self, name, row, value):
+        self._arrays[name][row] = getattr(value, 'value', value)  # Enums are stored by value
+
+    def _grow(self):
+        for name, array in self._arrays.items():
+            grown = np.empty(2 * len(array), dtype=array.dtype)
+            grown[:len(array)] = array
+            self._arrays[name] = grown
+
+
+class EssFleet(Fleet):
+    fields = (('kw', np.float64, 0.0),
+              ('soc', np.float64, 0.5),
+              ('kwh_capacity_rated', np.float64, 30.0),
+              ('kw_rated', np.float64, 0.0),  # Share of the grid forming load, 0 shares evenly
+              ('online', np.bool_, False),
+              ('run_cmd', np.bool_, False),
+              ('kw_setpoint', np.float64, 0.0),
+              ('state_cmd', np.int64, EnergyStorage.State.STANDBY.value))
+
+
+class BreakerFleet(Fleet):
+    fields = (('kw', np.float64, 0.0),
+              ('load_kw', np.float64, 0.0),  # Feeders only, demand of the loads behind the breaker
+              ('breaker_open', np.bool_, True),
+              ('breaker_trip', np.bool_, False),
+              ('close_breaker', np.bool_, False),
+              ('open_breaker', np.bool_, False))
+
+
+class FleetDevice(object):
+    """ Communications interface of one simulated device
+
+    :param fleet: Fleet holding the device
+    :param row: row of the device in the fleet
+    """
+
+    def __init__(self, fleet, row):
+        self.fleet = fleet
+        self.row = row
+
+    async def read(self, internal_status):
+        """ Read the device fields into internal_status """
+        for key in internal_status.keys():
+            internal_status[key] = self.fleet.get(key, self.row)
+
+    async def write(self, internal_control):
+        """ Write internal_control values to the device fields """
+        for key, val in internal_control.items():
+            self.fleet.set(key, self.row, val)
+
+
+class PlantSimulator(object):
+    """ Virtual ESS, grid interties and feeders, stepped together """
+
+    def __init__(self):
+        self.ess = EssFleet()
+        self.grid = BreakerFleet()
+        self.feeder = BreakerFleet()
+
+        self.energized = False
+
+    def fleet(self, class_type):
+        return {'ess': self.ess, 'grid': self.grid, 'feeder': self.feeder}[class_type]
+
+    def step(self, dt):
+        """ Advance the plant by dt seconds """
+        self._step_breakers(self.grid)
+        self._step_breakers(self.feeder)
+
+        ess = self.ess
+        ess['online'][:] = ess['run_cmd']
+        grid_forming = ess['online'] & (ess['state_cmd'] == ESS_VF)
+        pq = ess['online'] & ~grid_forming
+
+        grid_closed = ~self.grid['breaker_open']
+        self.energized = bool(grid_closed.any() or grid_forming.any())
+
+        feeder_kw = self.feeder['kw']
+        feeder_kw[:] = np.where(~self.feeder['breaker_open'] & self.energized, self.feeder['load_kw'], 0.0)
+
+        ess_kw = ess['kw']
+        ess_kw[:] = np.where(pq, ess['kw_setpoint'], 0.0)
+        net_kw = feeder_kw.sum() - ess_kw.sum()
+
+        grid_kw = self.grid['kw']
+        n_closed = np.count_nonzero(grid_closed)
+        grid_kw[:] = np.where(grid_closed, net_kw / n_closed, 0.0) if n_closed else 0.0
+        if not n_closed and grid_forming.any():
+            share = np.where(grid_forming, np.where(ess['kw_rated'] > 0, ess['kw_rated'], 1.0), 0.0)
+            ess_kw += net_kw * share / share.sum()
+
+        soc = ess['soc']
+        soc -= ess_kw * (dt / 3600.0) / ess['kwh_capacity_rated']
+        np.clip(soc, 0.0, 1.0, out=soc)
+
+    @staticmethod
+    def _step_breakers(fleet):
+        """ Open on command or trip, close on command when not tripped. An open command resets a trip. """
+        trip = fleet['breaker_trip']
+        trip &= ~fleet['open_breaker']
+        is_open = fleet['breaker_open']
+        is_open[:] = np.where(fleet['open_breaker'] | trip, True, np.where(fleet['close_breaker'], False, is_open))
+        fleet['kw'][is_open] = 0.0
+
+
+class Virtual_System(object):
+    """ Virtual plant driving the virtual asset models.
+
+    :param state_machine: dispatch state machine of the system
+    :param asset_container: AssetContainer of the system
+    """
+
+    def __init__(self, state_machine, asset_container):
+        self.state_machine = state_machine
+        self.asset_container = asset_container
+        self.simulator = PlantSimulator()
+        self._last_run = None
+
+    @property
+    def ess_kw(self):
+        """ Total kW of the ESS fleet """
+        return float(self.simulator.ess['kw'].sum())
+
+    @property
+    def grid_kw(self):
+        return float(self.simulator.grid['kw'].sum())
+
+    @property
+    def feeder_kw(self):
+        return float(self.simulator.feeder['kw'].sum())
+
+    def add_device(self, class_type, **values):
+        """ Add a simulated device.
+
+        :param class_type: 'ess', 'grid' or 'feeder'
+        :param values: initial field values
+        :return: FleetDevice, the communications interface of the device
+        """
+        fleet = self.simulator.fleet(class_type)
+        return FleetDevice(fleet, fleet.add(**values))
+
+    def run(self, now=None):
+        """ Advance the plant by the time elapsed since the last run """
+        now = time.monotonic() if now is None else now
+        if self._last_run is not None:
+            self.simulator.step(now - self._last_run)
+        self._last_run = now
+        logging.debug('VIRTUAL SYSTEM: grid %.1f kW, ess %.1f kW, feeder %.1f kW',
+                      self.grid_kw, self.ess_kw, self.feeder_kw)
@@ -1,9 +1,11 @@
 import logging
 
-from sqlalchemy import Column, Integer, String, Numeric, create_engine, ForeignKey, exists
+from sqlalchemy import Column, Float, Integer, LargeBinary, String, Numeric, create_engine, ForeignKey, exists, \
+    bindparam, delete, func, insert, select, text, update
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Session, relationship
 
+from GridPi.lib.persistence.history import HistoryBlock
 from GridPi.lib.persistence.persistence_core import DBInterface
 
 Base = declarative_base()
@@ -36,16 +38,70 @@ class SqlGPAssetParams(Base):
         )
 
 
+class SqlGPParamChange(Base):
+    """ Change log of remote control parameters. Rows are inserted by the param_change_trigger whenever a writer (e.g.
+        the HMI) updates the value of a parameter with param_access = 1, so the controller only reads what changed.
+    """
+    __tablename__ = 'param_change_table'
+
+    change_id = Column(Integer, primary_key=True)
+    param_id = Column(Integer, nullable=False)
+    param_value = Column(Float)
+
+    def __repr__(self):
+        return "<Parameter Change(%r, %r, %r)>" % (
+            self.change_id, self.param_id, self.param_value
+        )
+
+
+# SQLite trigger, created if missing so databases created before the change log existed are upgraded in place.
+_CHANGE_TRIGGER = text(
+    "CREATE TRIGGER IF NOT EXISTS param_change_trigger "
+    "AFTER UPDATE OF param_value ON parameter_identity_table "
+    "WHEN NEW.param_access = 1 AND NEW.param_value IS NOT OLD.param_value "
+    "BEGIN "
+    "INSERT INTO param_change_table (param_id, param_value) VALUES (NEW.param_id, NEW.param_value); "
+    "END")
+
+
+class SqlGPHistoryBlock(Base):
+    __tablename__ = 'history_block_table'
+
+    block_id = Column(Integer, primary_key=True)
+    asset_name = Column(String, nullable=False, index=True)
+    param_cat = Column(String(50), nullable=False)
+    param_name = Column(String(50), nullable=False, index=True)
+    t_start = Column(Float, nullable=False, index=True)
+    t_end = Column(Float, nullable=False)
+    data = Column(LargeBinary, nullable=False)  # HistoryBlock.to_bytes()
+
+    def __repr__(self):
+        return "<History Block(%r, %r, %r, %r, %r)>" % (
+            self.asset_name, self.param_cat, self.param_name, self.t_start, self.t_end
+        )
+
+
 class SQLAlchemyGP(DBInterface):
     """ SQL Alchemy DB interface for GridPi"""
     def __init__(self, configparser):
         super(SQLAlchemyGP, self).__init__(configparser)
 
-        self.engine = create_engine('sqlite:///gridpi.sqlite')
+        self.engine = create_engine(configparser.get('url', 'sqlite:///gridpi.sqlite'))
         Base.metadata.create_all(self.engine)
+        if self.engine.dialect.name == 'sqlite':
+            with self.engine.begin() as connection:
+                connection.execute(_CHANGE_TRIGGER)
 
         self.session = Session(bind=self.engine)
 
+        self._param_ids = None  # dict((asset_name, param_name): param_id), loaded once by load_param_ids()
+        self._last_written = dict()  # dict(param_id: value) last value written to the database
+        self._last_change_id = None  # Newest param_change_table row consumed by read_param_changes()
+
+        self._update_stmt = update(SqlGPAssetParams.__table__)\
+            .where(SqlGPAssetParams.__table__.c.param_id == bindparam('pid'))\
+            .values(param_value=bindparam('value'))
+
     def add_asset(self, asset_name):
         """ Create a new Asset in the SQL Asset table.
             If *args are defined, corresponding parameters will be created.
@@ -69,22 +125,48 @@ class SQLAlchemyGP(DBInterface):
             asset.params.append(SqlGPAssetParams(param_name=key, param_access=access_type)) # Add params to Asset
 
         self.session.add(asset)
+        self._param_ids = None  # New parameters, reload the id cache on the next write
+
+    def load_param_ids(self):
+        """ Cache the param_id of every (asset_name, param_name) in a single query.
+        """
+        self.session.commit()  # Assign ids to pending assets and parameters
+        rows = self.session.query(SqlGPAsset.asset_name, SqlGPAssetParams.param_name, SqlGPAssetParams.param_id)\
+            .join(SqlGPAssetParams, SqlGPAssetParams.asset_id == SqlGPAsset.asset_id).all()
+        self._param_ids = {(asset_name, param_name): param_id for asset_name, param_name, param_id in rows}
 
     def write_param(self, **kwargs):
-        """ Write parameters from dict to database assets
+        """ Write parameters from dict to database assets.
+            Only parameters whose value changed since the last write are sent, as one executemany UPDATE in a single
+            transaction. Parameters that are not registered in the database are ignored.
 
         :param kwargs['payload'] dict(AssetName: dict{param_name_1: value_1, ..., param_name_n, value_n}}
+        :return: number of parameters written
         """
-
-        assets = self.session.query(SqlGPAsset).all()
-        for asset in assets:
-            for param in asset.params:
-                try:
-                    param.param_value = kwargs['payload'][asset.asset_name][param.param_name]
-                except:
-                    pass
-
-        self.session.commit()
+        if self._param_ids is None:
+            self.load_param_ids()
+
+        param_ids = self._param_ids
+        last_written = self._last_written
+        rows = []
+        for asset_name, params in kwargs['payload'].items():
+            for param_name, value in params.items():
+                pid = param_ids.get((asset_name, param_name))
+                if pid is None:
+                    continue
+                if pid in last_written and last_written[pid] == value:
+                    continue
+                rows.append({'pid': pid, 'value': value})
+
+        if not rows:
+            return 0
+
+        with self.engine.begin() as connection:
+            connection.execute(self._update_stmt, rows)
+
+        for row in rows:
+            last_written[row['pid']] = row['value']
+        return len(rows)
 
     def read_param(self, **kwargs):
         """ Read parameter from database into dict.
@@ -102,8 +184,69 @@ class SQLAlchemyGP(DBInterface):
                     pass
         return kwargs['payload']
 
+    def read_param_changes(self, **kwargs):
+        """ Read the remote control parameters that changed since the previous call, from the change log.
+            The first call only records the current end of the log and returns nothing, use read_param() for the
+            initial values. Consumed log rows are deleted.
 
-
-
-
-
+        :param kwargs['payload']: dict(AssetName: dict{param_name_1: value_1, ..., param_name_n, value_n}}, only these
+                                  parameters are returned
+        :return: dict(AssetName: dict{param_name_1: value_1, ..., param_name_n, value_n}}, changed parameters only
+        """
+        table = SqlGPParamChange.__table__
+        with self.engine.begin() as connection:
+            if self._last_change_id is None:
+                self._last_change_id = connection.execute(select(func.coalesce(func.max(table.c.change_id), 0)))\
+                    .scalar()
+                return dict()
+
+            rows = connection.execute(select(table.c.change_id, table.c.param_id, table.c.param_value)
+                                      .where(table.c.change_id > self._last_change_id)
+                                      .order_by(table.c.change_id)).all()
+            if not rows:
+                return dict()
+
+            self._last_change_id = rows[-1].change_id
+            connection.execute(delete(table).where(table.c.change_id <= self._last_change_id))
+
+        if self._param_ids is None:
+            self.load_param_ids()
+        param_names = {pid: key for key, pid in self._param_ids.items()}
+
+        payload = kwargs['payload']
+        changes = dict()
+        for row in rows:  # In change order, the newest value of a parameter wins
+            asset_name, param_name = param_names.get(row.param_id, (None, None))
+            if param_name in payload.get(asset_name, ()):
+                changes.setdefault(asset_name, dict())[param_name] = row.param_value
+        return changes
+
+    def write_history(self, blocks):
+        """ Append sealed history blocks, one executemany INSERT in a single transaction.
+
+        :param blocks: list of history.HistoryBlock
+        """
+        rows = [{'asset_name': block.label[0],
+                 'param_cat': block.label[1],
+                 'param_name': block.label[2],
+                 't_start': float(block.t_start),
+                 't_end': float(block.t_end),
+                 'data': block.to_bytes()} for block in blocks]
+        if rows:
+            with self.engine.begin() as connection:
+                connection.execute(insert(SqlGPHistoryBlock.__table__), rows)
+
+    def read_history(self, asset_name, param_name, t_start, t_end):
+        """ Read the history blocks of one parameter that overlap [t_start, t_end], in time order.
+
+        :return: list of history.HistoryBlock
+        """
+        table = SqlGPHistoryBlock.__table__
+        query = table.select().where(table.c.asset_name == asset_name)\
+            .where(table.c.param_name == param_name)\
+            .where(table.c.t_end >= t_start)\
+            .where(table.c.t_start <= t_end)\
+            .order_by(table.c.t_start)
+        with self.engine.connect() as connection:
+            return [HistoryBlock.from_bytes((row.asset_name, row.param_cat, row.param_name), row.data)
+                    for row in connection.execute(query)]
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+
+""" Append-only time-series history of asset parameters.
+
+    The control loop appends one committed cycle Frame per cycle, which is a single row copy into the open chunk.
+    Full chunks are sealed later by flush(), called from the persistence loop: every parameter column of the chunk is
+    encoded into its own HistoryBlock. Slowly changing columns are stored as change points (run-length encoding),
+    other columns are stored raw. Sealed blocks are kept in memory for the retention period, and at most max_bytes of
+    them, and optionally handed to a sink (e.g. SQLAlchemyGP.write_history) for long term storage.
+
+    append() runs on the control loop and flush() on the persistence writer thread. The open chunk, the full chunks
+    waiting for flush() and the sealed blocks are guarded by one lock, held only to hand chunks over and to file the
+    sealed blocks. Encoding and the sink write run outside of it.
+"""
+
+import logging
+import struct
+import threading
+import zlib
+from collections import deque
+
+import numpy as np
+
+ENCODING_RAW = 0
+ENCODING_RLE = 1
+
+_HEADER = struct.Struct('<BII')  # encoding, number of samples, number of stored values
+
+
+class HistoryBlock(object):
+    """ Encoded samples of one parameter over one chunk.
+
+    :param label: (asset name, category, param)
+    :param times: sample timestamps of the chunk, shared by every block sealed from that chunk
+    :param encoding: ENCODING_RAW or ENCODING_RLE
+    :param index: RLE only, sample index of each change point
+    :param values: raw samples, or the value at each change point
+    """
+
+    def __init__(self, label, times, encoding, index, values):
+        self.label = label
+        self.times = times
+        self.encoding = encoding
+        self.index = index
+        self.values = values
+
+    @property
+    def t_start(self):
+        return self.times[0]
+
+    @property
+    def t_end(self):
+        return self.times[-1]
+
+    @property
+    def nbytes(self):
+        """ Memory of the encoded samples, the times are shared by the blocks of a chunk """
+        return self.values.nbytes + (self.index.nbytes if self.index is not None else 0)
+
+    def decode(self):
+        """ :return: (times, values) with one value per sample """
+        if self.encoding == ENCODING_RAW:
+            return self.times, self.values
+        run_lengths = np.diff(np.append(self.index, len(self.times)))
+        return self.times, np.repeat(self.values, run_lengths)
+
+    def to_bytes(self):
+        header = _HEADER.pack(self.encoding, len(self.times), len(self.values))
+        index = self.index.astype(np.int32) if self.encoding == ENCODING_RLE else np.empty(0, dtype=np.int32)
+        return zlib.compress(header + self.times.tobytes() + index.tobytes() + self.values.tobytes())
+
+    @classmethod
+    def from_bytes(cls, label, data):
+        data = zlib.decompress(data)
+        encoding, n, k = _HEADER.unpack_from(data)
+        offset = _HEADER.size
+        times = np.frombuffer(data, dtype=np.float64, count=n, offset=offset)
+        offset += 8 * n
+        index = np.frombuffer(data, dtype=np.int32, count=k if encoding == ENCODING_RLE else 0, offset=offset)
+        offset += 4 * len(index)
+        values = np.frombuffer(data, dtype=np.float64, count=k, offset=offset)
+        return cls(label, times, encoding, index, values)
+
+
+class HistoryStore(object):
+    """ Columnar, chunked history of every tag store slot.
+
+    :param tag_store: TagStore the appended frames were taken from, used to label the slots
+    :param chunk_size: number of cycles per chunk
+    :param retention: seconds of sealed history kept in memory, None keeps everything
+    :param max_bytes: memory budget of the sealed history kept in memory, the oldest chunks are dropped first. None
+                      has no budget.
+    :param sink: optional object with write_history(blocks) and read_history(asset, param, t_start, t_end) methods
+    """
+
+    def __init__(self, tag_store, chunk_size=600, retention=600.0, max_bytes=32 * 2 ** 20, sink=None):
+        self._tag_store = tag_store
+        self._chunk_size = int(chunk_size)
+        self._retention = retention
+        self._max_bytes = max_bytes
+        self._sink = sink
+        self._lock = threading.Lock()
+
+        self._times = None  # Open chunk
+        self._rows = None
+        self._count = 0
+        self._full = deque()  # Full chunks waiting for flush(), (times, rows)
+
+        self._blocks = dict()  # label: deque of HistoryBlock, in time order
+        self._sealed = deque()  # Sealed chunks kept in memory, oldest first: (t_end, blocks, nbytes)
+        self._bytes = 0
+        self._width = 0
+
+    @property
+    def chunk_size(self):
+        return self._chunk_size
+
+    @property
+    def pending_chunks(self):
+        return len(self._full)
+
+    @property
+    def nbytes(self):
+        """ Memory held by the sealed history """
+        return self._bytes
+
+    def append(self, frame):
+        """ Append one cycle. Called from the control loop, does no encoding or I/O.
+
+        :param frame: committed tag_store.Frame
+        """
+        width = len(frame)
+        with self._lock:
+            if self._rows is None or width > self._rows.shape[1]:
+                self._start_chunk(width)
+
+            row = self._rows[self._count]
+            row[:width] = frame.values
+            row[width:] = np.nan
+            self._times[self._count] = frame.timestamp
+            self._count += 1
+
+            if self._count == self._chunk_size:
+                self._full.append((self._times, self._rows))  # Handed over, never written again
+                self._rows = None
+
+    def flush(self):
+        """ Encode the full chunks into blocks, apply retention and pass new blocks to the sink.
+
+        :return: list of the new HistoryBlock objects
+        """
+        with self._lock:
+            full, self._full = list(self._full), deque()
+
+        sealed = [self._seal(times, rows) for times, rows in full]
+        with self._lock:
+            for (times, rows), chunk_blocks in zip(full, sealed):
+                for block in chunk_blocks:
+                    self._blocks.setdefault(block.label, deque()).append(block)
+                nbytes = times.nbytes + sum(block.nbytes for block in chunk_blocks)
+                self._sealed.append((times[-1], chunk_blocks, nbytes))
+                self._bytes += nbytes
+            self._expire()
+
+        blocks = [block for chunk_blocks in sealed for block in chunk_blocks]
+
+        if blocks and self._sink is not None:
+            self._sink.write_history(blocks)
+        return blocks
+
+    def query(self, asset_name, param_name, t_start=None, t_end=None, category=None):
+        """ Samples of one parameter in [t_start, t_end], including cycles not yet sealed.
+
+        :return: (times, values) numpy arrays
+        """
+        t_start = -np.inf if t_start is None else t_start
+        t_end = np.inf if t_end is None else t_end
+
+        times, values = list(), list()
+        for slot, label in self._find(asset_name, param_name, category):
+            with self._lock:
+                blocks = [block for block in self._blocks.get(label, ())
+                          if block.t_end >= t_start and block.t_start <= t_end]
+                oldest = self._blocks[label][0].t_start if self._blocks.get(label) else np.inf
+                unsealed = self._unsealed()
+            if self._sink is not None and t_start < oldest:
+                blocks = [block for block in self._sink.read_history(asset_name, param_name, t_start, t_end)
+                          if block.label == label and block.t_start < oldest] + blocks
+
+            for block in blocks:
+                block_times, block_values = block.decode()
+                times.append(block_times)
+                values.append(block_values)
+
+            for chunk_times, chunk_rows in unsealed:
+                if slot < chunk_rows.shape[1]:
+                    times.append(chunk_times)
+                    values.append(chunk_rows[:, slot])
+
+        if not times:
+            return np.empty(0), np.empty(0)
+
+        times, values = np.concatenate(times), np.concatenate(values)
+        mask = (times >= t_start) & (times <= t_end)
+        return times[mask], values[mask]
+
+    def _start_chunk(self, width):
+        """ Start a new chunk at least width columns wide, moving cycles already in the open chunk into it """
+        width = max(width, self._width)
+        times = np.empty(self._chunk_size, dtype=np.float64)
+        rows = np.full((self._chunk_size, width), np.nan, dtype=np.float64)
+        if self._rows is not None:
+            times[:self._count] = self._times[:self._count]
+            rows[:self._count, :self._rows.shape[1]] = self._rows[:self._count]
+        else:
+            self._count = 0
+        self._times, self._rows, self._width = times, rows, width
+
+    def _unsealed(self):
+        """ Full and open chunks, the open chunk is copied as append() keeps writing it """
+        chunks = list(self._full)
+        if self._rows is not None and self._count:
+            chunks.append((self._times[:self._count].copy(), self._rows[:self._count].copy()))
+        return chunks
+
+    def _seal(self, times, rows):
+        """ Encode every column of a chunk. Change detection is done for the whole chunk in one pass. """
+        n = len(times)
+        changed = np.ones(rows.shape, dtype=bool)
+        both_nan = np.isnan(rows[1:]) & np.isnan(rows[:-1])
+        changed[1:] = (rows[1:] != rows[:-1]) & ~both_nan
+
+        blocks = list()
+        for slot in range(rows.shape[1]):
+            column = rows[:, slot]
+            if np.isnan(column).all():
+                continue  # Object slot or slot allocated after the chunk started
+            index = np.flatnonzero(changed[:, slot])
+            if 2 * len(index) < n:
+                blocks.append(HistoryBlock(self._label(slot), times, ENCODING_RLE, index, column[index].copy()))
+            else:
+                blocks.append(HistoryBlock(self._label(slot), times, ENCODING_RAW, None, column.copy()))
+        logging.debug('HISTORY: sealed chunk of %d cycles into %d blocks', n, len(blocks))
+        return blocks
+
+    def _expire(self):
+        """ Drop the oldest sealed chunks beyond the retention period or the memory budget """
+        if not self._sealed:
+            return
+        horizon = self._sealed[-1][0] - self._retention if self._retention is not None else -np.inf
+        while self._sealed and (self._sealed[0][0] < horizon or
+                                (self._max_bytes is not None and self._bytes > self._max_bytes)):
+            t_end, blocks, nbytes = self._sealed.popleft()
+            self._bytes -= nbytes
+            for block in blocks:
+                self._blocks[block.label].popleft()  # Blocks of a label are filed in chunk order
+
+    def _label(self, slot):
+        return self._tag_store.label(slot)
+
+    def _find(self, asset_name, param_name, category):
+        """ :return: list of (slot, label) matching an asset parameter """
+        return [(slot, label) for slot, label in enumerate(self._tag_store.labels())
+                if label[0] == asset_name and label[2] == param_name and (category is None or label[1] == category)]
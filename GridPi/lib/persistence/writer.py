@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+
+""" Off-loop persistence writer.
+
+    All database I/O (parameter writes, history sealing and remote control reads) runs on a dedicated thread, so a slow
+    commit or sqlite fsync never stalls the asyncio control loop. The control loop hands committed cycle frames to the
+    writer through a bounded queue, submit() never blocks. When the queue is full the DropPolicy decides which frame is
+    lost. With coalescing enabled a new frame replaces the frame still waiting in the queue, since every frame is a
+    full snapshot only the newest one needs to be written.
+
+    Remote control values are read once in full at start up. After that, databases with read_param_changes() (a change
+    log kept by the database) are asked only for the values that changed, the full read_param() is the fallback.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from enum import Enum
+
+
+class DropPolicy(Enum):
+    DROP_OLDEST = 'drop_oldest'
+    DROP_NEWEST = 'drop_newest'
+
+
+class WriterStats(object):
+    """ Writer metrics. Updated by the writer thread and submit(), read from anywhere. Times are in seconds. """
+
+    def __init__(self):
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+
+        self.queue_depth = 0
+        self.queue_depth_max = 0
+
+        self.write_latency_last = 0.0
+        self.write_latency_max = 0.0
+        self.write_latency_sum = 0.0
+
+    @property
+    def write_latency_mean(self):
+        return self.write_latency_sum / self.written if self.written else 0.0
+
+    def record_write(self, latency):
+        self.written += 1
+        self.write_latency_last = latency
+        self.write_latency_max = max(self.write_latency_max, latency)
+        self.write_latency_sum += latency
+
+    def as_dict(self):
+        return {'submitted': self.submitted,
+                'written': self.written,
+                'dropped': self.dropped,
+                'coalesced': self.coalesced,
+                'errors': self.errors,
+                'queue_depth': self.queue_depth,
+                'queue_depth_max': self.queue_depth_max,
+                'write_latency_last': self.write_latency_last,
+                'write_latency_max': self.write_latency_max,
+                'write_latency_mean': self.write_latency_mean}
+
+
+class PersistenceWriter(threading.Thread):
+    """ Dedicated database writer thread.
+
+        The database must be fully set up (assets and parameters added, param ids loaded) before start(). After that
+        it is only used from the writer thread.
+
+    :param database: DBInterface with write_param() and read_param(), and optionally read_param_changes()
+    :param assets: list of assets to persist, keyed in the database by config['class_type']
+    :param history_store: optional history.HistoryStore, flushed after every write
+    :param max_queue: maximum number of frames waiting to be written
+    :param coalesce: replace a waiting frame with the newest one instead of queueing both
+    :param drop_policy: DropPolicy (or its string value) applied when the queue is full
+    :param read_interval: seconds between remote control reads, None disables reading
+    """
+
+    def __init__(self, database, assets, history_store=None, max_queue=4, coalesce=True,
+                 drop_policy=DropPolicy.DROP_OLDEST, read_interval=0.2):
+        threading.Thread.__init__(self, name='PersistenceWriter')
+        self.daemon = True
+
+        if max_queue < 1:
+            raise ValueError('PersistenceWriter: max_queue must be at least 1, got {}'.format(max_queue))
+
+        self._database = database
+        self._history_store = history_store
+        self._max_queue = int(max_queue)
+        self._coalesce = coalesce
+        self._drop_policy = DropPolicy(drop_policy)
+        self._read_interval = read_interval
+
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+
+        # Frame slot layout of each persisted parameter, resolved once.
+        self._status_map = [(asset.config['class_type'], param, slot)
+                            for asset in assets
+                            for view in (asset.status, asset.control)
+                            for param, slot in view.slots.items()]
+        self._ctrl_payload = {asset.config['class_type']: dict(asset.remote_control.items()) for asset in assets}
+
+        self._remote_control = None  # Remote control values not yet taken by the control side
+        self._last_read = 0.0
+        self._synced = False  # Initial full remote control read done
+
+        self._stats = WriterStats()
+
+    @property
+    def stats(self):
+        return self._stats
+
+    def submit(self, frame):
+        """ Queue a frame for writing. Never blocks.
+
+        :return: False if the frame was dropped
+        """
+        with self._condition:
+            self._stats.submitted += 1
+            accepted = True
+            if self._coalesce and self._queue:
+                self._queue[-1] = frame
+                self._stats.coalesced += 1
+            elif len(self._queue) >= self._max_queue:
+                self._stats.dropped += 1
+                if self._drop_policy is DropPolicy.DROP_OLDEST:
+                    self._queue.popleft()
+                    self._queue.append(frame)
+                else:
+                    accepted = False
+            else:
+                self._queue.append(frame)
+
+            self._stats.queue_depth = len(self._queue)
+            self._stats.queue_depth_max = max(self._stats.queue_depth_max, self._stats.queue_depth)
+            self._condition.notify()
+        return accepted
+
+    def take_remote_control(self):
+        """ Remote control values read from the database since the last call, or None if nothing changed.
+
+        :return: dict(AssetName: dict{param_name_1: value_1, ..., param_name_n, value_n}}
+        """
+        with self._condition:
+            remote_control, self._remote_control = self._remote_control, None
+        return remote_control
+
+    def stop(self, timeout=None):
+        """ Stop the thread after the frames already queued have been written """
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify()
+        self.join(timeout)
+
+    def run(self):
+        logging.debug('PERSISTENCE WRITER: started')
+        while True:
+            frame = self._next_frame()
+            if frame is not None:
+                self._write(frame)
+
+            if self._read_interval is not None and time.monotonic() - self._last_read >= self._read_interval:
+                self._read()
+
+            if frame is None and self._stop_event.is_set():
+                break
+        logging.debug('PERSISTENCE WRITER: stopped')
+
+    def _next_frame(self):
+        with self._condition:
+            if not self._queue and not self._stop_event.is_set():
+                self._condition.wait(self._read_interval)
+            frame = self._queue.popleft() if self._queue else None
+            self._stats.queue_depth = len(self._queue)
+        return frame
+
+    def _write(self, frame):
+        payload = dict()
+        for asset_name, param, slot in self._status_map:
+            if slot < len(frame):
+                payload.setdefault(asset_name, dict())[param] = frame.get(slot)
+
+        start = time.monotonic()
+        try:
+            self._database.write_param(payload=payload)
+            if self._history_store is not None:
+                self._history_store.flush()
+        except Exception as e:
+            self._stats.errors += 1
+            logging.warning('PERSISTENCE WRITER: write failed: %s', e)
+            return
+        self._stats.record_write(time.monotonic() - start)
+
+    def _read(self):
+        self._last_read = time.monotonic()
+        incremental = hasattr(self._database, 'read_param_changes')
+        try:
+            if incremental and self._synced:
+                payload = self._database.read_param_changes(payload=self._ctrl_payload)
+            else:
+                if incremental:
+                    self._database.read_param_changes(payload=self._ctrl_payload)  # Start of the change log
+                payload = self._read_all()
+                self._synced = True
+        except Exception as e:
+            self._stats.errors += 1
+            logging.warning('PERSISTENCE WRITER: remote control read failed: %s', e)
+            return
+
+        if not payload:
+            return
+        with self._condition:  # Merge with values the control side has not taken yet
+            if self._remote_control is None:
+                self._remote_control = dict()
+            for asset_name, params in payload.items():
+                self._remote_control.setdefault(asset_name, dict()).update(params)
+
+    def _read_all(self):
+        """ Full read of every remote control parameter. read_param() fills in every parameter it finds for an asset,
+            keep the remote control ones only.
+        """
+        payload = self._database.read_param(payload={asset_name: dict(params)
+                                                     for asset_name, params in self._ctrl_payload.items()})
+        remote_control = dict()
+        for asset_name, ctrl_params in self._ctrl_payload.items():
+            params = payload.get(asset_name, dict())
+            remote_control[asset_name] = {param: params[param] for param in ctrl_params if param in params}
+        return remote_control
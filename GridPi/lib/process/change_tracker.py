@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+""" Change tracking for compiled processes.
+
+    A process only needs to run when one of the tags it reads changed, or when one of the tags it writes was changed
+    by someone else. ChangeTracker remembers the value of every bound tag as it was at the end of the previous run and
+    compares them all in one vectorized pass at the start of the next, which gives the initially dirty processes.
+    While the processes run, a process whose outputs changed marks the processes consuming them dirty. Everything
+    else is skipped.
+
+    Processes that depend on more than their tags (timers, integrators, internal state) set always_run = True.
+"""
+
+import logging
+
+import numpy as np
+
+from GridPi.lib.models.tag_store import KIND_OBJECT
+
+
+class RunStats(object):
+    """ Executed and skipped process counters """
+
+    def __init__(self):
+        self.runs = 0
+        self.full_refreshes = 0
+        self.executed = 0
+        self.skipped = 0
+        self.executed_last = 0
+        self.skipped_last = 0
+
+    def record(self, executed, skipped):
+        self.runs += 1
+        self.executed += executed
+        self.skipped += skipped
+        self.executed_last = executed
+        self.skipped_last = skipped
+
+    def as_dict(self):
+        return {'runs': self.runs,
+                'full_refreshes': self.full_refreshes,
+                'executed': self.executed,
+                'skipped': self.skipped,
+                'executed_last': self.executed_last,
+                'skipped_last': self.skipped_last}
+
+
+class _WatchedStore(object):
+    """ The watched slots of one tag store, and their values at the end of the last run """
+
+    def __init__(self, store, slots):
+        self.store = store
+        self.slots = np.asarray(slots, dtype=np.intp)
+        self.values = None
+        self.kinds = None
+        self.objects = None
+
+    def changed(self, positions=None):
+        """ :return: bool array, True where a watched slot differs from the remembered value """
+        slots = self.slots if positions is None else self.slots[positions]
+        if self.values is None:
+            return np.ones(len(slots), dtype=bool)
+        values, kinds, objects = self.store.values[slots], self.store.kinds[slots], self.store.objects[slots]
+        seen = (self.values, self.kinds, self.objects)
+        if positions is not None:
+            seen = tuple(array[positions] for array in seen)
+        seen_values, seen_kinds, seen_objects = seen
+
+        changed = kinds != seen_kinds
+        changed |= (kinds != KIND_OBJECT) & (values != seen_values)
+        changed |= (kinds == KIND_OBJECT) & (objects != seen_objects)
+        return changed
+
+    def remember(self):
+        self.values = self.store.values[self.slots]
+        self.kinds = self.store.kinds[self.slots]
+        self.objects = self.store.objects[self.slots]
+
+
+class ChangeTracker(object):
+    """ Dirty process tracking over a compiled process list.
+
+    :param process_list: compiled processes in dependency order
+    """
+
+    def __init__(self, process_list):
+        self._index = {process: n for n, process in enumerate(process_list)}
+        self._always = np.array([process.always_run for process in process_list], dtype=bool)
+
+        stores = dict()  # id(store): (store, list of slots)
+        owners = dict()  # id(store): list of process index per watched slot
+        self._outputs = list()  # Per process: list of (id(store), positions of its outputs among the watched slots)
+        consumers = dict()  # tag: list of process index
+        for n, process in enumerate(process_list):
+            input_plan, output_plan = process.bindings()
+            outputs = dict()
+            for plan, is_output in ((input_plan, False), (output_plan, True)):
+                for tag, store, slot in plan:
+                    slots = stores.setdefault(id(store), (store, list()))[1]
+                    if is_output:
+                        outputs.setdefault(id(store), list()).append(len(slots))
+                    slots.append(slot)
+                    owners.setdefault(id(store), list()).append(n)
+            for tag, store, slot in input_plan:
+                consumers.setdefault(tag, list()).append(n)
+            self._outputs.append([(key, np.array(positions, dtype=np.intp)) for key, positions in outputs.items()])
+
+        self._watched = {key: _WatchedStore(store, slots) for key, (store, slots) in stores.items()}
+        self._owners = {key: np.array(owners[key], dtype=np.intp) for key in stores}
+
+        self._successors = list()
+        for process in process_list:
+            successors = {n for tag in process.bindings()[1] for n in consumers.get(tag[0], ())}
+            successors.discard(self._index[process])
+            self._successors.append(np.array(sorted(successors), dtype=np.intp))
+
+        self._dirty = np.ones(len(process_list), dtype=bool)
+
+    def __len__(self):
+        return len(self._index)
+
+    def index(self, process):
+        return self._index[process]
+
+    def begin(self, force=False):
+        """ Find the processes to run this cycle.
+
+        :param force: mark every process dirty
+        :return: bool array, one entry per process
+        """
+        dirty = self._always.copy()
+        if force:
+            dirty[:] = True
+        else:
+            for key, watched in self._watched.items():
+                dirty[self._owners[key][watched.changed()]] = True
+        self._dirty = dirty
+        return dirty
+
+    def is_dirty(self, n):
+        return self._dirty[n]
+
+    def executed(self):
+        """ :return: number of processes marked dirty in this cycle """
+        return int(np.count_nonzero(self._dirty))
+
+    def ran(self, n):
+        """ Process n has run, mark its consumers dirty if any of its outputs changed """
+        for key, positions in self._outputs[n]:
+            if self._watched[key].changed(positions).any():
+                self._dirty[self._successors[n]] = True
+                return
+
+    def end(self):
+        """ Remember the values every process saw in this cycle """
+        for watched in self._watched.values():
+            watched.remember()
+        logging.debug('CHANGE TRACKER: %d of %d processes ran', self.executed(), len(self._dirty))
@@ -1,10 +1,28 @@
 #!/usr/bin/env python3
 
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
 
-from GridPi.lib.process import process_graph
+import numpy as np
+
+from GridPi.lib.process import change_tracker, process_graph
 from collections import namedtuple
 
+
+class ExecutionMode(Enum):
+    SERIAL = 'serial'
+    LEVEL_PARALLEL = 'level_parallel'
+
+
+class AggregateMode(Enum):
+    SUM = 'sum'
+    MIN = 'min'
+    MAX = 'max'
+    PRIORITY = 'priority'  # Output of the highest priority process that produced one
+    WEIGHTED = 'weighted'  # Sum of the outputs scaled by the weight of each process
+
 class ProcessFactory(object):
     """Asset factor for the creating of Asset concrete objects
 
@@ -27,9 +45,38 @@ class ProcessFactory(object):
 
 
 class ProcessContainer(object):
+    """ Holds the processes of a system and runs them in dependency order.
+
+        In ExecutionMode.LEVEL_PARALLEL the sorted processes are grouped into dependency levels. Processes in one level
+        share no tags with each other, they read their inputs and do their work concurrently on a thread pool. Their
+        outputs are written after the whole level is done, in process order, so results do not depend on thread
+        timing. Work that releases the GIL (NumPy, I/O) gains the most.
+
+        With change tracking enabled only processes whose tags changed, and the processes downstream of them, run. A
+        full run is forced every refresh_interval runs, see change_tracker.
+    """
+
     def __init__(self):
         self._process_list = list()
         self._process_dict = dict()
+        self._plan = None  # Flat list of compiled process steps, built on the first run after sort()
+        self._plan_store = None  # Store the plan was compiled against, None for the assets' own stores
+        self._steps = dict()  # process: compiled step, reused when a new order is committed
+        self._levels = None  # Compiled plan grouped by dependency level, LEVEL_PARALLEL mode only
+
+        self._mode = ExecutionMode.SERIAL
+        self._max_workers = None
+        self._executor = None
+
+        self._tracking = False
+        self._refresh_interval = 0
+        self._tracker = None  # change_tracker.ChangeTracker over the compiled plan, change tracking only
+        self._run_stats = change_tracker.RunStats()
+
+        self._registered = list()  # Every process added, before aggregation
+        self._order = None  # process_graph.ProcessOrder, maintained incrementally once sort() has run
+        self._pending = None  # Process list staged by a runtime add or remove, committed by the next run_all()
+        self._lock = threading.Lock()
 
         self._ready = False
 
@@ -45,42 +92,264 @@ class ProcessContainer(object):
     def ready(self):
         return self._ready
 
+    @property
+    def compiled(self):
+        return self._plan is not None
+
+    @property
+    def execution_mode(self):
+        return self._mode
+
+    @property
+    def levels(self):
+        """ Compiled processes grouped by dependency level, None until compiled in LEVEL_PARALLEL mode """
+        return self._levels
+
+    def configure_execution(self, mode, max_workers=None):
+        """ Select serial or level parallel execution.
+
+        :param mode: ExecutionMode (or its string value)
+        :param max_workers: size of the thread pool used in LEVEL_PARALLEL mode, None for the executor default
+        """
+        self.shutdown()
+        self._mode = ExecutionMode(mode)
+        self._max_workers = max_workers
+        self._levels = None
+        if self._plan is not None and self._mode is ExecutionMode.LEVEL_PARALLEL:
+            self._levels = process_graph.dependency_levels(self._process_list)
+
+    @property
+    def run_stats(self):
+        """ Executed and skipped process counters, see change_tracker.RunStats """
+        return self._run_stats
+
+    def configure_change_tracking(self, enabled, refresh_interval=0):
+        """ Skip processes whose tags did not change.
+
+        :param enabled: turn change tracking on or off
+        :param refresh_interval: run every process every refresh_interval runs, 0 never forces a full run
+        """
+        self._tracking = bool(enabled)
+        self._refresh_interval = int(refresh_interval)
+        self._tracker = change_tracker.ChangeTracker(self._process_list) \
+            if self._tracking and self._plan is not None else None
+
+    def shutdown(self):
+        """ Stop the worker threads, they are started again when needed """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    @property
+    def pending(self):
+        """ True when a new process order is staged and waiting for the next run_all() """
+        return self._pending is not None
+
     def add_process(self, new_process):
-        """ Add process to container
+        """ Add process to container. Before the first sort() the process is only queued. Once the container is
+            sorted, the process is inserted into the running order incrementally: the processes already running keep
+            their current plan until the next run_all() commits the new one.
+
+        :raises process_graph.CycleError: the process would create a dependency cycle, the container is unchanged
         """
-        self._ready = False
-        self._process_dict.update({new_process.name: new_process})
-        self._process_list.append(new_process)
+        if self._order is None:
+            self._ready = False
+            self._plan = None
+            self._registered.append(new_process)
+            self._process_dict.update({new_process.name: new_process})
+            self._process_list.append(new_process)
+            return
+
+        with self._lock:
+            if any(self._order.producers(tag) for tag in new_process.output.keys()):
+                # Another process writes the same output, they must be combined in an aggregate process.
+                self._stage_rebuild(self._registered + [new_process])
+            else:
+                self._order.add(new_process)
+                self._pending = self._order.order
+            self._registered.append(new_process)
+            self._process_dict.update({new_process.name: new_process})
+        logging.debug('PROCESS CONTAINER: add_process(): %s staged', new_process)
+
+    def remove_process(self, process):
+        """ Remove a process, by object or name. Like add_process(), a sorted container keeps running the current
+            plan until the next run_all().
+        """
+        if isinstance(process, str):
+            process = self._process_dict[process]
+        if process not in self._registered:
+            raise ValueError('PROCESS CONTAINER: {} is not in the container'.format(process))
+
+        if self._order is None:
+            self._registered.remove(process)
+            self._process_list.remove(process)
+            self._process_dict.pop(process.name, None)
+            self._plan = None
+            return
+
+        with self._lock:
+            registered = [x for x in self._registered if x is not process]
+            if process in self._order:
+                self._order.remove(process)
+                self._pending = self._order.order
+            else:
+                self._stage_rebuild(registered)  # The process is part of an aggregate process
+            self._registered = registered
+            self._process_dict.pop(process.name, None)
+        logging.debug('PROCESS CONTAINER: remove_process(): %s staged', process)
 
     def sort(self):
         """ Get dependency topological sort of current processes
 
+        :raises process_graph.CycleError: the processes depend on each other in a cycle
         """
-        temp_graph = process_graph.GraphProcess(self)  # Note that self IS a ProcessContainer.
-        temp_graph.build_adj_list()
-        process_names_topo_sort = process_graph.DFS(temp_graph).topological_sort
-
-        self._process_list = []
-        for process_name in process_names_topo_sort:
-            logging.debug('PROCESS CONTAINER: sort(): New process added to process_list %s',
-                          self.process_dict[process_name])
-            self._process_list.append(self.process_dict[process_name])
+        previous, self._process_list = self._process_list, list(self._registered)
+        try:
+            temp_graph = process_graph.GraphProcess(self)  # Note that self IS a ProcessContainer.
+            temp_graph.build_adj_list()
+            self._process_list = process_graph.DFS(temp_graph).topological_sort
+        except process_graph.CycleError:
+            self._process_list = previous
+            raise
         logging.debug('PROCESS CONTAINER: sort(): final process_list %s', self.process_list)
 
+        self._order = process_graph.ProcessOrder(self._process_list)
+        self._pending = None
+        self._plan = None
+        self._steps = dict()
         self._ready = True
 
-    def run_all(self, get_asset_func):
+    def _stage_rebuild(self, processes):
+        """ Full sort of processes in a scratch container, staged as the next order """
+        scratch = ProcessContainer()
+        for process in processes:
+            scratch.add_process(process)
+        scratch.sort()
+        self._order = scratch._order
+        self._pending = scratch.process_list
+
+    def compile(self, get_asset_func, store=None):
+        """ Resolve every process tag to the tag store slot it reads or writes, once.
+            Must be called again if assets are added after compilation, see invalidate_plan().
+
+        :param get_asset_func(asset_subclass): this function must return a list of assets of a specified sub-class
+        :param store: optional store with the same slot layout as the assets' store (e.g. CycleBuffer.working) that
+                      the plan reads and writes instead of the live asset parameters
+        """
+        self._set_plan(self._process_list, {process: process.compile(get_asset_func, store)
+                                            for process in self._process_list}, store)
+        logging.debug('PROCESS CONTAINER: compile(): %d process steps compiled', len(self._plan))
+
+    def rebind_assets(self, get_asset_func):
+        """ Call bind_assets() of every process again after assets were added. When the tags of a process changed a
+            sorted container stages a new process order, the dependencies and aggregates depend on the tags.
+        """
+        with self._lock:
+            changed = False
+            for process in self._registered:
+                tags = (set(process.input), set(process.output))
+                process.bind_assets(get_asset_func)
+                changed = changed or tags != (set(process.input), set(process.output))
+            if changed and self._order is not None:
+                self._stage_rebuild(self._registered)
+        self.invalidate_plan()
+
+    def invalidate_plan(self):
+        """ Discard the compiled plan, it is rebuilt on the next run_all() """
+        self._plan = None
+        self._levels = None
+        self._tracker = None
+        self._steps = dict()
+
+    def commit(self, get_asset_func, store=None):
+        """ Switch to the staged process order. Only processes new to the order are compiled, the process list and
+            plan are then replaced together.
+        """
+        with self._lock:
+            process_list, self._pending = self._pending, None
+        if process_list is None:
+            return
+
+        steps = self._steps if self._plan is not None and self._plan_store is store else dict()
+        steps = {process: steps.get(process) or process.compile(get_asset_func, store) for process in process_list}
+        self._set_plan(process_list, steps, store)
+        logging.debug('PROCESS CONTAINER: commit(): new process_list %s', self._process_list)
+
+    def run_all(self, get_asset_func, store=None):
         """ Run all processes in container
         """
         logging.debug('PROCESS CONTAINER: Running the following processes %s', self.process_list)
         if self._ready:
-            for process in self._process_list:
-                process.run(get_asset_func)
+            if self._pending is not None:
+                self.commit(get_asset_func, store)
+            if self._plan is None or self._plan_store is not store:
+                self.compile(get_asset_func, store)
+            if self._tracker is not None:
+                self._run_tracked()
+            elif self._levels is None:
+                for step in self._plan:
+                    step()
+            else:
+                self._run_levels()
         else:
             logging.debug('process module not ready, please run self.sort()')
 
+    def _set_plan(self, process_list, steps, store):
+        """ Replace the process list and plan together, the running plan is never seen half updated """
+        levels = None
+        if self._mode is ExecutionMode.LEVEL_PARALLEL:
+            levels = process_graph.dependency_levels(process_list)
+        tracker = change_tracker.ChangeTracker(process_list) if self._tracking else None
+        self._process_list, self._plan, self._levels, self._tracker, self._steps, self._plan_store = \
+            process_list, [steps[process] for process in process_list], levels, tracker, steps, store
+
+    def _run_levels(self, tracker=None):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='ProcessLevel')
+
+        for level in self._levels:
+            if tracker is not None:
+                level = [process for process in level if tracker.is_dirty(tracker.index(process))]
+            if len(level) == 1:
+                level[0].run_compiled()
+            elif level:
+                futures = [self._executor.submit(process.compute_compiled) for process in level]
+                for future in futures:
+                    future.result()  # Wait for the whole level, re-raises a process error in process order
+                for process in level:
+                    process.write_compiled()
+            if tracker is not None:
+                for process in level:
+                    tracker.ran(tracker.index(process))
+
+    def _run_tracked(self):
+        tracker, stats = self._tracker, self._run_stats
+        force = self._refresh_interval > 0 and stats.runs % self._refresh_interval == 0
+        if force:
+            stats.full_refreshes += 1
+        tracker.begin(force)
+
+        if self._levels is None:
+            for n, step in enumerate(self._plan):
+                if tracker.is_dirty(n):
+                    step()
+                    tracker.ran(n)
+        else:
+            self._run_levels(tracker)
+
+        tracker.end()
+        executed = tracker.executed()
+        stats.record(executed, len(tracker) - executed)
+
 
 class ProcessInterface(object):
+    always_run = False  # True for processes that must run every cycle even if their tags did not change
+
+    # How this process is combined with others writing the same output, see AggregateProcess.
+    aggregate_mode = AggregateMode.SUM
+    aggregate_weight = 1.0
+    aggregate_priority = 0
+
     def __init__(self):
         self._input = dict()
         self._output = dict()
@@ -88,6 +357,9 @@ class ProcessInterface(object):
         self._name = 'UNDEFINED'
         self.tag = namedtuple('tag', 'asset_type, id, cat, param_name')
 
+        self._input_plan = tuple()  # ((tag, tag store, slot), ...) resolved by compile()
+        self._output_plan = tuple()
+
     @property
     def input(self):
         return self._input
@@ -148,6 +420,62 @@ class ProcessInterface(object):
             # Set the value of the tag in the asset of specified id.
             getattr(get_asset_func(tag.asset_type)[tag.id], tag.cat)[tag.param_name] = val
 
+    def bindings(self):
+        """ :return: (input plan, output plan) resolved by compile(), tuples of (tag, tag store, slot) """
+        return self._input_plan, self._output_plan
+
+    def bind_assets(self, get_asset_func):
+        """ Called when the process is added to a System, before it is sorted. Processes whose tags depend on the
+            assets of the system declare them here.
+
+        :param get_asset_func(asset_subclass): this function must return a list of assets of a specified sub-class
+        """
+        pass
+
+    def compile(self, get_asset_func, store=None):
+        """ Bind each input and output tag directly to the tag store slot of its target asset parameter.
+
+        :param get_asset_func(asset_subclass): this function must return a list of assets of a specified sub-class
+        :param store: optional store to bind to in place of the asset's own store, must share its slot layout
+        :return: run_compiled, the callable executed by ProcessContainer.run_all()
+        """
+        self._input_plan = self._bind(self.input.keys(), get_asset_func, store)
+        self._output_plan = self._bind(self.output.keys(), get_asset_func, store)
+        return self.run_compiled
+
+    def _bind(self, tags, get_asset_func, store=None):
+        plan = []
+        for tag in tags:
+            try:
+                params = getattr(get_asset_func(tag.asset_type)[tag.id], tag.cat)
+                plan.append((tag, params.store if store is None else store, params.slot(tag.param_name)))
+            except (AttributeError, IndexError, KeyError) as e:
+                logging.warning('%s: unable to bind tag %s: %r', self.__class__.__name__, tag, e)
+        return tuple(plan)
+
+    def run_compiled(self):
+        """ Run the process against the bindings resolved by compile() """
+        self.compute_compiled()
+        self.write_compiled()
+
+    def compute_compiled(self):
+        """ Read the inputs and do the work, without writing the outputs """
+        self.read_compiled()
+        try:
+            self.do_work()
+        except TypeError as e:
+            logging.info('%s: do_work() returned exception: %s', self.__class__.__name__, e)
+
+    def read_compiled(self):
+        inpt = self._input
+        for tag, store, slot in self._input_plan:
+            inpt[tag] = store.get(slot)
+
+    def write_compiled(self):
+        output = self._output
+        for tag, store, slot in self._output_plan:
+            store.set(slot, output[tag])
+
     def do_work(self):
         pass
 
@@ -157,29 +485,252 @@ class SingleProcess(ProcessInterface):
         super(SingleProcess, self).__init__()
 
 
+class FleetProcess(ProcessInterface):
+    """ Process acting on every asset of a class_type at once.
+
+        Parameters are declared by name with fleet_input() and fleet_output(). bind_assets() expands each into one tag
+        per asset, so the dependency graph and the compiled plan see ordinary per-asset tags. At run time every fleet
+        parameter is read with a single gather from the tag store into a NumPy array, one element per asset, and
+        fleet_work() computes all the outputs as arrays. Outputs are written back with a single scatter.
+
+        Assets of a class_type must share a tag store, which is the case for every asset in an AssetContainer.
+    """
+
+    def __init__(self):
+        super(FleetProcess, self).__init__()
+        self._fleet_inputs = dict()  # name: (asset_type, cat, param_name)
+        self._fleet_outputs = dict()
+        self._units = dict()  # asset_type: number of assets bound
+
+        self._fleet_plan = None  # Input plan the gather below was built from
+        self._gather = dict()  # name: (store, slots)
+        self._scatter = dict()
+        self._output_tags = dict()  # name: per-asset tags, in asset order
+        self._arrays = dict()  # name: inputs read this cycle
+        self._results = dict()  # name: outputs of fleet_work()
+
+    @property
+    def units(self):
+        return self._units
+
+    def fleet_input(self, name, asset_type, cat, param_name):
+        self._fleet_inputs[name] = (asset_type, cat, param_name)
+
+    def fleet_output(self, name, asset_type, cat, param_name):
+        self._fleet_outputs[name] = (asset_type, cat, param_name)
+
+    def bind_assets(self, get_asset_func):
+        """ Declare one tag per asset for every fleet parameter """
+        self._input.clear()
+        self._output.clear()
+        for params, target in ((self._fleet_inputs, self._input), (self._fleet_outputs, self._output)):
+            for asset_type, cat, param_name in params.values():
+                try:
+                    self._units[asset_type] = len(get_asset_func(asset_type))
+                except KeyError:
+                    self._units[asset_type] = 0
+                target.update({self.tag(asset_type, n, cat, param_name): None
+                               for n in range(self._units[asset_type])})
+        self._output_tags = {name: [self.tag(asset_type, n, cat, param_name) for n in range(self._units[asset_type])]
+                             for name, (asset_type, cat, param_name) in self._fleet_outputs.items()}
+        self._fleet_plan = None
+
+    def stale(self, get_asset_func):
+        """ :return: True when the number of assets of a fleet type differs from the number bound """
+        for asset_type, cat, param_name in list(self._fleet_inputs.values()) + list(self._fleet_outputs.values()):
+            try:
+                count = len(get_asset_func(asset_type))
+            except KeyError:
+                count = 0
+            if self._units.get(asset_type) != count:
+                return True
+        return False
+
+    def compile(self, get_asset_func, store=None):
+        if self.stale(get_asset_func):
+            self.bind_assets(get_asset_func)
+        return super(FleetProcess, self).compile(get_asset_func, store)
+
+    def run(self, get_asset_func):
+        self.compile(get_asset_func)
+        self.run_compiled()
+
+    def read_compiled(self):
+        if self._fleet_plan is not self._input_plan:
+            self._gather = self._group(self._fleet_inputs, self._input_plan)
+            # Outputs are not bound when an AggregateProcess writes them, they are then taken from self.output
+            self._scatter = self._group(self._fleet_outputs, self._output_plan) if self._output_plan else dict()
+            self._fleet_plan = self._input_plan
+
+        arrays = self._arrays
+        for name, (store, slots) in self._gather.items():
+            arrays[name] = store.values[slots] if store is not None else np.empty(0)
+
+    def do_work(self):
+        self._results = self.fleet_work(self._arrays)
+        for name, values in self._results.items():  # Per-asset outputs, for aggregation with other processes
+            self._output.update(zip(self._output_tags[name], values.tolist()))
+
+    def write_compiled(self):
+        for name, (store, slots) in self._scatter.items():
+            values = self._results.get(name)
+            if values is not None and store is not None:
+                store.put(slots, values)
+
+    def fleet_work(self, arrays):
+        """ Compute the fleet outputs.
+
+        :param arrays: dict(name: numpy array with one element per asset) of every fleet input
+        :return: dict(name: numpy array) of fleet outputs
+        """
+        return dict()
+
+    def _group(self, params, plan):
+        """ :return: dict(name: (store, slot array in asset order)) built from a compiled plan, store is None when
+            there are no assets of the type
+        """
+        bound = dict()  # (asset_type, cat, param_name): {asset id: (store, slot)}
+        for tag, store, slot in plan:
+            bound.setdefault((tag.asset_type, tag.cat, tag.param_name), dict())[tag.id] = (store, slot)
+
+        grouped = dict()
+        for name, key in params.items():
+            units = bound.get(key, dict())
+            if len(units) != self._units.get(key[0], 0):
+                raise ValueError('{}: {} is not bound for every {} asset'.format(self.__class__.__name__, name, key[0]))
+            stores = {id(store) for store, slot in units.values()}
+            if len(stores) > 1:
+                raise ValueError('{}: {} assets do not share a tag store'.format(self.__class__.__name__, key[0]))
+            store = next(iter(units.values()))[0] if units else None
+            grouped[name] = (store, np.array([units[n][1] for n in sorted(units)], dtype=np.intp))
+        return grouped
+
+
 class AggregateProcess(ProcessInterface):
-    def __init__(self, process_list):
+    """ Combines processes writing the same outputs.
+
+        The outputs of the contained processes are collected into one array, a row per process and a column per
+        output tag, and reduced in a single NumPy pass. Outputs a process left as None are ignored, a tag no process
+        produced is not written. A result keeps the type of the value the first process produced for its tag: bool
+        outputs stay bool (SUM and WEIGHTED act as any()), int outputs are rounded back to int.
+
+    :param process_list: processes to combine
+    :param mode: AggregateMode (or its string value), None uses the aggregate_mode the processes agree on, else SUM
+    :param weights: WEIGHTED mode, one weight per process, None uses each process' aggregate_weight
+    :param priorities: PRIORITY mode, one priority per process (highest wins), None uses aggregate_priority
+    """
+
+    def __init__(self, process_list, mode=None, weights=None, priorities=None):
         super(AggregateProcess, self).__init__()
 
         self._process_list = process_list
 
         for process in self._process_list:
             self._input.update(process._input)
+            self._output.update({tag: None for tag in process._output})  # Same outputs, written by do_work()
+
+        if mode is None:
+            modes = {AggregateMode(process.aggregate_mode) for process in process_list}
+            mode = modes.pop() if len(modes) == 1 else AggregateMode.SUM
+        self._mode = AggregateMode(mode)
+
+        if weights is None:
+            weights = [process.aggregate_weight for process in process_list]
+        if priorities is None:
+            priorities = [process.aggregate_priority for process in process_list]
+        self._weights = np.array(weights, dtype=np.float64).reshape(-1, 1)
+        self._priority_order = np.argsort(-np.array(priorities, dtype=np.float64), kind='stable')
+
+        self._tags = list(self._output)  # Column of each output tag
+        column = {tag: n for n, tag in enumerate(self._tags)}
+        self._layout = [(process, tag) for process in process_list for tag in process._output]
+        self._cells = np.array([row * len(self._tags) + column[tag]
+                                for row, process in enumerate(process_list) for tag in process._output], dtype=np.intp)
+        self._outputs = np.full((len(process_list), len(self._tags)), np.nan)
+        self._columns = np.arange(len(self._tags))
+        self._value_index = np.zeros(self._outputs.size, dtype=np.intp)  # Cell: position of its value in _layout
+        self._value_index[self._cells] = np.arange(len(self._cells))
 
-    def run(self, get_asset_func):
+    @property
+    def mode(self):
+        return self._mode
+
+    def do_work(self):
+        values = [process._output[tag] for process, tag in self._layout]
+        outputs = self._outputs
+        outputs.flat[self._cells] = np.array(values, dtype=np.float64)
+
+        produced = ~np.isnan(outputs)
+        mode = self._mode
+        if mode is AggregateMode.SUM:
+            result = np.where(produced, outputs, 0.0).sum(axis=0)
+        elif mode is AggregateMode.WEIGHTED:
+            result = (np.where(produced, outputs, 0.0) * self._weights).sum(axis=0)
+        elif mode is AggregateMode.MIN:
+            result = np.fmin.reduce(outputs, axis=0)
+        elif mode is AggregateMode.MAX:
+            result = np.fmax.reduce(outputs, axis=0)
+        else:
+            ranked = outputs[self._priority_order]
+            result = ranked[produced[self._priority_order].argmax(axis=0), self._columns]
+
+        # Type of each result: that of the value produced by the first process producing the tag
+        first = self._value_index[produced.argmax(axis=0) * len(self._tags) + self._columns].tolist()
+        self._output = {tag: _cast(_RESULT_TYPES.get(type(values[n]), float), value) if any_produced else None
+                        for tag, value, any_produced, n in zip(self._tags, result.tolist(),
+                                                               produced.any(axis=0).tolist(), first)}
+
+    def compile(self, get_asset_func, store=None):
+        """ Compile the contained processes for input, and this process for the aggregated output """
+        output_tags = dict()
+        for process in self._process_list:
+            process._input_plan = process._bind(process.input.keys(), get_asset_func, store)
+            output_tags.update(process.output)
+        self._output_plan = self._bind(output_tags.keys(), get_asset_func, store)
+        return self.run_compiled
+
+    def bindings(self):
+        return tuple(binding for process in self._process_list for binding in process._input_plan), self._output_plan
 
+    def compute_compiled(self):
         for process in self._process_list:
-            process.read_input(get_asset_func)
+            process.read_compiled()
             try:
-                self.do_work()
+                process.do_work()
             except TypeError as e:
-                logging.info('%s: do_work() returned exception: %s', self.__class__.__name__, e)
-        self.write_output(get_asset_func)
+                logging.info('%s: do_work() returned exception: %s', process.__class__.__name__, e)
+        try:
+            self.do_work()
+        except TypeError as e:
+            logging.info('%s: do_work() returned exception: %s', self.__class__.__name__, e)
+
+    def write_compiled(self):
+        output = self._output
+        for tag, store, slot in self._output_plan:
+            value = output.get(tag)
+            if value is not None:  # Only tags produced by do_work() are aggregated
+                store.set(slot, value)
+
+    def run(self, get_asset_func):
+        self.compile(get_asset_func)
+        self.run_compiled()
 
 
 """ HELPERS """
 
 
+_RESULT_TYPES = {bool: bool, np.bool_: bool, int: int, np.int64: int, np.int32: int}  # Anything else is a float
+
+
+def _cast(result_type, value):
+    """ Aggregated float64 value back to the type of the outputs it was reduced from """
+    if result_type is bool:
+        return value != 0.0
+    if result_type is int:
+        return int(round(value))
+    return value
+
+
 def isfloat(x):
     try:
         a = float(x)
@@ -18,6 +18,7 @@ class Edgenode(object):
 class Graph(object):
     """ Defines a Graph Object
 
+        Vertices are the node objects themselves (processes), edges are kept as an adjacency list of Edgenode chains.
     """
 
     def __init__(self):
@@ -28,33 +29,34 @@ class Graph(object):
         self.directed = True
 
         self.edge_data_input = None
+        self.vertex_data_input = list()  # Optional vertices, included even if they have no edge
 
     def build_adj_list(self):
         logging.debug('GRAPH PROCESS: input graph edges: %s', self.edge_data_input)
 
-        self.nedges = len(self.edge_data_input)  # Find the number of edges, by halving the input data
-
-        vertex_set = dict()
-        for edge in self.edge_data_input:  # Find the number of verticies by hashing a set
-            vertex_set[edge[0]] = 1
-            vertex_set[edge[1]] = 1
-        self.nverticies = len(vertex_set)
+        for node in self.vertex_data_input:
+            self.insert_vertex(node)
 
         for edge in self.edge_data_input:  # Insert Edge
             self.insert_edge(edge[0], edge[1], True)
 
+        self.nverticies = len(self.edges)
+
+    def insert_vertex(self, node):
+        if node not in self.edges:
+            self.edges[node] = None
+            self.degree[node] = 0
+
     def insert_edge(self, start_node, end_node, directed):
+        self.insert_vertex(start_node)
+        self.insert_vertex(end_node)
 
         edge = Edgenode()
-        edge.name = end_node.name
-        edge.next = self.edges.get(start_node.name, None)
+        edge.name = end_node
+        edge.next = self.edges[start_node]
 
-        self.edges[start_node.name] = edge
-        self.degree[start_node.name] = 1
-
-        # Test to see if destination node has been added to the adjacency list
-        if not self.edges.get(edge.name, None):
-            self.edges[edge.name] = None
+        self.edges[start_node] = edge
+        self.degree[start_node] += 1
 
         if not directed:
             self.insert_edge(end_node, start_node, True)
@@ -67,11 +69,11 @@ class Graph(object):
 
     def print_adj_list(self):
         for start_node, edge in self.edges.items():
-            print(start_node, end=': ')
+            print(getattr(start_node, 'name', start_node), end=': ')
 
             node = edge
             while node:
-                print(node.name, end=' ')
+                print(getattr(node.name, 'name', node.name), end=' ')
                 node = node.next
             print()
 
@@ -90,11 +92,14 @@ class GraphProcess(Graph):
         self.GD.resolve_duplicate_sources(process_container.process_dict)
 
         self.edge_data_input = self.GD.edge_list()
+        self.vertex_data_input = self.GD.vertex_list(process_container.process_list)
 
 
 class DFS(object):
     """ Performs depth-first search on a Graph object
 
+        The search is iterative, so the length of a dependency chain is not limited by the Python recursion limit.
+        An edge back to a vertex that is still being explored closes a cycle, reported with CycleError.
     """
 
     @property
@@ -108,13 +113,12 @@ class DFS(object):
         self.parent = dict()
         for node in graph.edges.keys():
             self.processed[node] = self.discovered[node] = False
-            self.parent[node] = -1
+            self.parent[node] = None
 
         self.entry_time = dict()
         self.exit_time = dict()
         self.time = 0
 
-        self.finished = 0
         self._topological_sort = list()
 
         for node in graph.edges.keys():
@@ -125,35 +129,41 @@ class DFS(object):
         logging.debug('GRAPH PROCESS: dfs(): Topological Sort %s', self._topological_sort)
 
     def dfs(self, graph, start_node):
-
-        if self.finished:
-            return
-
-        self.discovered[start_node] = True
-        self.time += 1
-        self.entry_time[start_node] = self.time
-        # process vertex early(node)
-
-        end_node = graph.edges.get(start_node, None)
-        while end_node:
-            if not self.discovered.get(end_node.name, None):
-                self.parent[end_node.name] = start_node
-                # process_edge(start_node, end_node.name)
-                self.dfs(graph, end_node.name)
-            elif not self.processed.get(end_node.name, None) or graph.directed:
-                pass
-                # process_edge(start_node, end_node.name)
-            if self.finished:
-                return
-            end_node = end_node.next
-
-        self.process_vertex_late(start_node)
+        """ :raises CycleError: a cycle is reachable from start_node """
+        self.discover(start_node)
+        stack = [(start_node, graph.edges.get(start_node))]  # (vertex, next edge to explore)
+
+        while stack:
+            start, end_node = stack[-1]
+            if end_node is None:
+                stack.pop()
+                self.process_vertex_late(start)
+                continue
+
+            stack[-1] = (start, end_node.next)
+            node = end_node.name
+            if not self.discovered[node]:
+                self.parent[node] = start
+                self.discover(node)
+                stack.append((node, graph.edges.get(node)))
+            elif not self.processed[node]:
+                self.process_back_edge(start, node)
+
+    def discover(self, node):
+        self.discovered[node] = True
         self.time += 1
-        self.exit_time[start_node] = self.time
-        self.processed[start_node] = True
-        # print('{} processed'.format(start_node))
+        self.entry_time[node] = self.time
+
+    def process_back_edge(self, start_node, end_node):
+        cycle = [start_node]
+        while cycle[-1] is not end_node:
+            cycle.append(self.parent[cycle[-1]])
+        raise CycleError(cycle[::-1])
 
     def process_vertex_late(self, node):
+        self.time += 1
+        self.exit_time[node] = self.time
+        self.processed[node] = True
         self._topological_sort.append(node)
 
 
@@ -161,6 +171,7 @@ class GraphDependencies(object):
     """ Finds dependencies and creates an dependency edge list. edge lists are comma separated nodes, pairs of which
      define and edge. This is input to Graph object.
 
+        Sinks and sources are hash maps keyed by tag, so edges are found in time linear in the number of tags.
     """
 
     def __init__(self):
@@ -175,10 +186,7 @@ class GraphDependencies(object):
         """
         for process in process_list:
             for inpt in process.input.keys():
-                try:
-                    self.sink[inpt].append(process)
-                except KeyError:
-                    self.sink[inpt] = [process]
+                self.sink.setdefault(inpt, []).append(process)
 
         logging.debug('GRAPH PROCESS: pre-process self.sink: %s', self.sink)
 
@@ -188,51 +196,236 @@ class GraphDependencies(object):
         """
         for process in process_list:
             for output in process.output.keys():
-                try:
-                    self.source[output].append(process)
-                except KeyError:
-                    self.source[output] = [process]
+                self.source.setdefault(output, []).append(process)
 
         logging.debug('GRAPH PROCESS: pre-process self.source: %s', self.source)
 
     def resolve_duplicate_sources(self, process_dict):
+        """ Processes writing the same output are combined into an aggregate process, which replaces them in the sink
+            and source maps. A process is aggregated once, with every process it shares an output with.
+        """
+        group_of = dict()  # process: list of the processes it is aggregated with, merged transitively
         for process_list in self.source.values():
             if len(process_list) > 1:
+                merged = list()
+                for process in process_list:
+                    for member in group_of.get(process, [process]):
+                        if member not in merged:
+                            merged.append(member)
+                for process in merged:
+                    group_of[process] = merged
+        groups = list({id(group): group for group in group_of.values()}.values())
+
+        for group in groups:
+            """ An aggregate object is created whihc holds the processes that combine the same output
+            The output of the aggregate object is the output of the processes it contains"""
+            agg_process = process_core.AggregateProcess(group)
+            process_dict.update({agg_process.name: agg_process})  # Update the process dictionary with agg process
+
+            for process in group:
+                self.aggregate[process] = [agg_process]  # Log what processes are being replaced by the Agg process
+
+        for tag_map in (self.source, self.sink):  # Replace processes now contained in the Aggregate process
+            for tag, process_list in tag_map.items():
+                tag_map[tag] = self._replace(process_list)
 
-                """ An aggregate object is created whihc holds the processes that combine the same output
-                The output of the aggregate object is the output of the processes it contains"""
-                agg_process = process_core.AggregateProcess(process_list)
-                process_dict.update({agg_process.name: agg_process})  # Update the process dictionary with agg process
+        logging.debug('GRAPH PROCESS: post-process self.source: %s', self.source)
+        logging.debug('GRAPH PROCESS: post-process self.sink: %s', self.sink)
 
-                for process in process_list:
-                    self.aggregate[process] = [agg_process]  # Log what processes are being replaced by the Agg process
+    def edge_list(self):
+        """ :return: list of (source process, sink process), one per dependency, without self loops """
+        edges = dict()
+        for inpt, sink_process_list in self.sink.items():
+            for source_process in self.source.get(inpt, ()):
+                for sink_process in sink_process_list:
+                    if sink_process is not source_process:
+                        edges[(source_process, sink_process)] = None
+        return list(edges)
+
+    def vertex_list(self, process_list):
+        """ :return: every process of process_list, with aggregated processes replaced by their aggregate """
+        return self._replace(process_list)
+
+    def _replace(self, process_list):
+        replaced = dict()
+        for process in process_list:
+            replaced[self.aggregate.get(process, [process])[0]] = None
+        return list(replaced)
 
-        for output, process_list in self.source.items():  # Replace processes now contained in the Aggregate process
-            for process in process_list:  # in the source dict with the Aggregate process
-                if self.aggregate.get(process, None):
-                    self.source[output] = self.aggregate[process]
 
-        logging.debug('GRAPH PROCESS: post-process self.source: %s', self.source)
+class CycleError(ValueError):
+    """ Raised when a process would make the dependency graph cyclic.
+
+    :param cycle: list of processes forming the cycle, the first process depends on the last
+    """
 
-        for inpt, process_list in self.sink.items():  # Replace processes now contained in the Aggregate process
-            for process in process_list:  # in the sink dict with the Aggregate process
-                if self.aggregate.get(process, None):
-                    self.sink[inpt] = self.aggregate[process]
+    def __init__(self, cycle):
+        self.cycle = cycle
+        super(CycleError, self).__init__('process dependency cycle: {}'.format(
+            ' -> '.join(getattr(process, 'name', str(process)) for process in cycle)))
 
-        logging.debug('GRAPH PROCESS: post-process self.sink: %s', self.sink)
 
-    def edge_list(self):
+class ProcessOrder(object):
+    """ Topological order of processes, updated in place as processes are added and removed.
 
-        edges = []
+        Dependencies are found through hash maps of tag -> producing and tag -> consuming processes, so adding a
+        process only looks at its own tags. A new process is appended to the order, then each edge to a consumer that
+        is ordered before it is repaired with the Pearce-Kelly algorithm: only the processes ordered between the two
+        ends of the edge are searched and reordered. The same search finds cycles, in which case the process is not
+        added. Removing a process never invalidates the order.
 
-        for inpt, sink_process_list in self.sink.items():
-            for output, source_process_list in self.source.items():
-                if inpt == output:
-                    for sink_process in sink_process_list:
-                        for source_process in source_process_list:
-                            edge = [source_process, sink_process]
-                            edges.append(edge)
-        return edges
+    :param process_list: optional processes to start from, in dependency order for the cheapest build
+    """
+
+    def __init__(self, process_list=()):
+        self._ord = dict()  # process: position, positions are unique and increase along the order but may have gaps
+        self._next_ord = 0
+        self._succ = dict()  # process: set(processes that consume one of its outputs)
+        self._pred = dict()  # process: set(processes that produce one of its inputs)
+        self._producers = dict()  # tag: set(processes)
+        self._consumers = dict()  # tag: set(processes)
+
+        for process in process_list:
+            self.add(process)
+
+    def __len__(self):
+        return len(self._ord)
+
+    def __contains__(self, process):
+        return process in self._ord
+
+    @property
+    def order(self):
+        """ Processes in dependency order, producers before consumers """
+        return sorted(self._ord, key=self._ord.get)
+
+    def producers(self, tag):
+        return self._producers.get(tag, set())
+
+    def consumers(self, tag):
+        return self._consumers.get(tag, set())
+
+    def add(self, process):
+        """ Insert a process, reordering the affected part of the order only.
+
+        :raises CycleError: the process closes a dependency cycle, the order is left unchanged
+        """
+        if process in self._ord:
+            raise ValueError('ProcessOrder: {} already added'.format(process))
+
+        self._ord[process] = self._next_ord
+        self._next_ord += 1
+        self._succ[process] = set()
+        self._pred[process] = set()
+        for tag in process.input.keys():
+            self._consumers.setdefault(tag, set()).add(process)
+        for tag in process.output.keys():
+            self._producers.setdefault(tag, set()).add(process)
+
+        # The new process is last in the order, edges from its producers are already ordered correctly.
+        for tag in process.input.keys():
+            for producer in self._producers.get(tag, ()):
+                if producer is not process:
+                    self._succ[producer].add(process)
+                    self._pred[process].add(producer)
+
+        for tag in process.output.keys():
+            for consumer in list(self._consumers.get(tag, ())):
+                if consumer is process or consumer in self._succ[process]:
+                    continue
+                self._succ[process].add(consumer)
+                self._pred[consumer].add(process)
+                if self._ord[consumer] < self._ord[process]:
+                    try:
+                        self._reorder(process, consumer)
+                    except CycleError:
+                        self.remove(process)
+                        raise
+        logging.debug('PROCESS ORDER: add(): %s inserted at %d', process, self._ord[process])
+
+    def remove(self, process):
+        """ Remove a process and its edges, the remaining order stays valid """
+        del self._ord[process]
+        for consumer in self._succ.pop(process):
+            self._pred[consumer].discard(process)
+        for producer in self._pred.pop(process):
+            self._succ[producer].discard(process)
+        for tags, index in ((process.input.keys(), self._consumers), (process.output.keys(), self._producers)):
+            for tag in tags:
+                processes = index.get(tag)
+                if processes is not None:
+                    processes.discard(process)
+                    if not processes:
+                        del index[tag]
+
+    def _reorder(self, source, sink):
+        """ Repair the order after adding the edge source -> sink, with ord(sink) < ord(source) """
+        lower, upper = self._ord[sink], self._ord[source]
+
+        # Processes reachable from sink and ordered no later than source. Reaching source means a cycle.
+        forward = self._search(sink, self._succ, lambda node: self._ord[node] <= upper, source)
+        # Processes that reach source and are ordered no earlier than sink.
+        backward = self._search(source, self._pred, lambda node: self._ord[node] >= lower)
+
+        # Reuse the positions of both sets: everything that reaches source goes first, then everything after sink.
+        backward.sort(key=self._ord.get)
+        forward.sort(key=self._ord.get)
+        nodes = backward + forward
+        positions = sorted(self._ord[node] for node in nodes)
+        for node, position in zip(nodes, positions):
+            self._ord[node] = position
+
+    @staticmethod
+    def _search(start, edges, bound, target=None):
+        """ Iterative depth-first search from start along edges, limited to nodes satisfying bound.
+
+        :raises CycleError: target was reached
+        :return: list of visited nodes
+        """
+        parent = {start: None}
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for nxt in edges[node]:
+                if nxt is target:
+                    cycle = [node]
+                    while parent[cycle[-1]] is not None:
+                        cycle.append(parent[cycle[-1]])
+                    raise CycleError([target] + cycle[::-1])
+                if nxt not in parent and bound(nxt):
+                    parent[nxt] = node
+                    stack.append(nxt)
+        return list(parent)
+
+
+def dependency_levels(process_list):
+    """ Group processes in dependency order into levels. A process is one level after the latest of its producers,
+        so the processes of a level never read a tag written by another process of the same level.
+
+    :param process_list: processes in topological order
+    :return: list of levels, each a list of processes in process_list order
+    """
+    producers = dict()  # tag: processes writing it
+    for process in process_list:
+        for tag in process.output.keys():
+            producers.setdefault(tag, []).append(process)
+
+    level_of = dict()
+    levels = list()
+    for process in process_list:
+        level = 0
+        for tag in process.input.keys():
+            for producer in producers.get(tag, ()):
+                if producer is not process:
+                    if producer not in level_of:
+                        raise ValueError('dependency_levels: {} runs before its producer {}, process list is not '
+                                         'sorted'.format(process, producer))
+                    level = max(level, level_of[producer] + 1)
+        level_of[process] = level
+        if level == len(levels):
+            levels.append(list())
+        levels[level].append(process)
+    return levels
 
 
 if __name__ == '__main__':
@@ -1,5 +1,7 @@
 import logging
 
+import numpy as np
+
 from GridPi.lib.process import process_core
 
 
@@ -135,24 +137,140 @@ class EssDemandLimitPowerController(process_core.SingleProcess):
         # logging.debug('%s: %s deconstructed', self.__class__.__name__, self.name)
 
 
+class EssFleetSocPowerController(process_core.FleetProcess):
+    """ EssSocPowerController for every ESS asset at once. Each unit is driven toward its own target_soc with
+        kw_step, limited to its rated capacity. A rated capacity of 0 is treated as unlimited.
+    """
+    def __init__(self, config_dict):
+        super(EssFleetSocPowerController, self).__init__()
+
+        self._ess = 'ess'
+        self._name = 'ESS fleet SOC power controller'
+        self._config.update({'kw_step': 50.0})
+
+        self.fleet_input('soc', self._ess, 'status', 'soc')
+        self.fleet_input('target_soc', self._ess, 'config', 'target_soc')
+        self.fleet_input('kw_pos_rated', self._ess, 'config', 'cap_kw_pos_rated')
+        self.fleet_input('kw_neg_rated', self._ess, 'config', 'cap_kw_neg_rated')
+        self.fleet_output('kw_setpoint', self._ess, 'control', 'kw_setpoint')
+
+        self.configure_process(config_dict)
+        logging.debug('%s: %s constructed', self.__class__.__name__, self._name)
+
+    def fleet_work(self, arrays):
+        step = float(self.config['kw_step'])
+        kw_setpoint = step * np.sign(arrays['soc'] - arrays['target_soc'])
+        kw_setpoint = np.nan_to_num(kw_setpoint)  # Units without a SOC reading hold 0
+        return {'kw_setpoint': clip_to_rating(kw_setpoint, arrays['kw_pos_rated'], arrays['kw_neg_rated'])}
+
+
+class EssFleetDemandLimitPowerController(process_core.FleetProcess):
+    """ EssDemandLimitPowerController for every ESS and grid asset at once.
+
+        The site requirement is computed from the total grid power and the total export and import limits, then split
+        between the ESS units in proportion to their rated capacity times their SOC headroom: a discharge request is
+        weighted by (soc - soc_min), a charge request by (soc_max - soc). Fuller units discharge more, emptier units
+        charge more, which balances the fleet SOC over time. Requirement a unit cannot take because of its rating is
+        given to the units that still have capacity.
+    """
+    def __init__(self, config_dict):
+        super(EssFleetDemandLimitPowerController, self).__init__()
+
+        self._ess = 'ess'
+        self._grid = 'grid'
+        self._name = 'ESS fleet demand limiting power controller'
+        self._config.update({'soc_min': 0.0,
+                             'soc_max': 1.0})
+
+        self.fleet_input('grid_kw', self._grid, 'status', 'kw')
+        self.fleet_input('kw_export_limit', self._grid, 'config', 'kw_export_limit')
+        self.fleet_input('kw_import_limit', self._grid, 'config', 'kw_import_limit')
+        self.fleet_input('soc', self._ess, 'status', 'soc')
+        self.fleet_input('kw_pos_rated', self._ess, 'config', 'cap_kw_pos_rated')
+        self.fleet_input('kw_neg_rated', self._ess, 'config', 'cap_kw_neg_rated')
+        self.fleet_output('kw_setpoint', self._ess, 'control', 'kw_setpoint')
+
+        self.configure_process(config_dict)
+        logging.debug('%s: %s constructed', self.__class__.__name__, self._name)
+
+    def fleet_work(self, arrays):
+        grid_kw = np.nansum(arrays['grid_kw'])
+        export_limit = np.sum(arrays['kw_export_limit'])
+        import_limit = np.sum(arrays['kw_import_limit'])
+
+        if grid_kw < 0 and abs(grid_kw) > export_limit:
+            requirement = export_limit + grid_kw
+        elif grid_kw > import_limit:
+            requirement = grid_kw - import_limit
+        else:
+            requirement = 0.0
+
+        soc = np.nan_to_num(arrays['soc'], nan=float(self.config['soc_min']))
+        if requirement > 0:
+            headroom = soc - float(self.config['soc_min'])
+            rating = arrays['kw_pos_rated']
+        else:
+            headroom = float(self.config['soc_max']) - soc
+            rating = arrays['kw_neg_rated']
+        weights = np.clip(headroom, 0.0, None) * np.where(rating > 0, rating, 1.0)
+
+        return {'kw_setpoint': distribute(requirement, weights, arrays['kw_pos_rated'], arrays['kw_neg_rated'])}
+
+
+def clip_to_rating(kw, kw_pos_rated, kw_neg_rated):
+    """ Clip per unit kW to [-kw_neg_rated, kw_pos_rated], a rating of 0 or less is unlimited """
+    upper = np.where(kw_pos_rated > 0, kw_pos_rated, np.inf)
+    lower = np.where(kw_neg_rated > 0, -kw_neg_rated, -np.inf)
+    return np.clip(kw, lower, upper)
+
+
+def distribute(requirement, weights, kw_pos_rated, kw_neg_rated):
+    """ Split a total kW requirement between units in proportion to weights, within each unit's rating.
+
+        Units that reach their rating are fixed there and the remainder is shared by the others, at most one pass
+        per unit. If every unit is at its rating the requirement is not fully met.
+
+    :param requirement: total kW, positive to discharge
+    :param weights: array, share of each unit. Units with weight 0 only take part when every weight is 0.
+    :param kw_pos_rated: array, discharge rating of each unit, 0 or less is unlimited
+    :param kw_neg_rated: array, charge rating of each unit, 0 or less is unlimited
+    :return: array of kW per unit
+    """
+    kw = np.zeros(len(weights))
+    if not len(weights) or requirement == 0:
+        return kw
+
+    limit = kw_pos_rated if requirement > 0 else kw_neg_rated
+    limit = np.where(limit > 0, limit, np.inf)
+    weights = np.asarray(weights, dtype=np.float64)
+    if not weights.sum() > 0:
+        weights = np.ones(len(weights))
+
+    magnitude = abs(requirement)
+    free = weights > 0
+    for _ in range(len(weights)):
+        share = np.where(free, weights, 0.0)
+        total = share.sum()
+        if magnitude <= 0 or total <= 0:
+            break
+        kw = kw + magnitude * share / total
+        saturated = free & (kw >= limit)
+        if not saturated.any():
+            break
+        magnitude = float(np.sum(kw[saturated] - limit[saturated]))
+        kw[saturated] = limit[saturated]
+        free &= ~saturated
+    return np.copysign(kw, requirement)
+
+
 class AggregateProcessSummation(process_core.AggregateProcess):
     def __init__(self, process_list):
-        super(AggregateProcessSummation, self).__init__(process_list)
+        super(AggregateProcessSummation, self).__init__(process_list, mode=process_core.AggregateMode.SUM)
 
         self._name = 'aggregate process summation'
 
         logging.debug('%s: %s constructed', self.__class__.__name__, self.name)
 
-    def do_work(self):
-        summation = dict()
-        for process in self._process_list:
-            for key, val in process._output.items():
-                try:
-                    summation[key] += val
-                except:
-                    summation[key] = val
-        self._output = summation
-
     def __del__(self):
         pass
         # logging.debug('%s: %s deconstructed', self.__class__.__name__, self.name)
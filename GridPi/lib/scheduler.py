@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+
+""" Fixed-rate cycle scheduler for the GridPi control loop.
+
+    The scheduler releases each cycle at an absolute deadline on a monotonic clock, rather than sleeping a fixed
+    interval after the work is done. Cycle time is therefore independent of how long the cycle body takes, as long as
+    the body finishes before the next deadline. Overruns are handled by a configurable SkipPolicy.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from enum import Enum
+
+
+class SkipPolicy(Enum):
+    """ Behaviour of the scheduler when a cycle finishes after one or more deadlines have already passed.
+
+        CATCH_UP: Run the missed cycles back-to-back until the schedule is recovered (bounded by max_catch_up).
+        DROP: Skip the missed deadlines and resume on the next deadline of the original grid.
+        DEGRADE: Stretch the cycle period by degrade_factor until the cycle body fits, then recover to the nominal
+                 period after a run of clean cycles.
+    """
+    CATCH_UP = 'catch_up'
+    DROP = 'drop'
+    DEGRADE = 'degrade'
+
+
+class CycleStats(object):
+    """ Per-cycle timing statistics collected by the CycleScheduler. All times are in seconds.
+
+        jitter: lateness of the cycle release relative to its deadline.
+        duration: time from cycle release to cycle completion.
+        overrun: time by which a cycle completed after the following deadline (only counted when positive).
+    """
+
+    def __init__(self):
+        self.cycles = 0
+        self.overruns = 0
+        self.skipped = 0
+
+        self.jitter_last = 0.0
+        self.jitter_max = 0.0
+        self.jitter_sum = 0.0
+
+        self.duration_last = 0.0
+        self.duration_max = 0.0
+        self.duration_sum = 0.0
+
+        self.overrun_last = 0.0
+        self.overrun_max = 0.0
+
+    @property
+    def jitter_mean(self):
+        return self.jitter_sum / self.cycles if self.cycles else 0.0
+
+    @property
+    def duration_mean(self):
+        return self.duration_sum / self.cycles if self.cycles else 0.0
+
+    def record_release(self, jitter):
+        self.jitter_last = jitter
+        self.jitter_max = max(self.jitter_max, jitter)
+        self.jitter_sum += jitter
+
+    def record_completion(self, duration, overrun):
+        self.cycles += 1
+        self.duration_last = duration
+        self.duration_max = max(self.duration_max, duration)
+        self.duration_sum += duration
+
+        self.overrun_last = max(overrun, 0.0)
+        if overrun > 0.0:
+            self.overruns += 1
+            self.overrun_max = max(self.overrun_max, overrun)
+
+    def as_dict(self):
+        return {'cycles': self.cycles,
+                'overruns': self.overruns,
+                'skipped': self.skipped,
+                'jitter_last': self.jitter_last,
+                'jitter_max': self.jitter_max,
+                'jitter_mean': self.jitter_mean,
+                'duration_last': self.duration_last,
+                'duration_max': self.duration_max,
+                'duration_mean': self.duration_mean,
+                'overrun_last': self.overrun_last,
+                'overrun_max': self.overrun_max}
+
+
+class CycleScheduler(object):
+    """ Deadline driven scheduler for a fixed-rate asyncio loop.
+
+        Usage:
+            while True:
+                await scheduler.wait()
+                ... cycle body ...
+                scheduler.complete()
+
+    :param period: nominal cycle period in seconds
+    :param policy: SkipPolicy (or its string value) applied when a cycle overruns
+    :param max_catch_up: CATCH_UP only, maximum number of missed cycles to replay before resynchronizing
+    :param degrade_factor: DEGRADE only, multiplier applied to the period on overrun
+    :param max_period: DEGRADE only, upper bound of the stretched period (default 10 * period)
+    :param recover_cycles: DEGRADE only, clean cycles required before the period is restored one step
+    :param clock: monotonic time source
+    :param sleep: coroutine function used to wait for a deadline
+    """
+
+    def __init__(self, period, policy=SkipPolicy.DROP, max_catch_up=5, degrade_factor=2.0, max_period=None,
+                 recover_cycles=10, clock=time.monotonic, sleep=asyncio.sleep):
+
+        if period <= 0:
+            raise ValueError('CycleScheduler: period must be positive, got {}'.format(period))
+
+        self._nominal_period = float(period)
+        self._period = self._nominal_period
+        self._policy = SkipPolicy(policy)
+        self._max_catch_up = int(max_catch_up)
+        self._degrade_factor = float(degrade_factor)
+        self._max_period = float(max_period) if max_period else 10.0 * self._nominal_period
+        self._recover_cycles = int(recover_cycles)
+
+        self._clock = clock
+        self._sleep = sleep
+
+        self._deadline = None  # Absolute release time of the current/next cycle
+        self._release = None  # Time the current cycle was actually released
+        self._clean_cycles = 0
+
+        self._stats = CycleStats()
+
+    @property
+    def period(self):
+        """ Period currently in effect, differs from nominal_period while degraded """
+        return self._period
+
+    @property
+    def nominal_period(self):
+        return self._nominal_period
+
+    @property
+    def policy(self):
+        return self._policy
+
+    @property
+    def deadline(self):
+        return self._deadline
+
+    @property
+    def stats(self):
+        return self._stats
+
+    def reset(self):
+        """ Restart the schedule grid at the current time """
+        self._deadline = self._clock()
+        self._release = None
+        self._period = self._nominal_period
+        self._clean_cycles = 0
+
+    async def wait(self):
+        """ Wait for the next cycle deadline, then release the cycle.
+            Always yields to the event loop once so that other tasks run even when the schedule is behind.
+        """
+        if self._deadline is None:
+            self.reset()
+
+        delay = self._deadline - self._clock()
+        await self._sleep(delay if delay > 0.0 else 0.0)
+
+        self._release = self._clock()
+        self._stats.record_release(max(self._release - self._deadline, 0.0))
+
+    def complete(self):
+        """ Mark the end of the cycle body. Records duration and overrun, and schedules the next deadline according to
+            the skip policy.
+        """
+        if self._release is None:
+            raise RuntimeError('CycleScheduler: complete() called before wait()')
+
+        end = self._clock()
+        next_deadline = self._deadline + self._period
+        overrun = end - next_deadline
+
+        self._stats.record_completion(end - self._release, overrun)
+        self._release = None
+
+        if overrun <= 0.0:
+            self._deadline = next_deadline
+            self._recover()
+            return
+
+        missed = int(math.floor(overrun / self._period)) + 1  # Deadlines that passed while the cycle was running
+        logging.debug('SCHEDULER: cycle overrun %.6f s, %d deadline(s) missed', overrun, missed)
+        self._clean_cycles = 0
+
+        if self._policy is SkipPolicy.CATCH_UP:
+            if missed > self._max_catch_up:
+                self._stats.skipped += missed - self._max_catch_up
+                next_deadline += (missed - self._max_catch_up) * self._period
+            self._deadline = next_deadline
+
+        elif self._policy is SkipPolicy.DROP:
+            self._stats.skipped += missed
+            self._deadline = next_deadline + missed * self._period
+
+        elif self._policy is SkipPolicy.DEGRADE:
+            self._stats.skipped += missed
+            self._period = min(self._period * self._degrade_factor, self._max_period)
+            self._deadline = end + self._period  # Restart the grid at the stretched period
+
+    def _recover(self):
+        """ DEGRADE only, step the period back toward nominal after enough clean cycles """
+        if self._period == self._nominal_period:
+            return
+
+        self._clean_cycles += 1
+        if self._clean_cycles >= self._recover_cycles:
+            self._period = max(self._period / self._degrade_factor, self._nominal_period)
+            self._clean_cycles = 0
+            logging.debug('SCHEDULER: period recovered to %.6f s', self._period)
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+
+import asyncio
+import logging
+import struct
+import unittest
+
+from GridPi.lib.comm import modbus, polling, pool
+
+
+class LocalModbusServer(object):
+    """ Modbus TCP server stand-in: holding registers in a dict, read and write multiple registers only.
+        Units listed in self.units have their own registers, units in self.silent never answer.
+    """
+
+    def __init__(self, registers=None):
+        self.registers = dict(registers or {})
+        self.units = dict()  # unit: registers
+        self.silent = set()
+        self.requests = list()  # (unit, function, address, count)
+        self.accepted = 0
+        self._server = None
+        self._connections = set()
+
+    @property
+    def port(self):
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self, port=0):
+        self._server = await asyncio.start_server(self._serve, '127.0.0.1', port)
+
+    async def stop(self):
+        self._server.close()
+        for task in self._connections:
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        await self._server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        self._connections.add(asyncio.current_task())
+        self.accepted += 1
+        try:
+            while True:
+                transaction, protocol, length, unit = struct.unpack('>HHHB', await reader.readexactly(7))
+                pdu = await reader.readexactly(length - 1)
+                response = self.handle(unit, pdu)
+                if unit in self.silent:
+                    continue
+                writer.write(struct.pack('>HHHB', transaction, 0, len(response) + 1, unit) + response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def handle(self, unit, pdu):
+        function, address, count = struct.unpack_from('>BHH', pdu)
+        self.requests.append((unit, function, address, count))
+        registers = self.units.get(unit, self.registers)
+        if function == modbus.READ_HOLDING_REGISTERS:
+            if any(address + n not in registers for n in range(count)):
+                return struct.pack('>BB', function | 0x80, 2)  # Illegal data address
+            return struct.pack('>BB', function, 2 * count) + b''.join(
+                struct.pack('>H', registers[address + n]) for n in range(count))
+        if function == modbus.WRITE_MULTIPLE_REGISTERS:
+            for n in range(count):
+                registers[address + n] = struct.unpack_from('>H', pdu, 6 + 2 * n)[0]
+            return struct.pack('>BHH', function, address, count)
+        return struct.pack('>BB', function | 0x80, 1)  # Illegal function
+
+
+def float_words(value, word_swap=False):
+    high, low = struct.unpack('>HH', struct.pack('>f', value))
+    return (low, high) if word_swap else (high, low)
+
+
+class TestModbusDevice(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        registers = dict()
+        registers.update(zip((100, 101), float_words(12.5, word_swap=True)))  # kw, as 32bit_float
+        registers[102] = 0xFFFF  # alarm code, 16bit_int -1
+        registers.update(zip((103, 104), struct.unpack('>HH', struct.pack('>I', 70000))))  # kwh
+        registers[110] = 500  # soc, scaled 0.001
+        registers[111] = 0  # kw_setpoint, scaled 0.1
+        registers[112] = 0  # run_cmd
+        self.server = LocalModbusServer(registers)
+        self.loop.run_until_complete(self.server.start())
+
+        self.config = {'ip_add': '127.0.0.1',
+                       'port': self.server.port,
+                       'registers': [{'name': 'kw', 'mod_add': 100, 'type': '32bit_float'},
+                                     {'name': 'alarm_code', 'mod_add': 102, 'type': '16bit_int'},
+                                     {'name': 'kwh', 'mod_add': 103, 'type': '32bit_uint'},
+                                     {'name': 'soc', 'mod_add': 110, 'type': '16bit_uint', 'scale': 0.001},
+                                     {'name': 'kw_setpoint', 'mod_add': 111, 'type': '16bit_int', 'scale': 0.1,
+                                      'access': 'rw'},
+                                     {'name': 'run_cmd', 'mod_add': 112, 'type': '16bit_uint', 'access': 'rw'}]}
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.server.stop())
+        self.loop.close()
+
+    def test_plan_blocks(self):
+        device = modbus.ModbusDevice(self.config)
+        self.assertEqual([(block.address, block.count) for block in device.read_blocks], [(100, 5), (110, 3)])
+
+        self.config['max_gap'] = 5
+        device = modbus.ModbusDevice(self.config)
+        self.assertEqual([(block.address, block.count) for block in device.read_blocks], [(100, 13)])
+
+    def test_block_size_limit(self):
+        registers = [modbus.Register('r{}'.format(n), n, '16bit_uint') for n in range(300)]
+        self.assertEqual([block.count for block in modbus.plan_blocks(registers)], [125, 125, 50])
+
+    def test_overlapping_registers(self):
+        registers = [modbus.Register('a', 0, '32bit_uint'), modbus.Register('b', 1, '16bit_uint')]
+        with self.assertRaises(ValueError):
+            modbus.plan_blocks(registers)
+
+    def test_block_codec(self):
+        registers = [modbus.Register('kw', 10, '32bit_float', scale=0.5),
+                     modbus.Register('alarm_code', 14, '16bit_int'),
+                     modbus.Register('kwh', 15, '32bit_uint', scale=0.1, word_swap=True)]
+        block = modbus.plan_blocks(registers, max_gap=2)[0]
+        self.assertEqual((block.address, block.count, block.codec.format), (10, 7, '>f4xhI'))
+
+        values = {'kw': -12.5, 'alarm_code': -3, 'kwh': 7000.0}
+        data = block.encode(values)
+        self.assertEqual(data[:4], struct.pack('>HH', *float_words(-25.0, word_swap=True)))
+        self.assertEqual(data[10:], struct.pack('>HH', *reversed(struct.unpack('>HH', struct.pack('>I', 70000)))))
+
+        decoded = dict()
+        block.decode(data, decoded)
+        self.assertEqual(decoded, values)
+
+    def test_read_coalesces_blocks(self):
+        self.server.registers.update({105 + n: 0 for n in range(5)})
+        self.config['max_gap'] = 5
+        device = modbus.ModbusDevice(self.config)
+        status = {'kw': None, 'alarm_code': None, 'kwh': None, 'soc': None, 'online': False}
+        self.loop.run_until_complete(device.read(status))
+
+        self.assertEqual(status, {'kw': 12.5, 'alarm_code': -1, 'kwh': 70000, 'soc': 0.5, 'online': False})
+        self.assertEqual(self.server.requests, [(1, modbus.READ_HOLDING_REGISTERS, 100, 13)])
+
+    def test_write_coalesces_registers(self):
+        device = modbus.ModbusDevice(self.config)
+        self.loop.run_until_complete(device.write({'kw_setpoint': -25.0, 'run_cmd': True, 'not_mapped': 1}))
+
+        self.assertEqual(self.server.requests, [(1, modbus.WRITE_MULTIPLE_REGISTERS, 111, 2)])
+        self.assertEqual(struct.unpack('>h', struct.pack('>H', self.server.registers[111]))[0], -250)
+        self.assertEqual(self.server.registers[112], 1)
+
+    def test_exception_response_keeps_connection(self):
+        del self.server.registers[104]
+        device = modbus.ModbusDevice(self.config)
+        with self.assertRaises(modbus.ModbusError) as context:
+            self.loop.run_until_complete(device.read({'kw': None}))
+        self.assertEqual(context.exception.code, 2)
+        self.assertTrue(device.client.connected)  # A valid reply, the connection is healthy
+
+        self.server.registers[104] = 0
+        status = {'kw': None}
+        self.loop.run_until_complete(device.read(status))
+        self.assertEqual(status['kw'], 12.5)
+        self.assertEqual(self.server.accepted, 1)
+
+    def test_reconnect_after_connection_loss(self):
+        device = modbus.ModbusDevice(self.config)
+        self.loop.run_until_complete(device.read({'kw': None}))
+        port = self.server.port
+        self.loop.run_until_complete(self.server.stop())
+        with self.assertRaises(modbus.COMM_ERRORS):
+            self.loop.run_until_complete(device.read({'kw': None}, now=float('inf')))
+        self.assertFalse(device.client.connected)
+
+        self.loop.run_until_complete(self.server.start(port))
+        self.server.requests.clear()
+        self.loop.run_until_complete(device.read({'kw': None}, now=float('inf')))
+        self.assertTrue(device.client.connected)
+        self.assertEqual(len(self.server.requests), len(device.read_blocks))
+        self.assertEqual(self.server.accepted, 2)
+
+    def test_asset_comm_interface(self):
+        """ ModbusDevice plugs into the comm_interface awaited by an asset's update_status() """
+        from GridPi.lib.models import model_core
+
+        class ModbusEnergyStorage(model_core.EnergyStorage):
+            def __init__(self, interface_config):
+                super(ModbusEnergyStorage, self).__init__()
+                self.internal_status.update({'kw': 0.0, 'soc': 0.0})
+                self.comm_interface = modbus.ModbusDevice(interface_config)
+
+            async def update_status(self):
+                await self.comm_interface.read(self.internal_status)
+                self._status['kw'] = self.internal_status['kw']
+                self._status['soc'] = self.internal_status['soc']
+                super(ModbusEnergyStorage, self).update_status()
+
+        asset = ModbusEnergyStorage(self.config)
+        self.loop.run_until_complete(asset.update_status())
+        self.assertEqual((asset.status['kw'], asset.status['soc']), (12.5, 0.5))
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.server = LocalModbusServer()
+        self.server.units = {unit: {0: unit, 1: 10 * unit} for unit in range(1, 21)}
+        self.loop.run_until_complete(self.server.start())
+
+    def tearDown(self):
+        pool.close_pools()
+        self.loop.run_until_complete(self.server.stop())
+        self.loop.close()
+
+    def gather(self, *coroutines):
+        async def run():
+            return await asyncio.gather(*coroutines)
+        return self.loop.run_until_complete(run())
+
+    def config(self, unit):
+        return {'ip_add': '127.0.0.1', 'port': self.server.port, 'unit': unit, 'pooled': True, 'pool_size': 2,
+                'registers': [{'name': 'unit', 'mod_add': 0, 'type': '16bit_uint'},
+                              {'name': 'kw', 'mod_add': 1, 'type': '16bit_uint'}]}
+
+    def test_devices_share_connections(self):
+        devices = [modbus.ModbusDevice(self.config(unit)) for unit in range(1, 21)]
+        statuses = [{'unit': None, 'kw': None} for _ in devices]
+        for _ in range(3):
+            self.gather(*(device.read(status) for device, status in zip(devices, statuses)))
+
+        self.assertEqual(statuses, [{'unit': unit, 'kw': 10 * unit} for unit in range(1, 21)])
+        self.assertIs(devices[0].client.pool, devices[-1].client.pool)
+        self.assertEqual(self.server.accepted, 2)
+        self.assertEqual(len(self.server.requests), 60)
+        self.assertEqual(devices[4].client.stats.as_dict()['requests'], 3)
+
+    def test_round_robin_over_units(self):
+        gateway = pool.ConnectionPool('127.0.0.1', self.server.port, size=1, max_pipeline=1)
+        busy, quiet = gateway.client(1), gateway.client(2)
+        requests = [busy.read_holding_registers(0, 1) for _ in range(4)] + [quiet.read_holding_registers(0, 1)]
+        self.gather(*requests)
+        gateway.close()
+
+        self.assertEqual([request[0] for request in self.server.requests], [1, 2, 1, 1, 1])
+
+    def test_silent_unit_does_not_block_others(self):
+        self.server.silent.add(9)
+        gateway = pool.ConnectionPool('127.0.0.1', self.server.port, size=1, max_pipeline=2, timeout=0.05)
+
+        async def poll():
+            silent = gateway.client(9).read_holding_registers(0, 1)
+            answers = [gateway.client(unit).read_holding_registers(0, 1) for unit in (1, 2, 3)]
+            return await asyncio.gather(silent, *answers, return_exceptions=True)
+
+        results = self.loop.run_until_complete(poll())
+        gateway.close()
+
+        self.assertIsInstance(results[0], asyncio.TimeoutError)
+        self.assertEqual([struct.unpack('>H', data)[0] for data in results[1:]], [1, 2, 3])
+        self.assertEqual(gateway.stats[9].timeouts, 1)
+        self.assertEqual(gateway.stats[1].as_dict()['errors'], 0)
+        self.assertEqual(gateway.connections[0].connects, 1)
+
+    def test_exception_response_counts_as_error(self):
+        gateway = pool.ConnectionPool('127.0.0.1', self.server.port, size=1)
+        client = gateway.client(4)
+        self.loop.run_until_complete(client.read_holding_registers(0, 1))
+        with self.assertRaises(modbus.ModbusError):
+            self.loop.run_until_complete(client.read_holding_registers(500, 1))  # Illegal data address
+        gateway.close()
+
+        stats = client.stats.as_dict()
+        self.assertEqual((stats['requests'], stats['errors'], stats['exceptions'], stats['timeouts']), (2, 1, 1, 0))
+        self.assertEqual(stats['mean'], stats['last'])  # Only the successful request is timed
+
+    def test_reconnect_with_backoff(self):
+        port = self.server.port
+        self.loop.run_until_complete(self.server.stop())
+        gateway = pool.ConnectionPool('127.0.0.1', port, size=1, timeout=0.05, backoff=0.01, max_backoff=0.02)
+        client = gateway.client(3)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            self.loop.run_until_complete(client.read_holding_registers(1, 1))
+        self.assertFalse(client.connected)
+
+        self.loop.run_until_complete(self.server.start(port))
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+        self.assertEqual(self.loop.run_until_complete(client.read_holding_registers(1, 1)), struct.pack('>H', 30))
+        self.assertEqual(gateway.connections[0].connects, 1)
+        gateway.close()
+
+
+class TestReportByException(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.server = LocalModbusServer({0: 1, 1: 0, 20: 250, 50: 400})
+        self.loop.run_until_complete(self.server.start())
+        self.config = {'ip_add': '127.0.0.1',
+                       'port': self.server.port,
+                       'poll_classes': {'temperature': 10.0, 'breaker': 0.1},
+                       'poll_period': 1.0,
+                       'registers': [{'name': 'breaker_open', 'mod_add': 0, 'type': '16bit_uint', 'poll': 'breaker'},
+                                     {'name': 'breaker_trip', 'mod_add': 1, 'type': '16bit_uint', 'poll': 'breaker'},
+                                     {'name': 'kw', 'mod_add': 20, 'type': '16bit_int', 'scale': 0.1},
+                                     {'name': 'temperature', 'mod_add': 50, 'type': '16bit_int', 'scale': 0.1,
+                                      'poll': 'temperature', 'deadband': 0.5}]}
+        self.device = modbus.ModbusDevice(self.config)
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.server.stop())
+        self.loop.close()
+
+    def read(self, internal_status, now):
+        self.server.requests.clear()
+        changed = self.loop.run_until_complete(self.device.read(internal_status, now=now))
+        return changed, [request[2] for request in self.server.requests]
+
+    def test_poll_classes(self):
+        self.assertEqual([(group.name, group.period) for group in self.device.scheduler.groups],
+                         [('breaker', 0.1), ('default', 1.0), ('temperature', 10.0)])
+        self.assertEqual([(block.address, block.count) for block in self.device.read_blocks],
+                         [(0, 2), (20, 1), (50, 1)])
+
+        self.config['registers'][0]['poll'] = 'voltage'
+        with self.assertRaises(ValueError):
+            modbus.ModbusDevice(self.config)
+
+    def test_reads_only_what_is_due(self):
+        status = dict()
+        polled = [self.read(status, now)[1] for now in (0.0, 0.1, 0.2, 0.995, 1.1, 10.0)]
+        self.assertEqual(polled, [[0, 20, 50], [0], [0], [0, 20], [0], [0, 20, 50]])
+
+    def test_reports_changed_values_only(self):
+        status = {'breaker_open': None, 'kw': None, 'temperature': None}
+        changed, _ = self.read(status, 0.0)
+        self.assertEqual(changed, {'breaker_open': 1, 'breaker_trip': 0, 'kw': 25.0, 'temperature': 40.0})
+        self.assertEqual(status, {'breaker_open': 1, 'kw': 25.0, 'temperature': 40.0})
+
+        status['kw'] = 'untouched'
+        self.assertEqual(self.read(status, 1.0)[0], dict())
+        self.assertEqual(status['kw'], 'untouched')
+
+        self.server.registers[0] = 0
+        self.server.registers[50] = 403  # Within the deadband
+        self.assertEqual(self.read(status, 1.1)[0], {'breaker_open': 0})
+        self.assertEqual(self.read(status, 10.0)[0], dict())
+
+        self.server.registers[50] = 406
+        self.assertEqual(self.read(status, 20.0)[0], {'temperature': 40.6})
+        self.assertEqual(status['temperature'], 40.6)
+
+    def test_failed_class_keeps_the_others(self):
+        del self.server.registers[20]  # The default class, read second
+        status = {'breaker_open': None, 'kw': None, 'temperature': None}
+        with self.assertRaises(modbus.ModbusError):
+            self.read(status, 0.0)
+        self.assertEqual(status, {'breaker_open': 1, 'kw': None, 'temperature': 40.0})
+        self.assertEqual(self.device.values['breaker_trip'], 0)
+        self.assertIsNone(self.device.values['kw'])
+
+        self.server.registers[20] = 250
+        changed, polled = self.read(status, 0.1)
+        self.assertEqual(polled, [0, 20])  # The failed class is still due, the classes read are not
+        self.assertEqual(changed, {'kw': 25.0})
+        self.assertEqual(status['kw'], 25.0)
+
+    def test_scheduler_does_not_catch_up(self):
+        group = polling.PollGroup('breaker', 0.1, [])
+        scheduler = polling.PollScheduler([group])
+        scheduler.done(group, 0.0)
+        self.assertEqual(group.next_due, 0.1)
+        self.assertEqual(scheduler.due(0.095), [group])  # Within slack
+        scheduler.done(group, 0.095)
+        self.assertAlmostEqual(group.next_due, 0.2)
+        scheduler.done(group, 5.0)  # Late, next read one period after now
+        self.assertEqual(group.next_due, 5.1)
+        self.assertEqual(scheduler.due(5.05), [])
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.DEBUG)
+    unittest.main()
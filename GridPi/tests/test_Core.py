@@ -1,9 +1,12 @@
 import logging
+import os
 import unittest
 from configparser import ConfigParser
 
 from GridPi.lib import gridpi_core
+from GridPi.lib.dispatch import dispatch_core, dispatch_statemachine
 from GridPi.lib.models import model_core
+from GridPi.lib.process import process_plugins
 
 class TestCoreModule(unittest.TestCase):
 
@@ -30,6 +33,93 @@ class TestCoreModule(unittest.TestCase):
     def test_add_process(self):
         pass
 
+class TestCycleFrames(unittest.TestCase):
+
+    def setUp(self):
+        self.test_system = gridpi_core.System()
+        self.ess = model_core.EnergyStorage()
+        self.test_system.add_asset(self.ess)
+        self.test_system.add_process(process_plugins.EssSocPowerController({}))
+        self.test_system.process_container._ready = True
+
+        self.ess.status['soc'] = 0.4
+        self.ess.config['target_soc'] = 0.6
+
+    def test_processes_write_through_commit(self):
+        self.test_system.begin_cycle()
+        self.test_system.run_processes()
+
+        self.assertEqual(self.ess.control['kw_setpoint'], 0.0)  # Not visible before commit
+        self.assertIsNone(self.test_system.committed_frame)
+
+        frame = self.test_system.commit_cycle()
+        self.assertEqual(self.ess.control['kw_setpoint'], -50)
+        self.assertIs(self.test_system.committed_frame, frame)
+
+    def test_processes_read_input_frame(self):
+        self.test_system.begin_cycle()
+        self.ess.status['soc'] = 0.9  # Arrives after the input frame was taken
+        self.test_system.run_processes()
+        self.test_system.commit_cycle()
+
+        self.assertEqual(self.ess.control['kw_setpoint'], -50)
+
+    def test_run_processes_outside_cycle(self):
+        self.test_system.run_processes()
+
+        self.assertEqual(self.ess.control['kw_setpoint'], -50)
+
+
+
+class TestCycleDispatchOrder(unittest.TestCase):
+    """ Within a cycle dispatch runs after the processes, on the same working store """
+
+    def setUp(self):
+        self.test_system = gridpi_core.System()
+        self.grid = model_core.GridIntertie()
+        self.grid.config['name'] = 'grid'
+        self.ess = model_core.EnergyStorage()
+        self.ess.config['name'] = 'inverter'
+        self.feeder = model_core.Feeder()
+        self.feeder.config['name'] = 'feeder'
+        for asset in (self.grid, self.ess, self.feeder):
+            self.test_system.add_asset(asset)
+        self.working = self.test_system.cycle_buffer.working
+
+    def test_dispatch_reads_process_outputs_of_the_cycle(self):
+        self.test_system.begin_cycle()
+        self.working.set(self.grid.status.slot('enabled'), True)  # Written by a process this cycle
+        self.test_system.run_state_machine()
+
+        self.assertIs(self.test_system.state_machine.current_state, dispatch_core.grid_state)
+        self.assertFalse(self.grid.control['run'])  # Not visible before commit
+        self.test_system.commit_cycle()
+        self.assertTrue(self.grid.control['run'])
+
+    def test_dispatch_output_wins_over_process_output(self):
+        self.test_system.begin_cycle()
+        self.working.set(self.feeder.control.slot('run'), False)  # Written by a process this cycle
+        self.test_system.run_state_machine()  # Blackout runs the feeder
+        self.test_system.commit_cycle()
+
+        self.assertTrue(self.feeder.control['run'])
+
+    def test_table_machine_allocates_during_cycle(self):
+        parser = ConfigParser()
+        parser.read(os.path.join(os.path.dirname(__file__), '..', 'config', 'dispatch_cfg.ini'))
+        self.test_system.state_machine = dispatch_statemachine.TableStateMachine.from_config(parser)
+        del self.grid.status['enabled']  # Allocated again by the first bind, after begin_cycle()
+
+        self.test_system.begin_cycle()
+        self.test_system.run_state_machine()
+        self.working.set(self.grid.status.slot('enabled'), True)
+        self.test_system.run_state_machine()
+        self.test_system.commit_cycle()
+
+        self.assertTrue(self.grid.status['enabled'])
+        self.assertTrue(self.grid.control['run'])
+
+
 if __name__ == '__main__':
     logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.DEBUG)
     unittest.main()
\ No newline at end of file
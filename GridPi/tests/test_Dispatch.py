@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+
+import itertools
+import logging
+import os
+import unittest
+from configparser import ConfigParser
+
+from GridPi.lib.dispatch import dispatch_core, dispatch_statemachine
+from GridPi.lib.models import model_core
+
+
+class TestDispatchStateMachine(unittest.TestCase):
+
+    def setUp(self):
+        self.AC = model_core.AssetContainer()
+        self.grid = model_core.GridIntertie()
+        self.grid.config['name'] = 'grid'
+        self.ess = model_core.EnergyStorage()
+        self.ess.config['name'] = 'inverter'
+        self.feeder = model_core.Feeder()
+        self.feeder.config['name'] = 'feeder'
+        for asset in (self.grid, self.ess, self.feeder):
+            self.AC.add_asset(asset)
+
+        self.sm = dispatch_core.DispatchStateMachine(dispatch_core.blackout_state)
+
+    def test_blackout_to_grid_connected(self):
+        self.sm.run_all(self.AC)
+        self.assertIs(self.sm.current_state, dispatch_core.blackout_state)
+        self.assertTrue(self.feeder.control['run'])
+        self.assertFalse(self.grid.control['run'])
+
+        self.grid.status['enabled'] = True
+        self.sm.run_all(self.AC)
+        self.assertIs(self.sm.current_state, dispatch_core.grid_state)
+        self.assertTrue(self.grid.control['run'])
+        self.assertEqual(self.ess.control['state_cmd'], 1)
+
+    def test_grid_loss_to_ess_grid_forming(self):
+        self.grid.status['enabled'] = True
+        self.sm.run_all(self.AC)
+        self.grid.status['enabled'] = False
+        self.ess.status['online'] = True
+        self.sm.run_all(self.AC)
+        self.assertIs(self.sm.current_state, dispatch_core.ess_state)
+        self.assertEqual(self.ess.control['state_cmd'], 2)
+        self.assertFalse(self.grid.control['run'])
+
+    def test_messages_allocated_once(self):
+        self.sm.run_all(self.AC)
+        inputs, outputs = dict(self.sm._inputs), dict(self.sm._outputs)
+        self.grid.status['enabled'] = True
+        self.sm.run_all(self.AC)
+        self.sm.run_all(self.AC)
+        self.assertEqual(self.sm._inputs, inputs)
+        self.assertEqual(self.sm._outputs, outputs)
+
+    def test_rebind_on_new_assets(self):
+        self.sm.asset_names = {'grid': 'grid', 'ess': 'inverter', 'feeder': 'feeder'}
+        self.sm.run_all(self.AC)
+        other = model_core.EnergyStorage()
+        other.config['name'] = 'inverter_2'
+        self.AC.add_asset(other)
+        self.sm.run_all(self.AC)
+        self.assertEqual(self.sm._asset_count, 4)
+
+    def test_bind_by_name(self):
+        other = model_core.EnergyStorage()
+        other.config['name'] = 'inverter_2'
+        self.AC.add_asset(other)
+        with self.assertRaises(ValueError):  # Two ESS and no name: the target would be ambiguous
+            self.sm.run_all(self.AC)
+
+        self.sm.asset_names = {'grid': 'grid', 'ess': 'inverter_2', 'feeder': 'feeder'}
+        self.grid.status['enabled'] = True
+        self.sm.run_all(self.AC)
+        self.assertIs(self.sm.current_state, dispatch_core.grid_state)
+        self.assertEqual(other.control['state_cmd'], 1)
+        self.assertNotEqual(self.ess.control['state_cmd'], 1)
+
+        self.sm.asset_names = {'grid': 'grid', 'ess': 'missing', 'feeder': 'feeder'}
+        with self.assertRaises(KeyError):
+            self.sm.bind(self.AC)
+
+    def test_messages_have_no_dict(self):
+        msg = dispatch_core.GridConnectedInput(self.AC)
+        self.assertFalse(hasattr(msg, '__dict__'))
+        with self.assertRaises(AttributeError):
+            msg.not_a_field = True
+
+
+DISPATCH_CFG = os.path.join(os.path.dirname(__file__), '..', 'config', 'dispatch_cfg.ini')
+
+
+class TestTableStateMachine(unittest.TestCase):
+
+    def setUp(self):
+        self.AC = model_core.AssetContainer()
+        self.grids, self.ess = list(), list()
+        for n in range(2):
+            grid = model_core.GridIntertie()
+            grid.config['name'] = 'grid_{}'.format(n)
+            ess = model_core.EnergyStorage()
+            ess.config['name'] = 'ess_{}'.format(n)
+            ess.config['groups'] = 'storage'
+            self.AC.add_asset(grid)
+            self.AC.add_asset(ess)
+            self.grids.append(grid)
+            self.ess.append(ess)
+        self.feeder = model_core.Feeder()
+        self.feeder.config['name'] = 'feeder'
+        self.AC.add_asset(self.feeder)
+
+        parser = ConfigParser()
+        parser.read(DISPATCH_CFG)
+        self.sm = dispatch_statemachine.TableStateMachine.from_config(parser)
+
+    def test_shipped_table_matches_dispatch_states(self):
+        """ Single grid and ESS: the shipped table behaves like the hand written states """
+        AC = model_core.AssetContainer()
+        grid, ess, feeder = model_core.GridIntertie(), model_core.EnergyStorage(), model_core.Feeder()
+        for asset, name in ((grid, 'grid'), (ess, 'inverter'), (feeder, 'feeder')):
+            asset.config['name'] = name
+            AC.add_asset(asset)
+        reference = dispatch_core.DispatchStateMachine(dispatch_core.blackout_state)
+
+        for grid_enabled, ess_enabled, ess_online in itertools.product((False, True), repeat=3):
+            for start in ('blackout', 'grid_connected', 'ess_grid_forming'):
+                grid.status['enabled'], ess.status['enabled'], ess.status['online'] = \
+                    grid_enabled, ess_enabled, ess_online
+                reference.current_state = {'blackout': dispatch_core.blackout_state,
+                                           'grid_connected': dispatch_core.grid_state,
+                                           'ess_grid_forming': dispatch_core.ess_state}[start]
+                reference.run_all(AC)
+                expected = (reference.current_state.name, ess.control['run'], ess.control['state_cmd'])
+
+                self.sm._current = [state.key for state in self.sm.states].index(start)
+                self.sm.run_all(AC)
+                self.assertEqual((self.sm.current_state.name, ess.control['run'], ess.control['state_cmd']),
+                                 expected)
+
+    def test_multi_grid_and_ess(self):
+        self.sm.run_all(self.AC)
+        self.assertEqual(self.sm.current_state.key, 'blackout')
+
+        self.grids[1].status['enabled'] = True  # Any grid intertie enables grid connected operation
+        self.sm.run_all(self.AC)
+        self.assertEqual(self.sm.current_state.key, 'grid_connected')
+        self.assertEqual([grid.control['run'] for grid in self.grids], [True, True])
+        self.assertEqual([ess.control['state_cmd'] for ess in self.ess], [1, 1])
+        self.assertIsInstance(self.ess[0].control['state_cmd'], int)
+
+        self.grids[1].status['enabled'] = False
+        self.ess[0].status['online'] = True
+        self.sm.run_all(self.AC)
+        self.assertEqual(self.sm.current_state.key, 'ess_grid_forming')
+        self.assertEqual([ess.control['state_cmd'] for ess in self.ess], [2, 2])
+
+    def test_reduce_all_and_group_target(self):
+        parser = ConfigParser()
+        parser.read_dict({'DISPATCH': {'initial_state': 'idle'},
+                          'signal:storage_online': {'target': 'storage', 'param': 'online', 'reduce': 'all'},
+                          'state:idle': {'transitions': 'ready if storage_online', 'outputs': 'storage.run = false'},
+                          'state:ready': {'transitions': 'idle if not storage_online',
+                                          'outputs': 'storage.run = true\nfeeder.kw_setpoint = 2.5'}})
+        sm = dispatch_statemachine.TableStateMachine.from_config(parser)
+
+        self.ess[0].status['online'] = True
+        sm.run_all(self.AC)
+        self.assertEqual(sm.current_state.key, 'idle')
+
+        self.ess[1].status['online'] = True
+        sm.run_all(self.AC)
+        self.assertEqual(sm.current_state.key, 'ready')
+        self.assertEqual([ess.control['run'] for ess in self.ess], [True, True])
+        self.assertEqual(self.feeder.control['kw_setpoint'], 2.5)
+
+    def test_first_transition_wins(self):
+        parser = ConfigParser()
+        parser.read_dict({'DISPATCH': {'initial_state': 'a'},
+                          'signal:x': {'target': 'grid', 'param': 'enabled'},
+                          'state:a': {'transitions': 'b if x\nc if always'},
+                          'state:b': {},
+                          'state:c': {}})
+        sm = dispatch_statemachine.TableStateMachine.from_config(parser)
+        self.assertEqual(sm.table.shape, (3, 2))
+        self.assertEqual(list(sm.table[0]), [2, 1])
+        self.assertEqual(list(sm.table[1]), [1, 1])
+
+    def test_permit_holds_request(self):
+        parser = ConfigParser()
+        parser.read_dict({'DISPATCH': {'initial_state': 'idle'},
+                          'signal:grid_enabled': {'target': 'grid', 'param': 'enabled'},
+                          'signal:ess_alarm': {'target': 'ess', 'param': 'alarm'},
+                          'state:idle': {'transitions': 'ready if grid_enabled'},
+                          'state:ready': {'transitions': 'idle if not grid_enabled', 'permit': 'not ess_alarm'}})
+        sm = dispatch_statemachine.TableStateMachine.from_config(parser)
+
+        self.grids[0].status['enabled'] = True
+        self.ess[0].status['alarm'] = True
+        sm.run_all(self.AC)
+        self.assertEqual(sm.requested_state.key, 'ready')  # Requested, but not permitted
+        self.assertEqual(sm.current_state.key, 'idle')
+
+        self.ess[0].status['alarm'] = False
+        sm.run_all(self.AC)
+        self.assertEqual(sm.requested_state.key, 'ready')
+        self.assertEqual(sm.current_state.key, 'ready')
+
+    def test_invalid_table(self):
+        parser = ConfigParser()
+        parser.read_dict({'DISPATCH': {'initial_state': 'a'},
+                          'state:a': {'transitions': 'b if missing_signal'},
+                          'state:b': {}})
+        with self.assertRaises(ValueError):
+            dispatch_statemachine.TableStateMachine.from_config(parser)
+
+        with self.assertRaises(ValueError):
+            dispatch_statemachine.TableStateMachine([], [], 'a')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.DEBUG)
+    unittest.main()
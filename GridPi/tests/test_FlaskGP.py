@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from flask_gp import flask_gp
+
+
+class TestStatusEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(handle)
+        db = sqlite3.connect(self.path)
+        db.executescript("CREATE TABLE asset_identity_table (asset_id INTEGER PRIMARY KEY, asset_name VARCHAR);"
+                         "CREATE TABLE parameter_identity_table (param_id INTEGER PRIMARY KEY, param_name VARCHAR(50),"
+                         " asset_id INTEGER, param_access INTEGER, param_value NUMERIC);"
+                         "INSERT INTO asset_identity_table VALUES (1, 'ess'), (2, 'grid'), (3, 'feeder');"
+                         "INSERT INTO parameter_identity_table VALUES (1, 'kw', 1, 0, 10.5), (2, 'soc', 1, 0, 0.5),"
+                         " (3, 'kw', 2, 0, -10.5), (4, 'enable_request', 1, 1, 1);")
+        db.commit()
+        db.close()
+
+        flask_gp.app.config['DATABASE'] = self.path
+        flask_gp.app.config['TESTING'] = True
+        self.client = flask_gp.app.test_client()
+        self.queries = list()
+        flask_gp.status_cache._connect(self.path)
+        flask_gp.status_cache._db.set_trace_callback(self.queries.append)
+
+    def tearDown(self):
+        flask_gp.status_cache._connect(':memory:')  # Release the test database
+        os.remove(self.path)
+
+    def test_status_grouped_by_asset(self):
+        response = self.client.get('/json_update_status')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(),
+                         [[{'asset_name': 'ess', 'param_name': 'kw', 'param_value': 10.5},
+                           {'asset_name': 'ess', 'param_name': 'soc', 'param_value': 0.5}],
+                          [{'asset_name': 'grid', 'param_name': 'kw', 'param_value': -10.5}]])
+        self.assertEqual(len([query for query in self.queries if query.startswith('SELECT')]), 1)
+
+    def test_cached_until_data_version_changes(self):
+        first = self.client.get('/json_update_status')
+        etag = first.headers['ETag'].strip('"')
+
+        response = self.client.get('/json_update_status', headers={'If-None-Match': '"{}"'.format(etag)})
+        self.assertEqual(response.status_code, 304)
+        self.client.get('/json_update_status')
+        self.assertEqual(len([query for query in self.queries if query.startswith('SELECT')]), 1)
+
+        db = sqlite3.connect(self.path)  # Another writer, as the GridPi persistence writer
+        db.execute('UPDATE parameter_identity_table SET param_value = ? WHERE param_id = ?', (11.0, 1))
+        db.commit()
+        db.close()
+
+        response = self.client.get('/json_update_status', headers={'If-None-Match': '"{}"'.format(etag)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()[0][0]['param_value'], 11.0)
+        self.assertNotEqual(response.headers['ETag'].strip('"'), etag)
+
+    def test_control_page(self):
+        response = self.client.get('/control')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'enable_request', response.data)
+        self.assertIn(b'PID:4', response.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
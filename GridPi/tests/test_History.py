@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+import logging
+import threading
+import unittest
+
+import numpy as np
+
+from GridPi.lib.models import model_core, tag_store
+from GridPi.lib.persistence import history, SQLAlchemyGP
+
+
+class TestHistoryStore(unittest.TestCase):
+
+    def setUp(self):
+        self.ess = model_core.EnergyStorage()
+        self.ess.config['name'] = 'inverter'
+        self.AC = model_core.AssetContainer()
+        self.AC.add_asset(self.ess)
+
+        self.store = self.AC.tag_store
+        self.history = history.HistoryStore(self.store, chunk_size=10, retention=None)
+
+    def append_cycles(self, history_store, n, t0=0.0):
+        for x in range(n):
+            self.ess.status['kw'] = float(x)  # Changes every cycle
+            self.ess.status['soc'] = 0.5 if x < 5 else 0.4  # Slowly changing
+            frame = tag_store.Frame(self.store, x)
+            frame._timestamp = t0 + x
+            history_store.append(frame)
+
+    def test_append_and_query_unsealed(self):
+        self.append_cycles(self.history, 5)
+
+        times, values = self.history.query('inverter', 'kw')
+        np.testing.assert_array_equal(times, np.arange(5.0))
+        np.testing.assert_array_equal(values, np.arange(5.0))
+        self.assertEqual(self.history.pending_chunks, 0)
+
+    def test_flush_encodes_columns(self):
+        self.append_cycles(self.history, 10)
+        self.assertEqual(self.history.pending_chunks, 1)
+
+        blocks = {block.label: block for block in self.history.flush()}
+        self.assertEqual(blocks[('inverter', 'status', 'soc')].encoding, history.ENCODING_RLE)
+        self.assertEqual(len(blocks[('inverter', 'status', 'soc')].values), 2)
+        self.assertEqual(blocks[('inverter', 'status', 'kw')].encoding, history.ENCODING_RAW)
+        self.assertNotIn(('inverter', 'config', 'name'), blocks)  # Object slots are not recorded
+
+        times, values = self.history.query('inverter', 'soc')
+        np.testing.assert_array_equal(values, [0.5] * 5 + [0.4] * 5)
+
+    def test_query_range_spans_sealed_and_open_chunks(self):
+        self.append_cycles(self.history, 15)
+        self.history.flush()
+
+        times, values = self.history.query('inverter', 'kw', t_start=8.0, t_end=11.0)
+        np.testing.assert_array_equal(times, [8.0, 9.0, 10.0, 11.0])
+        np.testing.assert_array_equal(values, [8.0, 9.0, 10.0, 11.0])
+
+    def test_query_category(self):
+        self.append_cycles(self.history, 3)
+
+        times, values = self.history.query('inverter', 'kw', category='control')
+        self.assertEqual(len(times), 0)
+
+    def test_new_slot_mid_chunk(self):
+        self.append_cycles(self.history, 3)
+        self.ess.status['new_param'] = 1.0
+        self.append_cycles(self.history, 3, t0=3.0)
+
+        times, values = self.history.query('inverter', 'new_param')
+        np.testing.assert_array_equal(values, [np.nan] * 3 + [1.0] * 3)
+
+    def test_retention(self):
+        history_store = history.HistoryStore(self.store, chunk_size=10, retention=15.0)
+        self.append_cycles(history_store, 30)
+        history_store.flush()
+
+        times, values = history_store.query('inverter', 'kw')
+        self.assertEqual(times[0], 10.0)
+
+    def test_memory_budget(self):
+        history_store = history.HistoryStore(self.store, chunk_size=10, retention=None)
+        self.append_cycles(history_store, 10)
+        history_store.flush()
+        chunk_bytes = history_store.nbytes
+
+        history_store = history.HistoryStore(self.store, chunk_size=10, retention=None, max_bytes=2 * chunk_bytes)
+        self.append_cycles(history_store, 40)
+        history_store.flush()
+
+        self.assertLessEqual(history_store.nbytes, 2 * chunk_bytes)
+        times, values = history_store.query('inverter', 'kw')
+        self.assertEqual(times[0], 20.0)
+
+    def test_concurrent_append_and_flush(self):
+        history_store = history.HistoryStore(self.store, chunk_size=7, retention=None, max_bytes=None)
+        done = threading.Event()
+
+        def writer():
+            while not done.is_set():
+                history_store.flush()
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            for n in range(50):
+                self.append_cycles(history_store, 7, t0=7.0 * n)
+        finally:
+            done.set()
+            thread.join()
+        history_store.flush()
+
+        times, values = history_store.query('inverter', 'kw')
+        np.testing.assert_array_equal(times, np.arange(350.0))
+        self.assertEqual(history_store.pending_chunks, 0)
+
+    def test_block_serialization(self):
+        self.append_cycles(self.history, 10)
+        for block in self.history.flush():
+            copy = history.HistoryBlock.from_bytes(block.label, block.to_bytes())
+            np.testing.assert_array_equal(copy.decode()[1], block.decode()[1])
+
+    def test_database_sink(self):
+        db = SQLAlchemyGP.SQLAlchemyGP({'class_name': 'SQLAlchemyGP', 'url': 'sqlite://'})
+        history_store = history.HistoryStore(self.store, chunk_size=10, retention=5.0, sink=db)
+        self.append_cycles(history_store, 30)
+        history_store.flush()
+
+        times, values = history_store.query('inverter', 'kw', t_start=0.0, t_end=30.0)
+        np.testing.assert_array_equal(times, np.arange(30.0))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.DEBUG)
+    unittest.main()
@@ -5,7 +5,10 @@ import logging
 import unittest
 from configparser import ConfigParser
 
-from GridPi.lib.models import model_core, VirtualEnergyStorage, VirtualGridIntertie, VirtualFeeder
+import numpy as np
+
+from GridPi.lib.models import model_core, tag_store, virtual_system, VirtualEnergyStorage, VirtualGridIntertie, \
+    VirtualFeeder
 
 class TestModelModule(unittest.TestCase):
 
@@ -134,6 +137,367 @@ class TestModelModule(unittest.TestCase):
         self.assertEqual(resp[search_param1], 0.5)
         self.assertEqual(resp[search_param2], 0.6)
 
+class TestTagStore(unittest.TestCase):
+
+    def setUp(self):
+        self.ess = model_core.EnergyStorage()
+        self.ess.config['name'] = 'inverter'
+        self.grid = model_core.GridIntertie()
+        self.grid.config['name'] = 'grid'
+
+        self.AC = model_core.AssetContainer()
+        self.AC.add_asset(self.ess)
+        self.AC.add_asset(self.grid)
+
+    def test_views_preserve_python_types(self):
+        self.ess.status['soc'] = 0.5
+        self.ess.status['online'] = True
+        self.ess.control['state_cmd'] = 2
+        self.ess.control['kw_setpoint'] = None
+
+        self.assertIs(type(self.ess.status['soc']), float)
+        self.assertIs(self.ess.status['online'], True)
+        self.assertIs(type(self.ess.control['state_cmd']), int)
+        self.assertIsNone(self.ess.control['kw_setpoint'])
+        self.assertEqual(self.ess.config['class_type'], 'ess')
+
+    def test_assets_share_container_store(self):
+        store = self.AC.tag_store
+        self.assertIs(self.ess.tag_store, store)
+        self.assertIs(self.grid.tag_store, store)
+
+        slot = self.ess.status.slot('soc')
+        self.ess.status['soc'] = 0.75
+        self.assertEqual(store.values[slot], 0.75)
+        self.assertEqual(store.label(slot), ('inverter', 'status', 'soc'))
+
+    def test_values_survive_attach(self):
+        ess = model_core.EnergyStorage()
+        ess.status['soc'] = 0.3
+        ess.config['name'] = 'second'
+        self.AC.add_asset(ess)
+
+        self.assertEqual(ess.status['soc'], 0.3)
+        self.assertEqual(dict(ess.config)['name'], 'second')
+
+    def test_store_grows(self):
+        store = tag_store.TagStore(capacity=2)
+        slots = [store.allocate(self.ess, 'status', str(n), float(n)) for n in range(100)]
+
+        self.assertEqual(len(store), 100)
+        self.assertEqual([store.get(slot) for slot in slots], [float(n) for n in range(100)])
+
+    def test_snapshot_is_a_copy(self):
+        self.ess.status['soc'] = 0.5
+        values, kinds, objects = self.AC.tag_store.snapshot()
+        self.ess.status['soc'] = 0.9
+
+        self.assertEqual(values[self.ess.status.slot('soc')], 0.5)
+        self.assertEqual(len(values), len(self.AC.tag_store))
+
+
+class TestCycleBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.ess = model_core.EnergyStorage()
+        self.AC = model_core.AssetContainer()
+        self.AC.add_asset(self.ess)
+        self.buffer = tag_store.CycleBuffer(self.AC.tag_store)
+
+        self.soc = self.ess.status.slot('soc')
+        self.kw_setpoint = self.ess.control.slot('kw_setpoint')
+
+    def test_input_frame_is_immutable(self):
+        self.ess.status['soc'] = 0.5
+        frame = self.buffer.begin()
+        self.ess.status['soc'] = 0.1  # Late write to the live store
+
+        self.assertEqual(frame.get(self.soc), 0.5)
+        self.assertEqual(self.buffer.working.get(self.soc), 0.5)
+        with self.assertRaises(ValueError):
+            frame.values[self.soc] = 0.0
+
+    def test_commit_writes_back_changed_slots_only(self):
+        self.ess.status['soc'] = 0.5
+        self.buffer.begin()
+        self.buffer.working.set(self.kw_setpoint, 25.0)
+        self.ess.status['soc'] = 0.1  # Not touched by the cycle, must not be overwritten by commit
+        frame = self.buffer.commit()
+
+        self.assertEqual(self.ess.control['kw_setpoint'], 25.0)
+        self.assertEqual(self.ess.status['soc'], 0.1)
+        self.assertIs(self.buffer.committed, frame)
+        self.assertEqual(frame.read(self.ess.control)['kw_setpoint'], 25.0)
+        self.assertEqual(frame.cycle, 1)
+
+    def test_committed_frame_not_modified_by_next_cycle(self):
+        self.buffer.begin()
+        self.buffer.working.set(self.kw_setpoint, 10.0)
+        first = self.buffer.commit()
+
+        self.buffer.begin()
+        self.buffer.working.set(self.kw_setpoint, 20.0)
+        self.buffer.commit()
+
+        self.assertEqual(first.get(self.kw_setpoint), 10.0)
+
+    def test_commit_before_begin_raises(self):
+        with self.assertRaises(RuntimeError):
+            self.buffer.commit()
+
+
+class DelayedFeeder(model_core.Feeder):
+    """ Feeder archetype with a configurable communications delay """
+
+    def __init__(self, name, delay):
+        super(DelayedFeeder, self).__init__()
+        self._config['name'] = name
+        self.delay = delay
+        self.reads = 0
+
+    async def update_status(self):
+        await asyncio.sleep(self.delay)
+        self.reads += 1
+        self._status['kw'] = float(self.reads)
+        super(DelayedFeeder, self).update_status()
+
+    async def update_control(self):
+        await asyncio.sleep(self.delay)
+        super(DelayedFeeder, self).update_control()
+
+
+class TestVirtualDeviceRecords(unittest.TestCase):
+
+    def test_ves_record_updated_in_place(self):
+        device = VirtualEnergyStorage.VESDevice(virtual_system=None)
+        record = device.record
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertTrue(record.initialized)
+
+        device.record.update({'run_cmd': True, 'kw_setpoint': 50.0, 'state_cmd': 1})
+        device.device_update()  # Offline
+        device.device_update()  # Online P/Q, output follows the setpoint
+        record.looptime -= 36.0  # 50 kW for 0.01 h
+        device.device_update()
+        self.assertIs(device.record, record)
+        self.assertTrue(record.online)
+        self.assertEqual(record.kw, 50.0)
+        self.assertAlmostEqual(record.soc, 0.5 - 0.5 / 30.0, places=4)
+
+        status = {'kw': None, 'online': None, 'soc': None}
+        record.copy_to(status)
+        self.assertEqual(status['kw'], 50.0)
+
+        record.run_cmd = False
+        device.device_update()
+        self.assertEqual((record.online, record.kw), (False, 0.0))
+
+    def test_breaker_records(self):
+        for device in (VirtualGridIntertie.VGIDevice(virtual_system=None),
+                       VirtualFeeder.VFDevice(virtual_system=None)):
+            record = device.record
+            device.deviceUpdate()
+            self.assertTrue(record.breaker_open)
+
+            record.update({'open_breaker': False, 'close_breaker': True})
+            record.virtual_system = type('VirtualSystem', (), {'grid_kw': 3.0, 'feeder_kw': 3.0})()
+            device.deviceUpdate()
+            self.assertEqual((record.breaker_open, record.kw), (False, 3.0))
+
+    def test_record_fields_are_fixed(self):
+        record = VirtualEnergyStorage.VESRecord()
+        with self.assertRaises(AttributeError):
+            record.not_a_field = 1.0
+        self.assertEqual(record.as_dict()['kwh_capacity_rated'], 30.0)
+
+
+class TestPlantSimulator(unittest.TestCase):
+
+    def setUp(self):
+        self.sim = virtual_system.PlantSimulator()
+        self.grid = self.sim.grid.add()
+        self.sim.feeder.add(load_kw=30.0, close_breaker=True)
+        for n in range(3):
+            self.sim.ess.add(soc=0.5, kw_rated=10.0 * (n + 1))
+
+    def test_grid_supplies_net_load(self):
+        self.sim.grid.set('close_breaker', self.grid, True)
+        ess = self.sim.ess
+        ess['run_cmd'][:] = True
+        ess['kw_setpoint'][:] = 5.0
+        self.sim.step(36.0)
+
+        np.testing.assert_array_equal(ess['kw'], [5.0, 5.0, 5.0])
+        self.assertEqual(self.sim.grid.get('kw', self.grid), 15.0)
+        np.testing.assert_allclose(ess['soc'], 0.5 - 5.0 * 0.01 / 30.0)
+
+    def test_grid_forming_shares_load_by_rating(self):
+        ess = self.sim.ess
+        ess['run_cmd'][:] = True
+        ess['state_cmd'][:] = model_core.EnergyStorage.State.VF.value
+        self.sim.step(1.0)
+
+        self.assertTrue(self.sim.energized)
+        np.testing.assert_allclose(ess['kw'], [5.0, 10.0, 15.0])
+        self.assertEqual(self.sim.feeder.get('kw', 0), 30.0)
+
+    def test_blackout(self):
+        self.sim.step(1.0)
+        self.assertFalse(self.sim.energized)
+        self.assertEqual(self.sim.feeder.get('kw', 0), 0.0)
+
+    def test_breaker_trip(self):
+        self.sim.grid.set('close_breaker', self.grid, True)
+        self.sim.step(1.0)
+        self.assertFalse(self.sim.grid.get('breaker_open', self.grid))
+
+        self.sim.grid.set('breaker_trip', self.grid, True)
+        self.sim.step(1.0)
+        self.assertTrue(self.sim.grid.get('breaker_open', self.grid))
+        self.sim.grid.set('open_breaker', self.grid, True)
+        self.sim.step(1.0)
+        self.assertFalse(self.sim.grid.get('breaker_trip', self.grid))
+
+    def test_fleet_grows(self):
+        for n in range(100):
+            self.sim.ess.add(soc=n / 100.0)
+        self.assertEqual(len(self.sim.ess), 103)
+        self.assertEqual(self.sim.ess['soc'][-1], 0.99)
+
+    def test_virtual_assets(self):
+        vs = virtual_system.Virtual_System(None, model_core.AssetContainer())
+        asset_factory = model_core.AssetFactory()
+        parser = ConfigParser()
+        parser.read_dict({'GRID_INTERTIE': {'class_name': 'VirtualGridIntertie', 'name': 'grid'},
+                          'FEEDER': {'class_name': 'VirtualFeeder', 'name': 'feeder', 'load_kw': 12}})
+        grid = asset_factory.factory(parser['GRID_INTERTIE'], virtual_system=vs)
+        feeder = asset_factory.factory(parser['FEEDER'], virtual_system=vs)
+
+        loop = asyncio.new_event_loop()
+        for asset in (grid, feeder):
+            asset.control['enable'] = True
+            asset.control['run'] = True
+            loop.run_until_complete(asset.update_status())
+            loop.run_until_complete(asset.update_control())
+        vs.run(now=0.0)
+        vs.run(now=1.0)
+        for asset in (grid, feeder):
+            loop.run_until_complete(asset.update_status())
+        loop.close()
+
+        self.assertTrue(grid.status['online'])
+        self.assertEqual(feeder.status['kw'], 12.0)
+        self.assertEqual(grid.status['kw'], 12.0)
+
+
+class TestAssetRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.configs = {'feeder_1': (model_core.Feeder, {'site': 'plant'}),
+                        'feeder_2': (model_core.Feeder, {'site': 'plant'}),
+                        'ess_1': (model_core.EnergyStorage, {'site': 'plant', 'parent': 'feeder_1',
+                                                             'groups': 'storage, north'}),
+                        'ess_2': (model_core.EnergyStorage, {'site': 'plant', 'parent': 'feeder_2',
+                                                             'groups': 'storage'}),
+                        'grid': (model_core.GridIntertie, {'site': 'plant', 'groups': 'north'})}
+
+        self.AC = model_core.AssetContainer()
+        for name in self.configs:
+            self.AC.add_asset(self.make_asset(name))
+
+    def make_asset(self, name):
+        asset_class, config = self.configs[name]
+        asset = asset_class()
+        asset.read_config(dict(config, name=name))
+        return asset
+
+    def test_lookup_by_name_and_id(self):
+        ess = self.AC.get_asset_by_name('ess_2')
+        self.assertEqual(ess.config['name'], 'ess_2')
+        self.assertIs(self.AC.get_asset_by_id(self.AC.asset_id(ess)), ess)
+        self.assertIn('grid', self.AC)
+        self.assertEqual(len(self.AC), 5)
+
+    def test_lookup_by_type(self):
+        self.assertEqual([ess.config['name'] for ess in self.AC.get_asset('ess')], ['ess_1', 'ess_2'])
+
+    def test_groups(self):
+        self.assertEqual([asset.config['name'] for asset in self.AC.get_group('north')], ['ess_1', 'grid'])
+        self.assertEqual(len(self.AC.get_group('storage')), 2)
+        self.assertEqual(self.AC.get_group('missing'), [])
+
+    def test_hierarchy(self):
+        self.assertEqual(len(self.AC.get_site('plant')), 5)
+        self.assertEqual([asset.config['name'] for asset in self.AC.get_children('feeder_1')], ['ess_1'])
+        self.assertIs(self.AC.get_parent(self.AC.get_asset_by_name('ess_2')), self.AC.get_asset_by_name('feeder_2'))
+
+        tree = self.AC.hierarchy()
+        self.assertEqual(set(tree['plant']), {'feeder_1', 'feeder_2', 'grid'})
+        self.assertEqual(tree['plant']['grid'], [])
+
+    def test_duplicate_name_rejected(self):
+        duplicate = self.make_asset('ess_1')
+        with self.assertRaises(ValueError):
+            self.AC.add_asset(duplicate)
+        self.assertEqual(len(self.AC), 5)
+
+
+class TestAssetContainerTimeouts(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.fast = DelayedFeeder('fast', 0.0)
+        self.slow = DelayedFeeder('slow', 0.2)
+
+        self.AC = model_core.AssetContainer()
+        self.AC.add_asset(self.fast)
+        self.AC.add_asset(self.slow)
+
+    def tearDown(self):
+        self.loop.run_until_complete(asyncio.sleep(0.25))  # Let stragglers finish before closing the loop
+        self.loop.close()
+
+    def test_straggler_marked_stale(self):
+        failed = self.loop.run_until_complete(self.AC.update_status(timeout=0.02))
+
+        self.assertEqual(failed, [self.slow])
+        self.assertEqual(self.AC.stale_assets, [self.slow])
+        self.assertTrue(self.slow.status['stale'])
+        self.assertFalse(self.fast.status['stale'])
+        self.assertEqual(self.fast.status['kw'], 1.0)
+        self.assertEqual(self.slow.status['kw'], 0.0)  # Last good value retained
+        self.assertGreaterEqual(self.slow.stale_time(), 0.0)
+
+    def test_straggler_not_restarted_and_recovers(self):
+        self.loop.run_until_complete(self.AC.update_status(timeout=0.02))
+        self.loop.run_until_complete(self.AC.update_status(timeout=0.02))
+        self.assertEqual(self.fast.reads, 2)
+        self.assertEqual(self.slow.reads, 0)
+
+        failed = self.loop.run_until_complete(self.AC.update_status(timeout=0.3))
+        self.assertEqual(failed, [])
+        self.assertEqual(self.slow.reads, 1)  # The original read completed, no duplicate read was started
+        self.assertFalse(self.slow.stale)
+        self.assertEqual(self.slow.stale_time(), 0.0)
+
+    def test_asset_comm_timeout_overrides_default(self):
+        self.slow.config['comm_timeout'] = 0.3
+        failed = self.loop.run_until_complete(self.AC.update_status(timeout=0.02))
+
+        self.assertEqual(failed, [])
+
+    def test_no_timeout_uses_container_default(self):
+        self.AC.default_timeout = 0.02
+        failed = self.loop.run_until_complete(self.AC.update_status())
+
+        self.assertEqual(failed, [self.slow])
+
+    def test_control_timeout(self):
+        failed = self.loop.run_until_complete(self.AC.update_control(timeout=0.02))
+
+        self.assertEqual(failed, [self.slow])
+
+
 if __name__ == '__main__':
     logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.DEBUG)
     unittest.main()
\ No newline at end of file
@@ -2,9 +2,12 @@
 
 import asyncio
 import logging
+import threading
 import unittest
 from configparser import ConfigParser
 
+import numpy as np
+
 from GridPi.lib import gridpi_core
 from GridPi.lib.models import model_core
 from GridPi.lib.process import process_core, process_graph, process_plugins
@@ -126,6 +129,602 @@ class TestProcessModule(unittest.TestCase):
 
 
 
+class TestProcessPlan(unittest.TestCase):
+    def setUp(self):
+        self.AC = model_core.AssetContainer()
+        self.ess = model_core.EnergyStorage()
+        self.grid = model_core.GridIntertie()
+        self.AC.add_asset(self.ess)
+        self.AC.add_asset(self.grid)
+
+        self.ess.status['soc'] = 0.4
+        self.ess.config['target_soc'] = 0.6
+        self.grid.status['kw'] = 35.0
+        self.grid.config['kw_import_limit'] = 20.0
+        self.grid.config['kw_export_limit'] = 20.0
+
+        self.soc_ctrl = process_plugins.EssSocPowerController({})
+        self.dmd_ctrl = process_plugins.EssDemandLimitPowerController({})
+
+    def test_compiled_single_process(self):
+        container = process_core.ProcessContainer()
+        container.add_process(self.soc_ctrl)
+        container._ready = True
+
+        container.run_all(self.AC.get_asset)
+
+        self.assertTrue(container.compiled)
+        self.assertEqual(self.ess.control['kw_setpoint'], -50)
+
+        self.ess.status['soc'] = 0.8  # Bindings read the live asset parameters every cycle
+        container.run_all(self.AC.get_asset)
+        self.assertEqual(self.ess.control['kw_setpoint'], 50)
+
+    def test_compiled_aggregate_process(self):
+        container = process_core.ProcessContainer()
+        container.add_process(process_plugins.AggregateProcessSummation([self.soc_ctrl, self.dmd_ctrl]))
+        container._ready = True
+
+        container.run_all(self.AC.get_asset)
+
+        self.assertEqual(self.ess.control['kw_setpoint'], -50 + 15.0)
+
+    def test_add_process_invalidates_plan(self):
+        container = process_core.ProcessContainer()
+        container.add_process(self.soc_ctrl)
+        container._ready = True
+        container.compile(self.AC.get_asset)
+
+        container.add_process(self.dmd_ctrl)
+        self.assertFalse(container.compiled)
+
+    def test_unresolved_tag_is_skipped(self):
+        empty = model_core.AssetContainer()
+        self.soc_ctrl.compile(empty.get_asset)
+        self.soc_ctrl.run_compiled()  # do_work() TypeError on missing inputs is logged, not raised
+
+
+class ChainProcess(process_core.SingleProcess):
+    """ Copies one ess status parameter to another """
+
+    def __init__(self, name, src, dst):
+        super(ChainProcess, self).__init__()
+        self._name = name
+        self._src = self.tag('ess', 0, 'status', src)
+        self._dst = self.tag('ess', 0, 'status', dst)
+        self._input.update({self._src: None})
+        self._output.update({self._dst: None})
+
+    def do_work(self):
+        self._output[self._dst] = self._input[self._src]
+
+
+class TestProcessOrder(unittest.TestCase):
+
+    def assert_valid(self, order):
+        position = {process: n for n, process in enumerate(order.order)}
+        for process in order.order:
+            for tag in process.input.keys():
+                for producer in order.producers(tag):
+                    self.assertLess(position[producer], position[process])
+
+    def test_add_in_any_order(self):
+        a, b, c, d = (ChainProcess('a', 'p0', 'p1'), ChainProcess('b', 'p1', 'p2'),
+                      ChainProcess('c', 'p2', 'p3'), ChainProcess('d', 'p3', 'p4'))
+        order = process_graph.ProcessOrder()
+        for process in (d, b, c, a):
+            order.add(process)
+            self.assert_valid(order)
+        self.assertEqual(order.order, [a, b, c, d])
+
+    def test_cycle_rejected(self):
+        a, b, c = ChainProcess('a', 'p0', 'p1'), ChainProcess('b', 'p1', 'p2'), ChainProcess('c', 'p2', 'p0')
+        order = process_graph.ProcessOrder([a, b])
+
+        with self.assertRaises(process_graph.CycleError) as context:
+            order.add(c)
+        self.assertEqual(set(context.exception.cycle), {a, b, c})
+        self.assertEqual(order.order, [a, b])  # Unchanged
+        self.assertNotIn(c, order)
+
+    def test_remove(self):
+        a, b, c = ChainProcess('a', 'p0', 'p1'), ChainProcess('b', 'p1', 'p2'), ChainProcess('c', 'p2', 'p3')
+        order = process_graph.ProcessOrder([a, b, c])
+        order.remove(b)
+
+        self.assertEqual(order.order, [a, c])
+        self.assertEqual(order.producers(a.tag('ess', 0, 'status', 'p2')), set())
+
+
+class TestProcessHotAdd(unittest.TestCase):
+
+    def setUp(self):
+        self.AC = model_core.AssetContainer()
+        self.ess = model_core.EnergyStorage()
+        self.AC.add_asset(self.ess)
+        for param in ('p0', 'p1', 'p2', 'p3'):
+            self.ess.status[param] = 0.0
+
+        self.container = process_core.ProcessContainer()
+        self.first = ChainProcess('first', 'p0', 'p1')
+        self.third = ChainProcess('third', 'p2', 'p3')
+        self.container.add_process(self.first)
+        self.container.add_process(self.third)
+        self.container.sort()
+        self.container.run_all(self.AC.get_asset)
+
+    def test_old_plan_runs_until_commit(self):
+        old_plan = self.container._plan
+        self.container.add_process(ChainProcess('second', 'p1', 'p2'))
+
+        self.assertTrue(self.container.pending)
+        self.assertIs(self.container._plan, old_plan)
+
+        self.ess.status['p0'] = 5.0
+        self.container.run_all(self.AC.get_asset)  # Commits, then runs first -> second -> third in one cycle
+
+        self.assertFalse(self.container.pending)
+        self.assertEqual([x.name for x in self.container.process_list], ['first', 'second', 'third'])
+        self.assertEqual(self.ess.status['p3'], 5.0)
+
+    def test_cycle_leaves_container_unchanged(self):
+        self.container.add_process(ChainProcess('second', 'p1', 'p2'))
+        self.container.run_all(self.AC.get_asset)
+        plan = self.container._plan
+
+        with self.assertRaises(process_graph.CycleError):
+            self.container.add_process(ChainProcess('loop', 'p3', 'p0'))
+        self.assertNotIn('loop', self.container.process_dict)
+        self.assertFalse(self.container.pending)
+        self.assertIs(self.container._plan, plan)
+
+    def test_only_new_process_compiled(self):
+        first_plan = self.first._input_plan
+        self.container.add_process(ChainProcess('second', 'p1', 'p2'))
+        self.container.run_all(self.AC.get_asset)
+
+        self.assertIs(self.first._input_plan, first_plan)
+
+    def test_remove_process(self):
+        self.container.remove_process('third')
+        self.container.run_all(self.AC.get_asset)
+
+        self.assertEqual(self.container.process_list, [self.first])
+        self.assertNotIn('third', self.container.process_dict)
+
+class TestGraphDependencies(unittest.TestCase):
+
+    def sort(self, processes):
+        container = process_core.ProcessContainer()
+        for process in processes:
+            container.add_process(process)
+        container.sort()
+        return container
+
+    def test_long_chain_sorts_iteratively(self):
+        chain = [ChainProcess('p{}'.format(n), 'p{}'.format(n), 'p{}'.format(n + 1)) for n in range(2000)]
+        container = self.sort(chain[::-1])  # Deeper than the recursion limit
+
+        self.assertEqual(container.process_list, chain)
+
+    def test_independent_processes_kept(self):
+        a, b = ChainProcess('a', 'p0', 'p1'), ChainProcess('b', 'q0', 'q1')
+        container = self.sort([a, b])
+
+        self.assertEqual(set(container.process_list), {a, b})
+
+    def test_cycle_reported(self):
+        a, b, c = ChainProcess('a', 'p0', 'p1'), ChainProcess('b', 'p1', 'p2'), ChainProcess('c', 'p2', 'p0')
+        with self.assertRaises(process_graph.CycleError) as context:
+            self.sort([a, b, c])
+        self.assertEqual(set(context.exception.cycle), {a, b, c})
+
+    def test_duplicate_sources_aggregated(self):
+        a, b = ChainProcess('a', 'p0', 'p2'), ChainProcess('b', 'p1', 'p2')
+        c, d = ChainProcess('c', 'p2', 'p3'), ChainProcess('d', 'p2', 'p4')
+        container = self.sort([c, d, a, b])
+
+        aggregate = container.process_list[0]
+        self.assertIsInstance(aggregate, process_core.AggregateProcess)
+        self.assertEqual(set(aggregate._process_list), {a, b})
+        self.assertEqual(set(container.process_list[1:]), {c, d})  # Every consumer follows the aggregate
+
+    def test_edge_list(self):
+        a, b, c = ChainProcess('a', 'p0', 'p1'), ChainProcess('b', 'p1', 'p2'), ChainProcess('c', 'p1', 'p3')
+        GD = process_graph.GraphDependencies()
+        GD.find_input_sinks([a, b, c])
+        GD.find_output_sources([a, b, c])
+        GD.resolve_duplicate_sources(dict())
+
+        self.assertCountEqual(GD.edge_list(), [(a, b), (a, c)])
+
+
+class BarrierProcess(ChainProcess):
+    """ Only completes if every process sharing the barrier does its work at the same time """
+
+    def __init__(self, name, src, dst, barrier):
+        super(BarrierProcess, self).__init__(name, src, dst)
+        self._barrier = barrier
+
+    def do_work(self):
+        self._barrier.wait()
+        super(BarrierProcess, self).do_work()
+
+
+class TestLevelParallel(unittest.TestCase):
+
+    def setUp(self):
+        self.AC = model_core.AssetContainer()
+        self.ess = model_core.EnergyStorage()
+        self.AC.add_asset(self.ess)
+        for param in ('a0', 'a1', 'b0', 'b1', 'c0', 'c1', 'sum'):
+            self.ess.status[param] = 0.0
+
+        self.container = process_core.ProcessContainer()
+        self.container.configure_execution('level_parallel', max_workers=3)
+        self.addCleanup(self.container.shutdown)
+
+    def test_levels(self):
+        a, b = ChainProcess('a', 'a0', 'a1'), ChainProcess('b', 'b0', 'b1')
+        c, d = ChainProcess('c', 'a1', 'c0'), ChainProcess('d', 'c0', 'c1')
+        levels = process_graph.dependency_levels([a, b, c, d])
+
+        self.assertEqual(levels, [[a, b], [c], [d]])
+
+    def test_independent_processes_run_concurrently(self):
+        barrier = threading.Barrier(3, timeout=5.0)
+        for name in ('a', 'b', 'c'):
+            self.container.add_process(BarrierProcess(name, name + '0', name + '1', barrier))
+        self.container.sort()
+
+        self.ess.status['a0'], self.ess.status['b0'], self.ess.status['c0'] = 1.0, 2.0, 3.0
+        self.container.run_all(self.AC.get_asset)  # A serial run would break the barrier
+
+        self.assertEqual(len(self.container.levels), 1)
+        self.assertEqual([self.ess.status[x] for x in ('a1', 'b1', 'c1')], [1.0, 2.0, 3.0])
+
+    def test_dependent_levels_see_previous_outputs(self):
+        for process in (ChainProcess('a', 'a0', 'a1'), ChainProcess('b', 'a1', 'b1'), ChainProcess('c', 'b1', 'c1'),
+                        ChainProcess('d', 'a0', 'b0')):
+            self.container.add_process(process)
+        self.container.sort()
+
+        self.ess.status['a0'] = 7.0
+        self.container.run_all(self.AC.get_asset)
+
+        self.assertEqual(len(self.container.levels), 3)
+        self.assertEqual(self.ess.status['c1'], 7.0)
+        self.assertEqual(self.ess.status['b0'], 7.0)
+
+    def test_serial_and_parallel_results_match(self):
+        processes = [ChainProcess('a', 'a0', 'a1'), ChainProcess('b', 'a1', 'b1'), ChainProcess('c', 'b0', 'c0')]
+        for process in processes:
+            self.container.add_process(process)
+        self.container.sort()
+        self.ess.status['a0'], self.ess.status['b0'] = 3.0, 4.0
+        self.container.run_all(self.AC.get_asset)
+        parallel = self.AC.tag_store.snapshot()[0].copy()
+
+        self.container.configure_execution('serial')
+        for param in ('a1', 'b1', 'c0'):
+            self.ess.status[param] = 0.0
+        self.container.run_all(self.AC.get_asset)
+
+        np.testing.assert_array_equal(self.AC.tag_store.snapshot()[0], parallel)
+
+
+class CountingProcess(ChainProcess):
+
+    def __init__(self, name, src, dst):
+        super(CountingProcess, self).__init__(name, src, dst)
+        self.count = 0
+
+    def do_work(self):
+        self.count += 1
+        super(CountingProcess, self).do_work()
+
+
+class TestChangeTracking(unittest.TestCase):
+
+    def setUp(self):
+        self.AC = model_core.AssetContainer()
+        self.ess = model_core.EnergyStorage()
+        self.AC.add_asset(self.ess)
+        for param in ('a0', 'a1', 'a2', 'b0', 'b1'):
+            self.ess.status[param] = 0.0
+
+        self.a1 = CountingProcess('a1', 'a0', 'a1')
+        self.a2 = CountingProcess('a2', 'a1', 'a2')
+        self.b1 = CountingProcess('b1', 'b0', 'b1')
+        self.container = process_core.ProcessContainer()
+        for process in (self.a1, self.a2, self.b1):
+            self.container.add_process(process)
+        self.container.sort()
+        self.container.configure_change_tracking(True)
+
+    def run_cycles(self, n=1):
+        for x in range(n):
+            self.container.run_all(self.AC.get_asset)
+
+    def counts(self):
+        return [self.a1.count, self.a2.count, self.b1.count]
+
+    def test_first_run_executes_everything(self):
+        self.run_cycles()
+        self.assertEqual(self.counts(), [1, 1, 1])
+
+    def test_unchanged_processes_skipped(self):
+        self.run_cycles(5)
+
+        self.assertEqual(self.counts(), [1, 1, 1])
+        self.assertEqual(self.container.run_stats.executed, 3)
+        self.assertEqual(self.container.run_stats.skipped, 12)
+
+    def test_change_propagates_downstream(self):
+        self.run_cycles()
+        self.ess.status['a0'] = 2.0
+        self.run_cycles()
+
+        self.assertEqual(self.counts(), [2, 2, 1])
+        self.assertEqual(self.ess.status['a2'], 2.0)
+
+    def test_unchanged_output_stops_propagation(self):
+        self.run_cycles()
+        self.ess.status['a0'] = 0.0  # Written, but not changed
+        self.ess.status['b0'] = 1.0
+        self.run_cycles()
+
+        self.assertEqual(self.counts(), [1, 1, 2])
+
+    def test_external_write_to_output_reruns_producer(self):
+        self.ess.status['a0'] = 3.0
+        self.run_cycles()
+        self.ess.status['a1'] = 9.0  # Overwritten outside the process
+        self.run_cycles()
+
+        self.assertEqual(self.ess.status['a1'], 3.0)
+        self.assertEqual(self.ess.status['a2'], 3.0)
+
+    def test_full_refresh_interval(self):
+        self.container.configure_change_tracking(True, refresh_interval=3)
+        self.run_cycles(6)
+
+        self.assertEqual(self.counts(), [2, 2, 2])
+        self.assertEqual(self.container.run_stats.full_refreshes, 2)
+
+    def test_always_run(self):
+        self.b1.always_run = True
+        self.container.invalidate_plan()
+        self.run_cycles(3)
+
+        self.assertEqual(self.counts(), [1, 1, 3])
+
+    def test_level_parallel(self):
+        self.container.configure_execution('level_parallel', max_workers=2)
+        self.addCleanup(self.container.shutdown)
+        self.run_cycles(2)
+        self.ess.status['a0'] = 4.0
+        self.run_cycles()
+
+        self.assertEqual(self.counts(), [2, 2, 1])
+        self.assertEqual(self.ess.status['a2'], 4.0)
+
+
+class ConstProcess(process_core.SingleProcess):
+    """ Writes fixed values to ess control parameters """
+
+    def __init__(self, name, **outputs):
+        super(ConstProcess, self).__init__()
+        self._name = name
+        self._values = {self.tag('ess', 0, 'control', param): val for param, val in outputs.items()}
+        self._output.update({tag: None for tag in self._values})
+
+    def do_work(self):
+        self._output.update(self._values)
+
+
+class TestAggregateModes(unittest.TestCase):
+
+    def setUp(self):
+        self.a = ConstProcess('a', kw_setpoint=10.0, kvar_setpoint=1.0)
+        self.b = ConstProcess('b', kw_setpoint=-4.0)
+        self.c = ConstProcess('c', kw_setpoint=6.0, kvar_setpoint=None)
+        self.kw = self.a.tag('ess', 0, 'control', 'kw_setpoint')
+        self.kvar = self.a.tag('ess', 0, 'control', 'kvar_setpoint')
+
+    def aggregate(self, mode, **kwargs):
+        aggregate = process_core.AggregateProcess([self.a, self.b, self.c], mode=mode, **kwargs)
+        for process in (self.a, self.b, self.c):
+            process.do_work()
+        aggregate.do_work()
+        return aggregate.output
+
+    def test_sum(self):
+        output = self.aggregate('sum')
+        self.assertEqual(output[self.kw], 12.0)
+        self.assertEqual(output[self.kvar], 1.0)  # None outputs are ignored
+
+    def test_min_max(self):
+        self.assertEqual(self.aggregate('min')[self.kw], -4.0)
+        self.assertEqual(self.aggregate('max')[self.kw], 10.0)
+
+    def test_weighted(self):
+        output = self.aggregate(process_core.AggregateMode.WEIGHTED, weights=[0.5, 1.0, 2.0])
+        self.assertEqual(output[self.kw], 5.0 - 4.0 + 12.0)
+
+    def test_priority(self):
+        output = self.aggregate('priority', priorities=[1, 0, 5])
+        self.assertEqual(output[self.kw], 6.0)
+        self.assertEqual(output[self.kvar], 1.0)  # c has no kvar output, the next priority wins
+
+    def test_mode_from_processes(self):
+        self.a.aggregate_mode = self.b.aggregate_mode = self.c.aggregate_mode = 'max'
+        aggregate = process_core.AggregateProcess([self.a, self.b, self.c])
+        self.assertIs(aggregate.mode, process_core.AggregateMode.MAX)
+
+    def test_nothing_produced(self):
+        self.a._values[self.kvar] = None
+        output = self.aggregate('sum')
+        self.assertIsNone(output[self.kvar])
+
+    def test_output_types_kept(self):
+        run = self.a.tag('ess', 0, 'control', 'run')
+        state_cmd = self.a.tag('ess', 0, 'control', 'state_cmd')
+        self.a._values.update({run: False, state_cmd: 2})
+        self.b._values.update({run: True, state_cmd: 1})
+        self.c._values.update({run: False})
+        for process in (self.a, self.b, self.c):
+            process._output.update({tag: None for tag in process._values})
+
+        output = self.aggregate('sum')
+        self.assertIs(output[run], True)
+        self.assertEqual((output[state_cmd], type(output[state_cmd])), (3, int))
+        self.assertIs(self.aggregate('min')[run], False)
+        self.assertIs(type(self.aggregate('priority', priorities=[1, 0, 5])[state_cmd]), int)
+
+    def test_legacy_run(self):
+        AC = model_core.AssetContainer()
+        ess = model_core.EnergyStorage()
+        AC.add_asset(ess)
+        ess.control['kvar_setpoint'] = 0.0
+
+        process_core.AggregateProcess([self.a, self.b, self.c], mode='sum').run(AC.get_asset)
+
+        self.assertEqual(ess.control['kw_setpoint'], 12.0)
+        self.assertEqual(ess.control['kvar_setpoint'], 1.0)
+
+    def test_compiled_write(self):
+        AC = model_core.AssetContainer()
+        ess = model_core.EnergyStorage()
+        AC.add_asset(ess)
+        ess.control['kvar_setpoint'] = 3.0
+
+        aggregate = process_core.AggregateProcess([self.b, self.c], mode='sum')
+        aggregate.compile(AC.get_asset)
+        aggregate.run_compiled()
+
+        self.assertEqual(ess.control['kw_setpoint'], 2.0)
+        self.assertEqual(ess.control['kvar_setpoint'], 3.0)  # Not produced, left untouched
+
+
+class TestFleetControllers(unittest.TestCase):
+
+    def setUp(self):
+        self.AC = model_core.AssetContainer()
+        self.ess = list()
+        for n, (soc, rated) in enumerate(((0.2, 100.0), (0.5, 100.0), (0.8, 30.0), (0.9, 0.0))):
+            ess = model_core.EnergyStorage()
+            ess.config['name'] = 'ess_{}'.format(n)
+            ess.config['target_soc'] = 0.5
+            ess.config['cap_kw_pos_rated'] = rated
+            ess.config['cap_kw_neg_rated'] = rated
+            ess.status['soc'] = soc
+            self.AC.add_asset(ess)
+            self.ess.append(ess)
+        self.grid = model_core.GridIntertie()
+        self.grid.config['kw_import_limit'] = 100.0
+        self.grid.config['kw_export_limit'] = 50.0
+        self.AC.add_asset(self.grid)
+
+    def setpoints(self):
+        return [ess.control['kw_setpoint'] for ess in self.ess]
+
+    def test_bind_assets(self):
+        controller = process_plugins.EssFleetSocPowerController({})
+        controller.bind_assets(self.AC.get_asset)
+        self.assertEqual(controller.units, {'ess': 4})
+        self.assertIn(controller.tag('ess', 3, 'control', 'kw_setpoint'), controller.output)
+
+    def test_missing_asset_type(self):
+        controller = process_plugins.EssFleetSocPowerController({})
+        controller.run(model_core.AssetContainer().get_asset)
+        self.assertEqual(controller.units, {'ess': 0})
+
+    def test_soc_controller(self):
+        controller = process_plugins.EssFleetSocPowerController({'kw_step': 40})
+        controller.run(self.AC.get_asset)
+        self.assertEqual(self.setpoints(), [-40.0, 0.0, 30.0, 40.0])  # ess_2 clipped, ess_3 unlimited
+
+    def test_matches_single_unit_controller(self):
+        self.ess[0].status['soc'] = 0.9
+        single = process_plugins.EssSocPowerController({})
+        single.compile(self.AC.get_asset)
+        single.run_compiled()
+        expected = self.ess[0].control['kw_setpoint']
+
+        fleet = process_plugins.EssFleetSocPowerController({})
+        fleet.run(self.AC.get_asset)
+        self.assertEqual(self.ess[0].control['kw_setpoint'], expected)
+
+    def test_demand_limit_discharge_balances_soc(self):
+        self.grid.status['kw'] = 160.0  # 60 kW over the import limit
+        controller = process_plugins.EssFleetDemandLimitPowerController({})
+        controller.run(self.AC.get_asset)
+
+        kw = self.setpoints()
+        self.assertAlmostEqual(sum(kw), 60.0)
+        self.assertGreater(kw[1], kw[0])  # Fuller unit of the same rating discharges more
+        self.assertLessEqual(kw[2], 30.0)
+
+    def test_demand_limit_charge(self):
+        self.grid.status['kw'] = -90.0  # 40 kW over the export limit
+        controller = process_plugins.EssFleetDemandLimitPowerController({})
+        controller.run(self.AC.get_asset)
+
+        kw = self.setpoints()
+        self.assertAlmostEqual(sum(kw), -40.0)
+        self.assertLess(kw[0], kw[1])  # Emptier unit charges more
+
+    def test_demand_limit_within_limits(self):
+        self.grid.status['kw'] = 50.0
+        controller = process_plugins.EssFleetDemandLimitPowerController({})
+        controller.run(self.AC.get_asset)
+        self.assertEqual(self.setpoints(), [0.0] * 4)
+
+    def test_distribute_redistributes_saturated_units(self):
+        kw = process_plugins.distribute(100.0, np.array([1.0, 1.0, 2.0]), np.array([10.0, 0.0, 20.0]),
+                                        np.zeros(3))
+        np.testing.assert_allclose(kw, [10.0, 70.0, 20.0])
+
+    def test_system_aggregates_fleet_outputs(self):
+        system = gridpi_core.System()
+        for asset in self.ess:
+            system.add_asset(asset)
+        system.add_process(process_plugins.EssFleetSocPowerController({}))
+        system.add_process(ConstProcess('const', kw_setpoint=5.0))
+        system.process_container.sort()
+        system.run_processes()
+        self.assertEqual(self.ess[0].control['kw_setpoint'], -50.0 + 5.0)
+        self.assertEqual(self.ess[3].control['kw_setpoint'], 50.0)
+
+
+    def test_asset_added_after_first_run(self):
+        system = gridpi_core.System()
+        system.add_asset(self.ess[0])
+        controller = process_plugins.EssFleetSocPowerController({})
+        system.add_process(controller)
+        system.process_container.sort()
+        system.run_processes()
+        self.assertEqual(controller.units, {'ess': 1})
+
+        system.add_asset(self.ess[3])
+        system.run_processes()
+        self.assertEqual(controller.units, {'ess': 2})
+        self.assertIn(controller.tag('ess', 1, 'control', 'kw_setpoint'), controller.output)
+        self.assertEqual([self.ess[0].control['kw_setpoint'], self.ess[3].control['kw_setpoint']], [-50.0, 50.0])
+
+    def test_rebind_without_assets_at_bind(self):
+        AC = model_core.AssetContainer()
+        controller = process_plugins.EssFleetSocPowerController({})
+        controller.run(AC.get_asset)
+        self.assertEqual(controller.units, {'ess': 0})
+
+        AC.add_asset(self.ess[3])
+        controller.run(AC.get_asset)
+        self.assertEqual(controller.units, {'ess': 1})
+        self.assertEqual(self.ess[3].control['kw_setpoint'], 50.0)
+
+
 class TestGraphProcess(unittest.TestCase):
     def setUp(self):
         self.test_system = gridpi_core.System()  # Create System container object
@@ -2,6 +2,8 @@ import logging
 import unittest
 from configparser import ConfigParser
 
+from sqlalchemy import event, text
+
 from GridPi.lib import gridpi_core
 from GridPi.lib.models import model_core
 from GridPi.lib.persistence import SQLAlchemyGP
@@ -44,4 +46,95 @@ class TestStorageClass(unittest.TestCase):
             self.db.add_asset_params(asset.config['name'], 0, *list(asset.status.keys()))
             self.db.add_asset_params(asset.config['name'], 1, *list(asset.ctrl.keys()))
 
-        self.db.session.commit()
\ No newline at end of file
+        self.db.session.commit()
+
+class TestBatchedWrite(unittest.TestCase):
+
+    def setUp(self):
+        self.db = SQLAlchemyGP.SQLAlchemyGP({'class_name': 'SQLAlchemyGP', 'url': 'sqlite://'})
+        for asset_name in ('ess', 'grid'):
+            self.db.add_asset(asset_name)
+            self.db.add_asset_params(asset_name, 0, ['kw', 'soc'])
+        self.db.load_param_ids()
+
+        self.statements = []
+        event.listen(self.db.engine, 'before_cursor_execute', self.log_statement)
+
+    def log_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append((statement, executemany))
+
+    def read_back(self):
+        return self.db.read_param(payload={'ess': {'kw': None, 'soc': None}, 'grid': {'kw': None, 'soc': None}})
+
+    def test_write_single_executemany(self):
+        written = self.db.write_param(payload={'ess': {'kw': 10.0, 'soc': 0.5}, 'grid': {'kw': -5.0, 'soc': 0.0}})
+
+        self.assertEqual(written, 4)
+        updates = [stmt for stmt in self.statements if stmt[0].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertTrue(updates[0][1])
+
+        self.assertEqual(float(self.read_back()['ess']['kw']), 10.0)
+
+    def test_only_changed_values_written(self):
+        payload = {'ess': {'kw': 10.0, 'soc': 0.5}, 'grid': {'kw': -5.0, 'soc': 0.0}}
+        self.db.write_param(payload=payload)
+        self.statements.clear()
+
+        self.assertEqual(self.db.write_param(payload=payload), 0)
+        self.assertEqual(self.statements, [])
+
+        payload['ess']['kw'] = 12.0
+        self.assertEqual(self.db.write_param(payload=payload), 1)
+        self.assertEqual(float(self.read_back()['ess']['kw']), 12.0)
+
+    def test_unknown_params_ignored(self):
+        written = self.db.write_param(payload={'ess': {'not_a_param': 1.0}, 'feeder': {'kw': 1.0}})
+
+        self.assertEqual(written, 0)
+
+
+class TestParamChanges(unittest.TestCase):
+
+    def setUp(self):
+        self.db = SQLAlchemyGP.SQLAlchemyGP({'class_name': 'SQLAlchemyGP', 'url': 'sqlite://'})
+        self.db.add_asset('ess')
+        self.db.add_asset_params('ess', 0, ['kw'])
+        self.db.add_asset_params('ess', 1, ['kw_setpoint', 'enable_request'])
+        self.db.load_param_ids()
+        self.payload = {'ess': {'kw_setpoint': None, 'enable_request': None}}
+
+    def hmi_write(self, param_name, value):
+        """ Update a parameter the way the HMI does, with a plain UPDATE by param_id """
+        with self.db.engine.begin() as connection:
+            connection.execute(text('UPDATE parameter_identity_table SET param_value=(:value) WHERE param_id=(:pid)'),
+                               {'value': value, 'pid': self.db._param_ids[('ess', param_name)]})
+
+    def test_first_call_marks_start(self):
+        self.hmi_write('kw_setpoint', 5.0)
+        self.assertEqual(self.db.read_param_changes(payload=self.payload), {})
+        self.assertEqual(self.db.read_param_changes(payload=self.payload), {})
+
+    def test_only_changed_params_returned(self):
+        self.db.read_param_changes(payload=self.payload)
+        self.hmi_write('kw_setpoint', 5.0)
+        self.hmi_write('kw_setpoint', 7.0)
+
+        self.assertEqual(self.db.read_param_changes(payload=self.payload), {'ess': {'kw_setpoint': 7.0}})
+        self.assertEqual(self.db.read_param_changes(payload=self.payload), {})
+
+    def test_controller_writes_not_logged(self):
+        self.db.read_param_changes(payload=self.payload)
+        self.db.write_param(payload={'ess': {'kw': 10.0}})  # param_access = 0
+        self.hmi_write('enable_request', 0)  # Unchanged value
+
+        self.assertEqual(self.db.read_param_changes(payload=self.payload), {})
+
+    def test_consumed_changes_deleted(self):
+        self.db.read_param_changes(payload=self.payload)
+        self.hmi_write('kw_setpoint', 5.0)
+        self.db.read_param_changes(payload=self.payload)
+
+        with self.db.engine.connect() as connection:
+            count = connection.execute(text('SELECT COUNT(*) FROM param_change_table')).scalar()
+        self.assertEqual(count, 0)
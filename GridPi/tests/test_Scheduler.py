@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+import asyncio
+import logging
+import unittest
+
+from GridPi.lib import scheduler
+
+
+class FakeClock(object):
+    """ Monotonic clock stand-in, advanced by sleep() and by the test body """
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, delay):
+        self.now += delay
+
+
+class TestCycleScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def make_scheduler(self, policy, **kwargs):
+        return scheduler.CycleScheduler(period=0.1, policy=policy, clock=self.clock, sleep=self.clock.sleep, **kwargs)
+
+    def run_cycle(self, sched, work_time):
+        self.loop.run_until_complete(sched.wait())
+        release = self.clock.now
+        self.clock.now += work_time
+        sched.complete()
+        return release
+
+    def test_fixed_rate_does_not_drift(self):
+        sched = self.make_scheduler(scheduler.SkipPolicy.DROP)
+        releases = [self.run_cycle(sched, 0.03) for x in range(10)]
+
+        for n, release in enumerate(releases):
+            self.assertAlmostEqual(release, releases[0] + n * 0.1)
+        self.assertEqual(sched.stats.cycles, 10)
+        self.assertEqual(sched.stats.overruns, 0)
+        self.assertAlmostEqual(sched.stats.duration_mean, 0.03)
+
+    def test_drop_policy_skips_missed_deadlines(self):
+        sched = self.make_scheduler('drop')
+        start = self.run_cycle(sched, 0.25)  # Misses the deadlines at +0.1 and +0.2
+        release = self.run_cycle(sched, 0.01)
+
+        self.assertAlmostEqual(release, start + 0.3)
+        self.assertEqual(sched.stats.overruns, 1)
+        self.assertEqual(sched.stats.skipped, 2)
+        self.assertAlmostEqual(sched.stats.overrun_max, 0.15)
+
+    def test_catch_up_policy_replays_missed_cycles(self):
+        sched = self.make_scheduler(scheduler.SkipPolicy.CATCH_UP)
+        start = self.run_cycle(sched, 0.25)
+        releases = [self.run_cycle(sched, 0.01) for x in range(3)]
+
+        self.assertAlmostEqual(releases[0], start + 0.25)  # Released late, immediately
+        self.assertAlmostEqual(releases[1], start + 0.26)
+        self.assertAlmostEqual(releases[2], start + 0.3)  # Back on the original grid
+        self.assertEqual(sched.stats.skipped, 0)
+        self.assertAlmostEqual(sched.stats.jitter_max, 0.15)
+
+    def test_catch_up_policy_is_bounded(self):
+        sched = self.make_scheduler(scheduler.SkipPolicy.CATCH_UP, max_catch_up=2)
+        self.run_cycle(sched, 0.55)  # 5 deadlines missed
+
+        self.assertEqual(sched.stats.skipped, 3)
+
+    def test_degrade_policy_stretches_and_recovers_period(self):
+        sched = self.make_scheduler(scheduler.SkipPolicy.DEGRADE, recover_cycles=2)
+        self.run_cycle(sched, 0.15)
+        self.assertAlmostEqual(sched.period, 0.2)
+
+        for x in range(2):
+            self.run_cycle(sched, 0.01)
+        self.assertAlmostEqual(sched.period, 0.1)
+
+    def test_complete_before_wait_raises(self):
+        sched = self.make_scheduler(scheduler.SkipPolicy.DROP)
+        with self.assertRaises(RuntimeError):
+            sched.complete()
+
+    def test_invalid_policy_raises(self):
+        with self.assertRaises(ValueError):
+            self.make_scheduler('sometimes')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+from GridPi.lib.models import model_core, tag_store
+from GridPi.lib.persistence import writer, SQLAlchemyGP
+
+
+class FakeDatabase(object):
+    """ Database stand-in recording writes. write_param() blocks until released. """
+
+    def __init__(self):
+        self.writes = list()
+        self.release = threading.Event()
+        self.release.set()
+        self.remote_control = {'inverter': {'enable_request': True}}
+
+    def write_param(self, payload):
+        self.release.wait()
+        self.writes.append(payload)
+
+    def read_param(self, payload):
+        for asset_name, params in self.remote_control.items():
+            payload[asset_name].update(params)
+        return payload
+
+
+class TestPersistenceWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.ess = model_core.EnergyStorage()
+        self.ess.config['name'] = 'inverter'
+        self.ess.config['class_type'] = 'inverter'
+        self.AC = model_core.AssetContainer()
+        self.AC.add_asset(self.ess)
+        self.db = FakeDatabase()
+
+    def make_writer(self, **kwargs):
+        return writer.PersistenceWriter(self.db, self.AC.asset_list, **kwargs)
+
+    def frame(self, kw):
+        self.ess.status['kw'] = kw
+        return tag_store.Frame(self.AC.tag_store)
+
+    def test_coalesce_keeps_newest_frame(self):
+        persistence_writer = self.make_writer(read_interval=None)
+        for kw in range(5):
+            persistence_writer.submit(self.frame(float(kw)))
+
+        persistence_writer.start()
+        persistence_writer.stop(timeout=2.0)
+
+        self.assertEqual(len(self.db.writes), 1)
+        self.assertEqual(self.db.writes[0]['inverter']['kw'], 4.0)
+        self.assertEqual(persistence_writer.stats.coalesced, 4)
+        self.assertEqual(persistence_writer.stats.written, 1)
+
+    def test_drop_oldest(self):
+        persistence_writer = self.make_writer(max_queue=2, coalesce=False, read_interval=None)
+        for kw in range(4):
+            self.assertTrue(persistence_writer.submit(self.frame(float(kw))))
+
+        persistence_writer.start()
+        persistence_writer.stop(timeout=2.0)
+
+        self.assertEqual([write['inverter']['kw'] for write in self.db.writes], [2.0, 3.0])
+        self.assertEqual(persistence_writer.stats.dropped, 2)
+        self.assertEqual(persistence_writer.stats.queue_depth_max, 2)
+
+    def test_drop_newest(self):
+        persistence_writer = self.make_writer(max_queue=2, coalesce=False, drop_policy='drop_newest',
+                                              read_interval=None)
+        accepted = [persistence_writer.submit(self.frame(float(kw))) for kw in range(4)]
+
+        persistence_writer.start()
+        persistence_writer.stop(timeout=2.0)
+
+        self.assertEqual(accepted, [True, True, False, False])
+        self.assertEqual([write['inverter']['kw'] for write in self.db.writes], [0.0, 1.0])
+
+    def test_submit_does_not_block_on_slow_database(self):
+        self.db.release.clear()
+        persistence_writer = self.make_writer(max_queue=1, coalesce=False, read_interval=None)
+        persistence_writer.start()
+
+        for kw in range(10):
+            persistence_writer.submit(self.frame(float(kw)))  # Would hang here if submit() waited for the database
+
+        self.db.release.set()
+        persistence_writer.stop(timeout=2.0)
+        self.assertGreater(persistence_writer.stats.dropped, 0)
+        self.assertEqual(persistence_writer.stats.submitted, 10)
+
+    def test_remote_control_handoff(self):
+        persistence_writer = self.make_writer(read_interval=0.01)
+        persistence_writer.start()
+        persistence_writer.stop(timeout=2.0)
+
+        payload = persistence_writer.take_remote_control()
+        self.assertEqual(payload['inverter'],
+                         {'run_request': False, 'enable_request': True, 'clear_faults_request': False})
+        self.assertIsNone(persistence_writer.take_remote_control())
+
+    def test_write_error_is_counted(self):
+        self.db.write_param = None  # Not callable
+        persistence_writer = self.make_writer(read_interval=None)
+        persistence_writer.submit(self.frame(1.0))
+        persistence_writer.start()
+        persistence_writer.stop(timeout=2.0)
+
+        self.assertEqual(persistence_writer.stats.errors, 1)
+        self.assertEqual(persistence_writer.stats.written, 0)
+
+    def test_sqlalchemy_database(self):
+        handle, path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+
+        db = SQLAlchemyGP.SQLAlchemyGP({'class_name': 'SQLAlchemyGP', 'url': 'sqlite:///' + path})
+        db.add_asset('inverter')
+        db.add_asset_params('inverter', 0, list(self.ess.status.keys()))
+        db.load_param_ids()
+
+        persistence_writer = writer.PersistenceWriter(db, self.AC.asset_list, read_interval=None)
+        persistence_writer.submit(self.frame(42.0))
+        persistence_writer.start()
+        persistence_writer.stop(timeout=5.0)
+
+        self.assertEqual(persistence_writer.stats.written, 1)
+        payload = db.read_param(payload={'inverter': {}})
+        self.assertEqual(float(payload['inverter']['kw']), 42.0)
+
+    def test_remote_control_changes_only(self):
+        handle, path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+
+        db = SQLAlchemyGP.SQLAlchemyGP({'class_name': 'SQLAlchemyGP', 'url': 'sqlite:///' + path})
+        db.add_asset('inverter')
+        db.add_asset_params('inverter', 1, list(self.ess.remote_control.keys()))
+        db.load_param_ids()
+
+        persistence_writer = writer.PersistenceWriter(db, self.AC.asset_list, read_interval=0.01)
+        persistence_writer.start()
+        self.addCleanup(persistence_writer.stop, 5.0)
+
+        initial = self.wait_remote_control(persistence_writer)
+        self.assertEqual(set(initial['inverter']), set(self.ess.remote_control.keys()))  # Full read at start up
+
+        hmi = sqlite3.connect(path)  # Written the way the HMI does
+        hmi.execute('UPDATE parameter_identity_table SET param_value=(?) WHERE param_id=(?)',
+                    (1, db._param_ids[('inverter', 'run_request')]))
+        hmi.commit()
+        hmi.close()
+
+        self.assertEqual(self.wait_remote_control(persistence_writer), {'inverter': {'run_request': 1.0}})
+
+    def wait_remote_control(self, persistence_writer, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            payload = persistence_writer.take_remote_control()
+            if payload is not None:
+                return payload
+            time.sleep(0.01)
+        self.fail('No remote control values read')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.DEBUG)
+    unittest.main()
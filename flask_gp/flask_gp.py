@@ -1,5 +1,8 @@
-from flask import Flask, render_template, request, g, session, flash, redirect, url_for, abort, jsonify
+from flask import Flask, render_template, request, g, session, flash, redirect, url_for, abort
+import hashlib
+import json
 import sqlite3
+import threading
 from pathlib import Path
 
 app = Flask(__name__)            # Create application instance
@@ -19,35 +22,11 @@ def show_entries():
     return render_template('show_entries.html', entries=entries)
 
 def update_status():
-    db = get_db()
-    entries = []
-    cur = db.execute("SELECT * from asset_identity_table")
-    assets = cur.fetchall()
-    for id, _ in assets:
-        cur = db.execute("SELECT asset_name, param_name, param_value FROM {tn1} "
-                         "INNER JOIN {tn2} on {tn2}.asset_id = {tn1}.asset_id "
-                         "WHERE {tn2}.asset_id = {oid} AND {tn1}.param_access = 0" \
-                         .format(tn1='parameter_identity_table',
-                                 tn2='asset_identity_table',
-                                 oid=id))
-        entries.append(cur.fetchall())
-    return entries
+    return status_cache.get(app.config['DATABASE'], 0).entries
 
 @app.route('/control')
 def show_control():
-    db = get_db()
-    entries = []
-    cur = db.execute("SELECT * from asset_identity_table")
-    assets = cur.fetchall()
-    for id, _ in assets:
-        cur = db.execute("SELECT asset_name, param_name, param_value, {tn1}.param_id FROM {tn1} "
-                         "INNER JOIN {tn2} on {tn2}.asset_id = {tn1}.asset_id "
-                         "WHERE {tn2}.asset_id = {oid} AND {tn1}.param_access = 1"\
-                         .format(tn1='parameter_identity_table',
-                                 tn2='asset_identity_table',
-                                 oid=id))
-        entries.append(cur.fetchall())
-    print(entries)
+    entries = status_cache.get(app.config['DATABASE'], 1).entries
     return render_template('show_control.html', entries=entries)
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -103,6 +82,9 @@ def get_db():
 def close_db(error):
     """ Closes the database again at the end of the request.
     """
+    db = g.pop('sqlite_db', None)
+    if db is not None:
+        db.close()
 
 def init_db():
     db = get_db()
@@ -119,5 +101,78 @@ def initdb_command():
 
 @app.route('/json_update_status', methods= ['GET'])
 def stuff():
-    entries = update_status()
-    return jsonify(entries)
+    snapshot = status_cache.get(app.config['DATABASE'], 0)
+    if request.if_none_match.contains(snapshot.etag):
+        response = app.response_class(status=304)  # Nothing changed since the client's last poll
+    else:
+        response = app.response_class(snapshot.body, mimetype='application/json')
+    response.set_etag(snapshot.etag)
+    return response
+
+''' -------- Status cache ---------'''
+PARAMS_QUERY = ("SELECT a.asset_id, a.asset_name, p.param_name, p.param_value, p.param_id "
+                "FROM parameter_identity_table AS p "
+                "INNER JOIN asset_identity_table AS a ON a.asset_id = p.asset_id "
+                "WHERE p.param_access = ? "
+                "ORDER BY a.asset_id, p.param_id")
+
+
+class StatusSnapshot(object):
+    """ Parameters of one access type, grouped by asset, with their JSON body and ETag
+    """
+    def __init__(self, entries):
+        self.entries = entries
+        self.body = json.dumps(entries)
+        self.etag = hashlib.sha1(self.body.encode()).hexdigest()
+
+
+class StatusCache(object):
+    """ In process cache of the parameter table, shared by every request.
+        The parameters are read with one query per access type and kept until SQLite's data_version changes, which
+        happens when any other connection (the GridPi persistence writer, a control form post) commits. A poll that
+        finds the version unchanged costs one pragma, a client that already has the data gets a 304.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._database = None
+        self._db = None
+        self._version = None
+        self._snapshots = {}  # param_access: StatusSnapshot
+
+    def get(self, database, access):
+        with self._lock:
+            if database != self._database:
+                self._connect(database)
+            version = self._db.execute('PRAGMA data_version').fetchone()[0]
+            if version != self._version:
+                self._version = version
+                self._snapshots.clear()
+            if access not in self._snapshots:
+                self._snapshots[access] = StatusSnapshot(self._read(access))
+            return self._snapshots[access]
+
+    def _connect(self, database):
+        if self._db is not None:
+            self._db.close()
+        self._db = sqlite3.connect(database, check_same_thread=False)  # Used under self._lock only
+        self._database = database
+        self._version = None
+
+    def _read(self, access):
+        """ One query for every asset, rows grouped by asset as the templates expect. Assets without parameters of
+            this access type are left out, the templates title each group from its first row.
+        """
+        entries = []
+        last_id = None
+        for asset_id, asset_name, param_name, param_value, param_id in self._db.execute(PARAMS_QUERY, (access,)):
+            if asset_id != last_id:
+                entries.append([])
+                last_id = asset_id
+            row = {'asset_name': asset_name, 'param_name': param_name, 'param_value': param_value}
+            if access == 1:
+                row['param_id'] = param_id
+            entries[-1].append(row)
+        return entries
+
+
+status_cache = StatusCache()
@@ -12,6 +12,7 @@ config = {
 	'version': '0.1',
 	'install_requires': [
             'nose',
+            'numpy',
             'pymodbus3',
             'sqlalchemy'],
 	'packages': ['NAME'],